@@ -6,96 +6,32 @@ import sys
 import os
 import logging
 import copy
-from optparse import OptionParser
+import shlex
+import itertools
+from optparse import OptionParser, Values
 
 from svtplay_dl.error import UIException
 from svtplay_dl.log import log
 from svtplay_dl.utils import select_quality, list_quality, is_py2, ensure_unicode
-from svtplay_dl.service import service_handler, Generic
+from svtplay_dl.service import service_handler, Generic, LazyService, ServiceIndex
 from svtplay_dl.fetcher import VideoRetriever
 from svtplay_dl.subtitle import subtitle
 from svtplay_dl.info import info
-from svtplay_dl.output import filename
+from svtplay_dl.output import filename, set_progress_label
 from svtplay_dl.postprocess import postprocess
+from svtplay_dl.utils.parallel import ordered_map, unordered_map, BackgroundMap
+from svtplay_dl.utils.archive import download_archive
+from svtplay_dl.utils.terminal import watch_terminal_size
 
-from svtplay_dl.service.aftonbladet import Aftonbladet
-from svtplay_dl.service.bambuser import Bambuser
-from svtplay_dl.service.bigbrother import Bigbrother
-from svtplay_dl.service.dbtv import Dbtv
-from svtplay_dl.service.disney import Disney
-from svtplay_dl.service.dplay import Dplay
-from svtplay_dl.service.dr import Dr
-from svtplay_dl.service.efn import Efn
-from svtplay_dl.service.expressen import Expressen
-from svtplay_dl.service.facebook import Facebook
-from svtplay_dl.service.filmarkivet import Filmarkivet
-from svtplay_dl.service.flowonline import Flowonline
-from svtplay_dl.service.hbo import Hbo
-from svtplay_dl.service.twitch import Twitch
-from svtplay_dl.service.lemonwhale import Lemonwhale
-from svtplay_dl.service.mtvnn import Mtvnn
-from svtplay_dl.service.mtvservices import Mtvservices
-from svtplay_dl.service.nhl import NHL
-from svtplay_dl.service.nrk import Nrk
-from svtplay_dl.service.oppetarkiv import OppetArkiv
-from svtplay_dl.service.picsearch import Picsearch
-from svtplay_dl.service.pokemon import Pokemon
-from svtplay_dl.service.qbrick import Qbrick
-from svtplay_dl.service.radioplay import Radioplay
-from svtplay_dl.service.riksdagen import Riksdagen
-from svtplay_dl.service.ruv import Ruv
-from svtplay_dl.service.raw import Raw
-from svtplay_dl.service.solidtango import Solidtango
-from svtplay_dl.service.sr import Sr
-from svtplay_dl.service.svtplay import Svtplay
-from svtplay_dl.service.tv4play import Tv4play
-from svtplay_dl.service.urplay import Urplay
-from svtplay_dl.service.vg import Vg
-from svtplay_dl.service.viaplay import Viaplay
-from svtplay_dl.service.viasatsport import Viasatsport
-from svtplay_dl.service.vimeo import Vimeo
-from svtplay_dl.service.youplay import Youplay
+from svtplay_dl.service.table import services
 
 __version__ = "1.9.3"
 
-sites = [
-    Aftonbladet,
-    Bambuser,
-    Bigbrother,
-    Dbtv,
-    Disney,
-    Dplay,
-    Dr,
-    Efn,
-    Expressen,
-    Facebook,
-    Filmarkivet,
-    Flowonline,
-    Hbo,
-    Twitch,
-    Lemonwhale,
-    Mtvservices,
-    Mtvnn,
-    NHL,
-    Nrk,
-    Qbrick,
-    Picsearch,
-    Pokemon,
-    Ruv,
-    Radioplay,
-    Solidtango,
-    Sr,
-    Svtplay,
-    OppetArkiv,
-    Tv4play,
-    Urplay,
-    Viaplay,
-    Viasatsport,
-    Vimeo,
-    Vg,
-    Youplay,
-    Riksdagen,
-    Raw]
+# The services are only imported when a URL needs them
+sites = ServiceIndex(LazyService(*x) for x in services)
+
+# How many subtitles of --all-subtitles to fetch at the same time
+SUBTITLE_WORKERS = 4
 
 
 class Options(object):
@@ -155,8 +91,23 @@ class Options(object):
         self.stream_prio = None
         self.remux = False
         self.silent_semi = False
+        self.progress = "bar"
         self.get_info = False
         self.include_clips = False
+        self.segment_workers = 1
+        self.http_retries = 0
+        self.http_backoff = 0.5
+        self.hls_probe = True
+        self.jobs = 1
+        self.batch_file = None
+        self.batch_retries = 0
+        self.http_cache = None
+        self.http_cache_ttl = "0"
+        self.download_archive = None
+        self.limit_rate = None
+        self.limit_weight = 1.0
+        self.live_start = False
+        self.duration = None
 
 def get_multiple_media(urls, options):
     if options.output and os.path.isfile(options.output):
@@ -172,6 +123,107 @@ def get_multiple_media(urls, options):
     for url in urls:
         get_media(url, copy.copy(options))
 
+def get_batch_media(urls, options, parser):
+    """
+    Download every URL in urls and in options.batch_file, options.jobs
+    at a time. Each line in the batch file is a URL, optionally
+    followed by options for that URL only, e.g.
+
+      http://www.svtplay.se/video/1234 -q 2000 -S
+
+    Empty lines and lines starting with # are ignored. The file is
+    read as the downloads go, so it can be a pipe from another program.
+    """
+    if options.output and os.path.isfile(options.output):
+        log.error("Output must be a directory if used with --batch-file")
+        sys.exit(2)
+    elif options.output and not os.path.exists(options.output):
+        try:
+            os.makedirs(options.output)
+        except OSError as e:
+            log.error("%s: %s", e.strerror, e.filename)
+            return
+
+    if options.batch_file == "-":
+        batch = sys.stdin
+    else:
+        batch = open(options.batch_file)
+
+    def jobs():
+        for line in itertools.chain(urls, batch):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+    def run(line):
+        try:
+            url, job_options = batch_job(line, options, parser)
+        except SystemExit:
+            return line, False
+        except ValueError as e:
+            # shlex, e.g. a quote that isn't closed
+            log.error("Can't read the batch file line %s: %s", line, e)
+            return line, False
+        set_progress_label("[%s] " % url)
+        for attempt in range(job_options.batch_retries + 1):
+            if attempt:
+                log.info("Retrying %s (attempt %d of %d)", url, attempt + 1, job_options.batch_retries + 1)
+            try:
+                if get_media(url, copy.copy(job_options)):
+                    return url, True
+                log.error("Failed to download %s", url)
+            except SystemExit:
+                # The reason has already been logged
+                log.error("Failed to download %s", url)
+            except Exception as e:
+                log.error("Failed to download %s: %s", url, e)
+        return url, False
+
+    failed = []
+    done = 0
+    try:
+        # The lines are independent, so every worker goes on with the
+        # next one as soon as it's done, and the lines (from stdin too)
+        # are only read when a worker is free.
+        for url, ok in unordered_map(run, jobs(), options.jobs):
+            done += 1
+            if not ok:
+                failed.append(url)
+    finally:
+        if batch is not sys.stdin:
+            batch.close()
+
+    log.info("Batch done: %d of %d succeeded", done - len(failed), done)
+    for url in failed:
+        log.error("Failed: %s", url)
+    if failed:
+        sys.exit(1)
+
+
+def batch_job(line, options, parser):
+    """
+    Split a --batch-file line into its URL and a copy of options with
+    the options given on the line applied.
+    """
+    if is_py2 and isinstance(line, unicode):
+        line = line.encode("utf-8")
+    values, args = parser.parse_args(shlex.split(line), Values())
+    if len(args) != 1:
+        parser.error("Need exactly one URL per line in the batch file: %s" % line)
+
+    job_options = copy.copy(options)
+    overrides = vars(values)
+    if "exclude" in overrides:
+        overrides["exclude"] = overrides["exclude"].split(",")
+    for key, value in overrides.items():
+        setattr(job_options, key, value)
+    if job_options.require_subtitle and not job_options.merge_subtitle:
+        job_options.subtitle = True
+    if job_options.merge_subtitle:
+        job_options.remux = True
+    return args[0], job_options
+
+
 def get_media(url, options):
     if "http" not in url[:4]:
         url = "http://%s" % url
@@ -184,6 +236,7 @@ def get_media(url, options):
         url, stream = generic.get(sites)
     if not stream:
         if url.find(".f4m") > 0 or url.find(".m3u8") > 0:
+            from svtplay_dl.service.raw import Raw
             stream = Raw(options, url)
         if not stream:
             log.error("That site is not supported. Make a ticket or send a message")
@@ -193,12 +246,15 @@ def get_media(url, options):
         url = ensure_unicode(url)
 
     if options.all_episodes:
-        get_all_episodes(stream, copy.copy(options), url)
+        return get_all_episodes(stream, copy.copy(options), url)
     else:
-        get_one_media(stream, copy.copy(options))
+        return get_one_media(stream, copy.copy(options))
 
 
 def get_all_episodes(stream, options, url):
+    """
+    Download every episode. Returns True if they all went well.
+    """
     if options.output and os.path.isfile(options.output):
         log.error("Output must be a directory if used with --all-episodes")
         sys.exit(2)
@@ -207,11 +263,14 @@ def get_all_episodes(stream, options, url):
             os.makedirs(options.output)
         except OSError as e:
             log.error("%s: %s", e.strerror, e.filename)
-            return
+            return False
 
     episodes = stream.find_all_episodes(options)
     if episodes is None:
-        return
+        return False
+    if options.jobs > 1:
+        return get_episodes_parallel(stream, options, url, episodes)
+    ok = True
     for idx, o in enumerate(episodes):
         if o == url:
             substream = stream
@@ -222,13 +281,114 @@ def get_all_episodes(stream, options, url):
         log.info("Url: %s",o)
 
         # get_one_media overwrites options.output...
-        get_one_media(substream, copy.copy(options))
+        if not get_one_media(substream, copy.copy(options)):
+            ok = False
+    return ok
+
 
+def get_episodes_parallel(stream, options, url, episodes):
+    """
+    Download options.jobs episodes at a time. While they download,
+    the pages and playlists of the episodes after them are fetched,
+    so the next download can start right away.
+    """
+    def resolve(episode):
+        idx, o = episode
+        if o == url:
+            substream = stream
+        else:
+            substream = service_handler(sites, copy.copy(options), o)
+        return idx, o, substream, resolve_media(substream)
+
+    def download(episode):
+        idx, o, substream, streams = episode
+        label = "[%d/%d] " % (idx + 1, len(episodes))
+        set_progress_label(label)
+        log.info("%sUrl: %s", label, o)
+        if streams is None:
+            return True
+        return get_one_media(substream, copy.copy(options), streams)
+
+    resolved = ordered_map(resolve, enumerate(episodes), options.jobs)
+    ok = True
+    # Every worker goes on with the next episode as soon as it's done,
+    # whether or not the ones before it are.
+    for result in unordered_map(download, resolved, options.jobs):
+        if not result:
+            ok = False
+    return ok
+
+
+def archive_entry(stream, options):
+    """
+    The key of stream in the --download-archive: (service, id, kind).
+    """
+    kind = "subtitle" if options.subtitle and options.force_subtitle else "video"
+    return stream.__class__.__name__.lower(), stream.url, kind
 
-def get_one_media(stream, options):
-    # Make an automagic filename
+
+def in_archive(stream, options):
+    """
+    Check if stream has been downloaded before, according to
+    --download-archive. This is done before asking the service for
+    anything, so that old episodes cost nothing.
+    """
+    archive = download_archive(options)
+    if archive is None or options.force or options.get_url or options.list_quality:
+        return False
+    if archive.has(*archive_entry(stream, options)):
+        log.info("%s is in the download archive, skipping it", stream.url)
+        return True
+    return False
+
+
+def resolve_media(stream):
+    """
+    Do the part of get_one_media() that only talks to the service:
+    make the filename and collect what stream.get() yields. Returns
+    None if there is nothing to download, otherwise what was yielded
+    and the exception stream.get() stopped with, if any, for
+    get_one_media() to report.
+    """
+    if in_archive(stream, stream.options):
+        return None
     if not filename(stream):
-        return
+        return None
+    items = []
+    try:
+        for item in stream.get():
+            items.append(item)
+    except Exception as e:
+        return items, e
+    return items, None
+
+
+def download_subtitle(sub):
+    try:
+        sub.download()
+    except Exception as e:
+        # Don't let one subtitle stop the others, or the video
+        log.error("Can't download subtitle %s: %s", sub.url, e)
+
+
+def get_one_media(stream, options, streams=None):
+    """
+    Download what the service has for stream. Returns False if that
+    failed, True if it worked or there was nothing to do. streams is
+    what resolve_media() returned, if it has been called.
+    """
+    # Make an automagic filename, unless resolve_media() already did
+    if streams is None:
+        if in_archive(stream, options):
+            return True
+        if not filename(stream):
+            return False
+        streams = stream.get()
+        exc = None
+    else:
+        streams, exc = streams
+    archive = download_archive(options)
+    entry = archive_entry(stream, options)
 
     if options.merge_subtitle:
         from svtplay_dl.utils import which
@@ -242,7 +402,6 @@ def get_one_media(stream, options):
     infos = []
     subfixes = []
     error = []
-    streams = stream.get()
     try:
         for i in streams:
             if isinstance(i, VideoRetriever):
@@ -257,6 +416,8 @@ def get_one_media(stream, options):
                 infos.append(i)
             if isinstance(i, Exception):
                 error.append(i)
+        if exc is not None:
+            raise exc
     except Exception as e:
         if options.verbose:
             log.error("version: %s" % __version__)
@@ -270,7 +431,7 @@ def get_one_media(stream, options):
 
     if options.require_subtitle and not subs:
         log.info("No subtitles available")
-        return
+        return True
 
     if options.subtitle and options.get_url:
         if subs:
@@ -280,50 +441,78 @@ def get_one_media(stream, options):
             else:
                 print(subs[0].url)
         if options.force_subtitle: 
-            return
+            return True
 
     def options_subs_dl(subfixes):
+        # The subtitles are fetched in the background, while the
+        # video downloads; wait for them before using the files.
         if subs:
             if options.get_all_subtitles:
                 for sub in subs:
-                    sub.download()
                     if options.merge_subtitle:
                         if sub.subfix:
                             subfixes += [sub.subfix]
                         else:
                             options.get_all_subtitles = False
+                return BackgroundMap(download_subtitle, subs, SUBTITLE_WORKERS)
             else: 
-                subs[0].download()
+                return BackgroundMap(download_subtitle, subs[:1])
         elif options.merge_subtitle:
             options.merge_subtitle = False
+        return None
 
+    sub_downloads = None
     if options.subtitle and options.output != "-" and not options.get_url:
-        options_subs_dl(subfixes)
+        sub_downloads = options_subs_dl(subfixes)
         if options.force_subtitle:
-            return
+            if sub_downloads:
+                sub_downloads.join()
+            if archive and subs:
+                # Where the (first) subtitle was saved
+                archive.add(*entry, filename=subs[0].options.output)
+            return bool(subs)
     if options.get_info and options.output != "-" and not options.get_url:
         for inf in infos:
             inf.save_info()
             
     if options.merge_subtitle and not options.subtitle:
-        options_subs_dl(subfixes)
+        sub_downloads = options_subs_dl(subfixes)
 
 
     if len(videos) == 0:
         for exc in error:
             log.error(str(exc))
+        return False
     else:
         if options.list_quality:
             list_quality(videos)
-            return
+            return True
         try:
             stream = select_quality(options, videos)
             if options.get_url:
                 print(stream.url)
-                return
+                return True
             log.info("Selected to download %s, bitrate: %s",
                      stream.name(), stream.bitrate)
-            stream.download()
+            post = postprocess(stream, options, subfixes)
+            pipe = options.remux and stream.name() in ["hls", "hds"] and \
+                (post.detect or stream.name() == "hls") and not options.resume and options.output != "-"
+            if pipe and sub_downloads and options.merge_subtitle:
+                # ffmpeg is started with the subtitles as inputs when
+                # the download starts, so they must be there by then.
+                sub_downloads.join()
+            if pipe:
+                # Remux while the stream is downloading, instead of
+                # reading the file again afterwards. Without ffmpeg
+                # only MPEG-TS can be, see postprocess/ts.py.
+                stream.download(pipe=post.remux_pipe)
+            else:
+                stream.download()
+            if sub_downloads:
+                sub_downloads.join()
+            if pipe and not os.path.isfile(stream.options.output):
+                # ffmpeg failed
+                stream.finished = False
         except UIException as e:
             if options.verbose:
                 raise e
@@ -336,15 +525,21 @@ def get_one_media(stream, options):
                 stream.get_thumbnail(options)
             else:
                 log.warning("Can not get thumbnail when fetching to stdout")
-        post = postprocess(stream, options, subfixes)
-        if stream.name() == "dash" and post.detect:
-            post.merge()
-        if stream.name() == "dash" and not post.detect and stream.finished:
-            log.warning("Cant find ffmpeg/avconv. audio and video is in seperate files. if you dont want this use -P hls or hds")
+        if stream.name() == "dash" and not stream.muxed:
+            if post.detect:
+                post.merge()
+            else:
+                post.merge_mp4()
         if options.remux:
             post.remux()
+        if archive and stream.finished:
+            # output() and the remuxing update the name of the file
+            # in the options of the stream, not in ours.
+            archive.add(*entry, filename=stream.options.output)
         if options.silent_semi and stream.finished:
             log.log(25, "Download of %s was completed" % stream.options.output)
+        # Nothing says if a download to stdout was complete
+        return stream.finished or options.output == "-"
 
 
 def setup_log(silent, verbose=False):
@@ -368,8 +563,7 @@ def setup_log(silent, verbose=False):
     log.setLevel(level)
 
 
-def main():
-    """ Main program """
+def get_parser():
     usage = "Usage: %prog [options] [urls]"
     parser = OptionParser(usage=usage, version=__version__)
     parser.add_option("-o", "--output",
@@ -379,15 +573,22 @@ def main():
                       help="overwrite if file exists already")
     parser.add_option("-r", "--resume",
                       action="store_true", dest="resume", default=False,
-                      help="resume a download (RTMP based ones)")
+                      help="resume a download (RTMP, HLS, HDS, DASH and HTTP based ones)")
     parser.add_option("-l", "--live",
                       action="store_true", dest="live", default=False,
-                      help="enable for live streams (RTMP based ones)")
+                      help="enable for live streams (RTMP, HLS and DASH based ones)")
+    parser.add_option("--live-start",
+                      action="store_true", dest="live_start", default=False,
+                      help="record a live stream from the oldest part the server has, not from now")
+    parser.add_option("--duration", dest="duration", default=None, type=int, metavar="SECONDS",
+                      help="stop recording a live stream after SECONDS")
     parser.add_option("-s", "--silent",
                       action="store_true", dest="silent", default=False,
                       help="be less verbose")
     parser.add_option("--silent-semi", action="store_true",
                       dest="silent_semi", default=False, help="only show a message when the file is downloaded")
+    parser.add_option("--progress", dest="progress", default="bar", type="choice", choices=["bar", "json"],
+                      help="show the progress as a bar, or as one JSON object per line (bar or json)")
     parser.add_option("-v", "--verbose",
                       action="store_true", dest="verbose", default=False,
                       help="explain what is going on")
@@ -439,19 +640,49 @@ def main():
     parser.add_option("--stream-priority", dest="stream_prio", default=None, metavar="dash,hls,hds,http,rtmp",
                       help="If two streams have the same quality, choose the one you prefer")
     parser.add_option("--remux", dest="remux", default=False, action="store_true",
-                      help="Remux from one container to mp4 using ffmpeg or avconv")
+                      help="Remux from one container to mp4 using ffmpeg or avconv (HLS works without them)")
+    parser.add_option("--segment-workers", dest="segment_workers", default=1, type=int, metavar="N",
+                      help="download N segments or byte ranges in parallel (HLS, DASH and HTTP based ones)")
+    parser.add_option("--http-retries", dest="http_retries", default=0, type=int, metavar="N",
+                      help="retry failed HTTP requests N times")
+    parser.add_option("--http-backoff", dest="http_backoff", default=0.5, type=float, metavar="SECONDS",
+                      help="wait SECONDS, doubled for every attempt, between HTTP retries")
+    parser.add_option("--dont-probe-variants", action="store_false", dest="hls_probe", default=True,
+                      help="Don't check that every quality of a HLS stream is available before listing it.")
+    parser.add_option("-j", "--jobs", dest="jobs", default=1, type=int, metavar="K",
+                      help="download K episodes (with -A) or URLs (with --batch-file) at the same time")
+    parser.add_option("--batch-file", dest="batch_file", default=None, metavar="PATH",
+                      help="read URLs from PATH (or - for stdin), one per line. options may follow the URL")
+    parser.add_option("--batch-retries", dest="batch_retries", default=0, type=int, metavar="N",
+                      help="try a URL from --batch-file N more times if it fails")
+    parser.add_option("--http-cache", dest="http_cache", default=None, metavar="DIR",
+                      help="keep pages, API responses and manifests in DIR and reuse them")
+    parser.add_option("--http-cache-ttl", dest="http_cache_ttl", default="0", metavar="SECONDS",
+                      help="how long --http-cache entries are used without asking the server again. "
+                           "e.g. 600,api.svt.se=3600,www.svtplay.se/video=60")
+    parser.add_option("--download-archive", dest="download_archive", default=None, metavar="FILE",
+                      help="skip videos listed in FILE, and add the ones that are downloaded to it")
+    parser.add_option("--limit-rate", dest="limit_rate", default=None, metavar="RATE",
+                      help="limit the bandwidth of all downloads together, in bytes per second. "
+                           "e.g. 2M,08:00-17:00=500k")
+    parser.add_option("--limit-weight", dest="limit_weight", default=1.0, type=float, metavar="N",
+                      help="this download's share of --limit-rate compared to the others (default: 1)")
     parser.add_option("--include-clips", dest="include_clips", default=False, action="store_true",
                       help="include clips from websites when using -A")
     parser.add_option("--get-info",
                       action="store_true", dest="get_info", default=False,
                       help="Download and saves information about the video if available")
                       
+    return parser
+
+
+def main():
+    """ Main program """
+    parser = get_parser()
     (options, args) = parser.parse_args()
-    if not args:
+    if not args and not options.batch_file:
         parser.print_help()
         sys.exit(0)
-    if len(args) < 1:
-        parser.error("Incorrect number of arguments")
     if options.exclude:
         options.exclude = options.exclude.split(",")
     if options.require_subtitle:
@@ -465,15 +696,37 @@ def main():
     if options.silent_semi:
         options.silent = True
     setup_log(options.silent, options.verbose)
+    watch_terminal_size()
 
     if options.flexibleq and not options.quality:
         log.error("flexible-quality requires a quality")
         sys.exit(4)
 
+    if options.http_cache:
+        from svtplay_dl.utils.httpcache import parse_ttl
+        try:
+            parse_ttl(options.http_cache_ttl)
+        except ValueError:
+            log.error("http-cache-ttl needs to be SECONDS or PREFIX=SECONDS, separated by commas")
+            sys.exit(4)
+
+    if options.limit_rate:
+        from svtplay_dl.utils.bandwidth import parse_limit
+        try:
+            parse_limit(options.limit_rate)
+        except ValueError:
+            log.error("limit-rate needs to be RATE or HH:MM-HH:MM=RATE, separated by commas")
+            sys.exit(4)
+    if options.limit_weight <= 0:
+        log.error("limit-weight needs to be more than 0")
+        sys.exit(4)
+
     urls = args
 
     try:
-        if len(urls) == 1:
+        if options.batch_file:
+            get_batch_media(urls, options, parser)
+        elif len(urls) == 1:
             get_media(urls[0], options)
         else:
             get_multiple_media(urls, options)
@@ -493,6 +746,7 @@ def mergeParserOption(options, parser):
     options.subtitle = parser.subtitle
     options.merge_subtitle = parser.merge_subtitle
     options.silent_semi = parser.silent_semi
+    options.progress = parser.progress
     options.username = parser.username
     options.password = parser.password
     options.thumbnail = parser.thumbnail
@@ -513,4 +767,18 @@ def mergeParserOption(options, parser):
     options.convert_subtitle_colors = parser.convert_subtitle_colors
     options.include_clips = parser.include_clips
     options.get_info = parser.get_info
+    options.segment_workers = parser.segment_workers
+    options.http_retries = parser.http_retries
+    options.http_backoff = parser.http_backoff
+    options.hls_probe = parser.hls_probe
+    options.jobs = parser.jobs
+    options.batch_file = parser.batch_file
+    options.batch_retries = parser.batch_retries
+    options.http_cache = parser.http_cache
+    options.http_cache_ttl = parser.http_cache_ttl
+    options.download_archive = parser.download_archive
+    options.limit_rate = parser.limit_rate
+    options.limit_weight = parser.limit_weight
+    options.live_start = parser.live_start
+    options.duration = parser.duration
     return options
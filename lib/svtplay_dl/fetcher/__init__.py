@@ -1,5 +1,6 @@
 from __future__ import absolute_import
-from svtplay_dl.utils import HTTP
+from svtplay_dl.utils import http_session
+from svtplay_dl.utils.bandwidth import throttled_session
 
 class VideoRetriever(object):
     def __init__(self, options, url, bitrate=0, **kwargs):
@@ -7,7 +8,7 @@ class VideoRetriever(object):
         self.url = url
         self.bitrate = int(bitrate)
         self.kwargs = kwargs
-        self.http = HTTP(options)
+        self.http = throttled_session(http_session(options), options)
         self.finished = False
         self.audio = kwargs.pop("audio", None)
         self.files = kwargs.pop("files", None)
@@ -17,3 +18,14 @@ class VideoRetriever(object):
 
     def name(self):
         pass
+
+
+def split_ranges(start, end, size):
+    """
+    Split the bytes from start up to (but not including) end into
+    inclusive (first, last) pairs usable in a Range header.
+
+        >>> split_ranges(0, 25, 10)
+        [(0, 9), (10, 19), (20, 24)]
+    """
+    return [(first, min(first + size, end) - 1) for first in range(start, end, size)]
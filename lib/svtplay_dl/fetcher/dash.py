@@ -5,12 +5,18 @@ import copy
 import xml.etree.ElementTree as ET
 import os
 import re
+import time
+import calendar
+import threading
 
 
-from svtplay_dl.output import progress_stream, output, ETA, progressbar
+from svtplay_dl.output import output, Progress, SegmentJournal
+from svtplay_dl.log import log
 from svtplay_dl.utils.urllib import urljoin
 from svtplay_dl.error import UIException, ServiceError
-from svtplay_dl.fetcher import VideoRetriever
+from svtplay_dl.fetcher import VideoRetriever, split_ranges
+from svtplay_dl.utils.parallel import ordered_map
+from svtplay_dl.postprocess.mp4 import FragmentedMP4Muxer
 
 
 class DASHException(UIException):
@@ -19,12 +25,6 @@ class DASHException(UIException):
         super(DASHException, self).__init__(message)
 
 
-class LiveDASHException(DASHException):
-    def __init__(self, url):
-        super(LiveDASHException, self).__init__(
-            url, "This is a live DASH stream, and they are not supported.")
-
-
 def dashparse(options, res, url):
     streams = {}
 
@@ -35,6 +35,8 @@ def dashparse(options, res, url):
         streams[0] = ServiceError("Can't read DASH playlist. {0}".format(res.status_code))
         return streams
     xml = ET.XML(res.text)
+    if xml.attrib.get("type") == "dynamic":
+        return dashparse_live(options, xml, res, url)
     if "isoff-on-demand" in xml.attrib["profiles"]:
         try:
             baseurl = urljoin(url, xml.find("{urn:mpeg:dash:schema:mpd:2011}BaseURL").text)
@@ -67,6 +69,184 @@ def dashparse(options, res, url):
 
     return streams
 
+def _adaptationsets(xml, content_type):
+    sets = xml.findall(".//{urn:mpeg:dash:schema:mpd:2011}AdaptationSet[@contentType='%s']" % content_type)
+    if len(sets) == 0:
+        sets = xml.findall(".//{urn:mpeg:dash:schema:mpd:2011}AdaptationSet[@mimeType='%s/mp4']" % content_type)
+    return sets
+
+
+def dashparse_live(options, xml, res, url):
+    """
+    Make a DASH stream for every video quality of a dynamic (live)
+    MPD. They are recorded by polling the MPD, see DASH._download_live.
+    """
+    streams = {}
+    video = _adaptationsets(xml, "video")
+    audio = _adaptationsets(xml, "audio")
+    if not video:
+        streams[0] = ServiceError("Can't find any video in the DASH playlist")
+        return streams
+    audiorep = None
+    audiobitrate = 0
+    if audio:
+        audiorep = audio[0].find("{urn:mpeg:dash:schema:mpd:2011}Representation")
+        audiobitrate = int(audiorep.attrib["bandwidth"])
+    for i in video[0].findall("{urn:mpeg:dash:schema:mpd:2011}Representation"):
+        bitrate = (int(i.attrib["bandwidth"]) + audiobitrate) / 1000
+        options.other = "mp4"
+        representations = {"video": i.attrib["id"]}
+        if audiorep is not None:
+            representations["audio"] = audiorep.attrib["id"]
+        streams[int(bitrate)] = DASH(copy.copy(options), url, bitrate, cookies=res.cookies, live=True,
+                                     representations=representations)
+    return streams
+
+
+def _parse_duration(value):
+    """
+    Parse an ISO 8601 duration, as used in MPD attributes, into seconds.
+
+        >>> _parse_duration("PT1H2M3.5S")
+        3723.5
+        >>> _parse_duration("P1DT0S")
+        86400.0
+    """
+    match = re.match(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:([\d.]+)S)?)?$", value.strip())
+    if not match:
+        raise ValueError("Invalid duration: %s" % value)
+    days, hours, minutes, seconds = [float(x) if x else 0.0 for x in match.groups()]
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+def _parse_datetime(value):
+    """
+    Parse an xs:dateTime, as used in MPD attributes, into seconds
+    since the epoch. A missing time zone means UTC.
+
+        >>> _parse_datetime("1970-01-01T00:01:00Z")
+        60.0
+        >>> _parse_datetime("1970-01-01T01:01:00.5+01:00")
+        60.5
+    """
+    match = re.match(r"^(\d+)-(\d+)-(\d+)T(\d+):(\d+):(\d+)(\.\d+)?(Z|[+-]\d\d:?\d\d)?$", value.strip())
+    if not match:
+        raise ValueError("Invalid date: %s" % value)
+    seconds = calendar.timegm([int(x) for x in match.groups()[:6]]) + float(match.group(7) or 0)
+    zone = match.group(8)
+    if zone and zone != "Z":
+        offset = int(zone[1:3]) * 3600 + int(zone[-2:]) * 60
+        if zone[0] == "+":
+            seconds -= offset
+        else:
+            seconds += offset
+    return seconds
+
+
+def _fill_template(template, representation, bandwidth, number=0, time=0):
+    """
+    Fill in the identifiers of a SegmentTemplate.
+
+        >>> _fill_template("$RepresentationID$/$Number%05d$.m4s", "v1", 100)
+        'v1/00000.m4s'
+        >>> _fill_template("$Bandwidth$-$Time$.m4s?$$", "v1", 100, time=42)
+        '100-42.m4s?$'
+    """
+    def fill(match):
+        name = match.group(1)
+        if not name:
+            return "$"
+        if name == "RepresentationID":
+            return representation
+        value = {"Bandwidth": bandwidth, "Number": number, "Time": time}[name]
+        return (match.group(2) or "%d") % int(value)
+    return re.sub(r"\$(RepresentationID|Bandwidth|Number|Time|)(%0\d+d)?\$", fill, template)
+
+
+def live_segments(xml, url, content_type, representation, now):
+    """
+    Find the segments of a representation in a dynamic MPD that are
+    available at the time now (seconds since the epoch).
+
+    Returns the URL of the initialization segment and a list of
+    (key, url, start, duration) for the segments, where key
+    identifies a segment between updates of the MPD and start and
+    duration are in seconds of presentation time.
+    """
+    ns = "{urn:mpeg:dash:schema:mpd:2011}"
+    dirname = os.path.dirname(url) + "/"
+    ast = 0
+    if "availabilityStartTime" in xml.attrib:
+        ast = _parse_datetime(xml.attrib["availabilityStartTime"])
+    timeshift = None
+    if "timeShiftBufferDepth" in xml.attrib:
+        timeshift = _parse_duration(xml.attrib["timeShiftBufferDepth"])
+
+    period = xml.findall(ns + "Period")[-1]
+    period_start = _parse_duration(period.attrib.get("start", "PT0S"))
+    sets = _adaptationsets(period, content_type)
+    if not sets:
+        return None, []
+    rep = None
+    for i in sets[0].findall(ns + "Representation"):
+        if i.attrib.get("id") == representation:
+            rep = i
+    if rep is None:
+        return None, []
+    template = rep.find(ns + "SegmentTemplate")
+    if template is None:
+        template = sets[0].find(ns + "SegmentTemplate")
+
+    bandwidth = rep.attrib.get("bandwidth", 0)
+    timescale = int(template.attrib.get("timescale", 1))
+    start_number = int(template.attrib.get("startNumber", 1))
+    offset = int(template.attrib.get("presentationTimeOffset", 0))
+    media = template.attrib["media"]
+    init = None
+    if "initialization" in template.attrib:
+        init = urljoin(dirname, _fill_template(template.attrib["initialization"], representation, bandwidth))
+    # How far into the period the live edge is
+    elapsed = now - ast - period_start
+
+    segments = []
+    timeline = template.find(ns + "SegmentTimeline")
+    if timeline is not None:
+        number = start_number
+        t = 0
+        entries = timeline.findall(ns + "S")
+        for idx, entry in enumerate(entries):
+            if "t" in entry.attrib:
+                t = int(entry.attrib["t"])
+            d = int(entry.attrib["d"])
+            repeat = int(entry.attrib.get("r", 0))
+            if repeat < 0:
+                # Repeat until the next S, or until now
+                if idx + 1 < len(entries) and "t" in entries[idx + 1].attrib:
+                    end = int(entries[idx + 1].attrib["t"])
+                else:
+                    end = elapsed * timescale + offset
+                repeat = max(0, int((end - t) // d) - 1)
+            for _ in range(repeat + 1):
+                start = float(t - offset) / timescale
+                if start + float(d) / timescale <= elapsed:
+                    segments.append((t, urljoin(dirname, _fill_template(media, representation, bandwidth, number, t)),
+                                     start, float(d) / timescale))
+                t += d
+                number += 1
+    elif "duration" in template.attrib:
+        duration = int(template.attrib["duration"])
+        seconds = float(duration) / timescale
+        last = start_number + int(elapsed // seconds) - 1
+        first = start_number
+        if timeshift is not None:
+            first = max(first, last - int(timeshift // seconds) + 1)
+        for number in range(first, last + 1):
+            t = (number - start_number) * duration
+            segments.append((number, urljoin(dirname, _fill_template(media, representation, bandwidth, number, t)),
+                             float(t) / timescale, seconds))
+    return init, segments
+
+
 def parsesegments(content, url):
     media = content[0].find("{urn:mpeg:dash:schema:mpd:2011}SegmentTemplate")
     if media is not None:
@@ -127,17 +307,29 @@ def parsesegments(content, url):
 
 
 class DASH(VideoRetriever):
+    # Audio and video were muxed into one file while downloading
+    muxed = False
+
     def name(self):
         return "dash"
 
     def download(self):
-        if self.options.live and not self.options.force:
-            raise LiveDASHException(self.url)
+        if self.kwargs.get("live"):
+            self._download_live()
+            return
 
         if self.files:
+            if self.audio and not self.options.resume and not self.options.merge_subtitle:
+                self._download_muxed(self.files, self.audio)
+                return
             if self.audio:
                 self._download2(self.audio, audio=True)
             self._download2(self.files)
+        elif self.audio and self.options.output != "-":
+            # Fetch audio and video at the same time, only showing
+            # progress for the (bigger) video file.
+            jobs = [(self.audio, True), (self.url, False)]
+            list(ordered_map(lambda job: self._download(job[0], audio=job[1]), jobs, 2))
         else:
             if self.audio:
                 self._download(self.audio, audio=True)
@@ -152,7 +344,6 @@ class DASH(VideoRetriever):
         except KeyError:
             total_size = 0
         total_size = int(total_size)
-        bytes_so_far = 8192
         if audio:
             file_d = output(copy.copy(self.options), "m4a")
         else:
@@ -160,52 +351,225 @@ class DASH(VideoRetriever):
         if hasattr(file_d, "read") is False:
             return
         file_d.write(data.content)
-        eta = ETA(total_size)
-        while bytes_so_far < total_size:
-            old = bytes_so_far + 1
-            bytes_so_far = old + 1000000
-            if bytes_so_far > total_size:
-                bytes_so_far = total_size
 
-            bytes_range = "bytes=%s-%s" % (old, bytes_so_far)
+        ranges = split_ranges(len(data.content), total_size, 1000000)
+        stdout = self.options.output == "-"
+        if not stdout and ranges:
+            # Reserve the whole file up front, each range is written
+            # at its own offset as soon as it arrives.
+            file_d.truncate(total_size)
+        lock = threading.Lock()
+
+        def fetch(bytes_range):
+            data = self.http.request("get", url, cookies=cookies, headers={'Range': "bytes=%s-%s" % bytes_range})
+            if data is None or data.status_code >= 400:
+                raise DASHException(url, "Can't download byte range %s-%s" % bytes_range)
+            if stdout:
+                return bytes_range, data.content
+            with lock:
+                file_d.seek(bytes_range[0])
+                file_d.write(data.content)
+            return bytes_range, None
+
+        # The audio is downloaded first, without a progress bar
+        progress = Progress(self.options, total_size, unit="bytes")
+        for bytes_range, content in ordered_map(fetch, ranges, self.options.segment_workers):
+            if stdout:
+                file_d.write(content)
+            if not audio:
+                progress.update(bytes_range[1])
 
-            data = self.http.request("get", url, cookies=cookies, headers={'Range': bytes_range})
-            file_d.write(data.content)
-            if self.options.output != "-" and not self.options.silent:
-                eta.update(old)
-                progressbar(total_size, old, ''.join(["ETA: ", str(eta)]))
+        if not stdout:
+            file_d.close()
+            if not audio:
+                progress.update(total_size)
+                progress.finish()
+            self.finished = True
+
+    def _download_muxed(self, video, audio):
+        """
+        Download the segments of the video and the audio together,
+        and mux them into one file as they arrive.
+        """
+        cookies = self.kwargs["cookies"]
+        file_d = output(self.options, self.options.other)
+        if hasattr(file_d, "read") is False:
+            return
+        muxer = FragmentedMP4Muxer(file_d, ["video", "audio"])
+
+        # Init segments first, then both in about the same pace
+        segments = [(0, "video", video[0]), (0, "audio", audio[0])]
+        for kind, files in [("video", video), ("audio", audio)]:
+            segments += [(float(n) / len(files), kind, url) for n, url in enumerate(files) if n]
+        segments.sort(key=lambda x: x[0])
+
+        def fetch(segment):
+            data = self.http.request("get", segment[2], cookies=cookies)
+            if data is None or data.status_code == 404:
+                return segment[1], None
+            return segment[1], data.content
+
+        ended = set()
+        progress = Progress(self.options, len(segments))
+        for kind, data in ordered_map(fetch, segments, self.options.segment_workers):
+            progress.increment()
+            if kind in ended:
+                continue
+            if data is None:
+                ended.add(kind)
+                muxer.end(kind)
+                continue
+            muxer.add(kind, data)
+        muxer.close()
 
         if self.options.output != "-":
             file_d.close()
-            progressbar(bytes_so_far, total_size, "ETA: complete")
-            progress_stream.write('\n')
+            progress.finish()
             self.finished = True
+        self.muxed = True
 
     def _download2(self, files, audio=False):
         cookies = self.kwargs["cookies"]
 
         if audio:
-            file_d = output(copy.copy(self.options), "m4a")
+            options = copy.copy(self.options)
+            file_d = output(options, "m4a", resumable=True)
         else:
-            file_d = output(self.options, self.options.other)
+            options = self.options
+            file_d = output(options, self.options.other, resumable=True)
         if hasattr(file_d, "read") is False:
             return
-        eta = ETA(len(files))
-        n = 1
-        for i in files:
-            if self.options.output != "-" and not self.options.silent:
-                eta.increment()
-                progressbar(len(files), n, ''.join(['ETA: ', str(eta)]))
-                n += 1
+
+        journal = None
+        skip = 0
+        if options.output != "-":
+            journal = SegmentJournal(options.output, files[0])
+            skip = journal.resume(file_d)
+
+        progress = Progress(self.options, len(files), skip)
+        for i in files[skip:]:
+            progress.increment()
             data = self.http.request("get", i, cookies=cookies)
 
             if data.status_code == 404:
                 break
             data = data.content
             file_d.write(data)
+            if journal:
+                journal.update(file_d)
 
         if self.options.output != "-":
             file_d.close()
-            if not self.options.silent:
-                progress_stream.write('\n')
+            journal.remove()
+            progress.finish()
             self.finished = True
+
+    def _download_live(self):
+        """
+        Record a live stream from a dynamic MPD. The MPD is fetched
+        again every minimumUpdatePeriod, and the segments that have
+        become available since the last time are fetched, audio and
+        video at the same time.
+        """
+        cookies = self.kwargs["cookies"]
+        representations = self.kwargs["representations"]
+
+        files = {}
+        if "audio" in representations:
+            files["audio"] = output(copy.copy(self.options), "m4a")
+            if hasattr(files["audio"], "read") is False:
+                return
+        files["video"] = output(self.options, self.options.other)
+        if hasattr(files["video"], "read") is False:
+            return
+
+        def fetch(item):
+            kind, url = item[:2]
+            data = self.http.request("get", url, cookies=cookies)
+            if data is None or data.status_code >= 400:
+                return item, None
+            return item, data.content
+
+        progress = Progress(self.options, 0)
+        recorded = 0.0
+        workers = max(len(files), self.options.segment_workers)
+        try:
+            for (kind, url, duration), content in ordered_map(fetch, self._live_segments(representations), workers):
+                if content is None:
+                    log.warning("A segment of the live stream is missing, skipping it")
+                    continue
+                files[kind].write(content)
+                if kind != "video":
+                    continue
+                recorded += duration
+                progress.record(recorded)
+        except KeyboardInterrupt:
+            log.info("Stopped recording")
+
+        if self.options.output != "-":
+            for file_d in files.values():
+                file_d.close()
+            progress.finish()
+            self.finished = True
+
+    def _live_segments(self, representations):
+        """
+        Yield (kind, url, duration) for the init segments and then
+        for every new segment of the live stream, as they become
+        available.
+
+        Recording starts three video segments from the live edge, or
+        with --live-start at the start of the time shift buffer, and
+        audio starts at the same time as the video.
+        """
+        cookies = self.kwargs["cookies"]
+        last = {}
+        begin = None
+        done = False
+        while True:
+            polled = time.time()
+            res = self.http.request("get", self.url, cookies=cookies, cache=False)
+            if res is None or res.status_code >= 400:
+                log.error("Can't read the playlist of the live stream")
+                return
+            xml = ET.XML(res.content)
+
+            new = []
+            for kind in sorted(representations, key=lambda x: x != "video"):
+                init, segments = live_segments(xml, self.url, kind, representations[kind], polled)
+                if begin is None:
+                    if not segments:
+                        break
+                    if self.options.live_start:
+                        begin = segments[0][2]
+                    else:
+                        begin = segments[max(0, len(segments) - 3)][2]
+                if kind not in last:
+                    if init:
+                        yield kind, init, 0
+                    # Start with the segment playing at begin
+                    last[kind] = None
+                    for key, _, start, duration in segments:
+                        if start + duration > begin:
+                            break
+                        last[kind] = key
+                for key, url, start, duration in segments:
+                    if last[kind] is not None and key <= last[kind]:
+                        continue
+                    if self.options.duration and start >= begin + self.options.duration:
+                        done = True
+                        break
+                    new.append((start, kind, key, url, duration))
+
+            # Interleave audio and video, so both keep up
+            for start, kind, key, url, duration in sorted(new):
+                last[kind] = key
+                yield kind, url, duration
+
+            if done or xml.attrib.get("type") != "dynamic":
+                # Recorded enough, or the broadcast is over
+                return
+            wait = 2.0
+            if "minimumUpdatePeriod" in xml.attrib:
+                wait = _parse_duration(xml.attrib["minimumUpdatePeriod"])
+            time.sleep(max(0.5, polled + wait - time.time()))
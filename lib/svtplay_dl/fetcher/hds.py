@@ -8,7 +8,7 @@ import binascii
 import copy
 import xml.etree.ElementTree as ET
 
-from svtplay_dl.output import progressbar, progress_stream, ETA, output
+from svtplay_dl.output import Progress, output, SegmentJournal
 from svtplay_dl.utils import is_py2_old, is_py2
 from svtplay_dl.utils.urllib import urlparse
 from svtplay_dl.error import UIException
@@ -17,17 +17,6 @@ from svtplay_dl.error import ServiceError
 
 log = logging.getLogger('svtplay_dl')
 
-if is_py2:
-    def bytes(string=None, encoding="ascii"):
-        if string is None:
-            return ""
-        return string
-
-    def _chr(temp):
-        return temp
-else:
-    def _chr(temp):
-        return chr(temp)
 
 class HDSException(UIException):
     def __init__(self, url, message):
@@ -86,247 +75,314 @@ class HDS(VideoRetriever):
     def name(self):
         return "hds"
 
-    def download(self):
+    def download(self, pipe=None):
+        """
+        pipe is what to write the stream to instead of the .flv file,
+        see output().
+        """
         if self.options.live and not self.options.force:
             raise LiveHDSException(self.url)
 
         querystring = self.kwargs["querystring"]
         cookies = self.kwargs["cookies"]
-        bootstrap = base64.b64decode(self.kwargs["bootstrap"])
-        box = readboxtype(bootstrap, 0)
-        antal = None
-        if box[2] == b"abst":
-            antal = readbox(bootstrap, box[0])
+        try:
+            bootstrap = parse_bootstrap(base64.b64decode(self.kwargs["bootstrap"]))
+        except ValueError as e:
+            raise HDSException(self.url, "Can't read the HDS bootstrap: %s" % e)
+        fragments = bootstrap.fragments()
         baseurl = self.kwargs["manifest"][0:self.kwargs["manifest"].rfind("/")]
 
-        file_d = output(self.options, "flv")
+        file_d = output(self.options, "flv", resumable=True, pipe=pipe)
         if hasattr(file_d, "read") is False:
             return
 
-        metasize = struct.pack(">L", len(base64.b64decode(self.kwargs["metadata"])))[1:]
-        file_d.write(binascii.a2b_hex(b"464c560105000000090000000012"))
-        file_d.write(metasize)
-        file_d.write(binascii.a2b_hex(b"00000000000000"))
-        file_d.write(base64.b64decode(self.kwargs["metadata"]))
-        file_d.write(binascii.a2b_hex(b"00000000"))
-        i = 1
-        start = antal[1]["first"]
-        total = antal[1]["total"]
-        eta = ETA(total)
-        while i <= total:
-            url = "%s/%sSeg1-Frag%s?%s" % (baseurl, self.url, start, querystring)
-            if self.options.output != "-" and not self.options.silent:
-                eta.update(i)
-                progressbar(total, i, ''.join(["ETA: ", str(eta)]))
+        journal = None
+        skip = 0
+        if self.options.output != "-" and not pipe:
+            # Not when ffmpeg is remuxing, a pipe can't be resumed
+            journal = SegmentJournal(self.options.output, self.url)
+            skip = journal.resume(file_d)
+
+        if not skip:
+            metasize = struct.pack(">L", len(base64.b64decode(self.kwargs["metadata"])))[1:]
+            file_d.write(binascii.a2b_hex(b"464c560105000000090000000012"))
+            file_d.write(metasize)
+            file_d.write(binascii.a2b_hex(b"00000000000000"))
+            file_d.write(base64.b64decode(self.kwargs["metadata"]))
+            file_d.write(binascii.a2b_hex(b"00000000"))
+        # The flv header is not a segment of its own, it is always
+        # journaled together with the first fragment.
+        i = skip + 1
+        total = len(fragments)
+        progress = Progress(self.options, total, skip)
+        for segment, fragment in fragments[skip:]:
+            url = "%s/%sSeg%d-Frag%d?%s" % (baseurl, self.url, segment, fragment, querystring)
+            progress.update(i)
             data = self.http.request("get", url, cookies=cookies)
             if data.status_code == 404:
                 break
             data = data.content
             number = decode_f4f(i, data)
             file_d.write(data[number:])
+            if journal:
+                journal.update(file_d)
             i += 1
-            start += 1
 
         if self.options.output != "-":
             file_d.close()
-            if not self.options.silent:
-                progress_stream.write('\n')
+            if journal:
+                journal.remove()
+            progress.finish()
             self.finished = True
 
 
 
-def readbyte(data, pos):
-    return struct.unpack("B", bytes(_chr(data[pos]), "ascii"))[0]
-
-
-def read16(data, pos):
-    endpos = pos + 2
-    return struct.unpack(">H", data[pos:endpos])[0]
-
-
-def read24(data, pos):
-    end = pos + 3
-    return struct.unpack(">L", "\x00" + data[pos:end])[0]
-
-
-def read32(data, pos):
-    end = pos + 4
-    return struct.unpack(">i", data[pos:end])[0]
-
-
-def readu32(data, pos):
-    end = pos + 4
-    return struct.unpack(">I", data[pos:end])[0]
-
-
-def read64(data, pos):
-    end = pos + 8
-    return struct.unpack(">Q", data[pos:end])[0]
-
-
-def readstring(data, pos):
-    length = 0
-    while bytes(_chr(data[pos + length]), "ascii") != b"\x00":
-        length += 1
-    endpos = pos + length
-    string = data[pos:endpos]
-    pos += length + 1
-    return pos, string
-
-
-def readboxtype(data, pos):
-    boxsize = read32(data, pos)
-    tpos = pos + 4
-    endpos = tpos + 4
-    boxtype = data[tpos:endpos]
-    if boxsize > 1:
-        boxsize -= 8
-        pos += 8
-        return pos, boxsize, boxtype
-
-
-# Note! A lot of variable assignments are commented out. These are
-# accessible values that we currently don't use.
-def readbox(data, pos):
-    # version = readbyte(data, pos)
-    pos += 1
-    # flags = read24(data, pos)
-    pos += 3
-    # bootstrapversion = read32(data, pos)
-    pos += 4
-    # byte = readbyte(data, pos)
-    pos += 1
-    # profile = (byte & 0xC0) >> 6
-    # live = (byte & 0x20) >> 5
-    # update = (byte & 0x10) >> 4
-    # timescale = read32(data, pos)
-    pos += 4
-    # currentmediatime = read64(data, pos)
-    pos += 8
-    # smptetimecodeoffset = read64(data, pos)
-    pos += 8
-    temp = readstring(data, pos)
-    # movieidentifier = temp[1]
-    pos = temp[0]
-    serverentrycount = readbyte(data, pos)
-    pos += 1
-    serverentrytable = []
-    i = 0
-    while i < serverentrycount:
-        temp = readstring(data, pos)
-        serverentrytable.append(temp[1])
-        pos = temp[0]
-        i += 1
-    qualityentrycount = readbyte(data, pos)
-    pos += 1
-    qualityentrytable = []
-    i = 0
-    while i < qualityentrycount:
-        temp = readstring(data, pos)
-        qualityentrytable.append(temp[1])
-        pos = temp[0]
-        i += 1
-
-    tmp = readstring(data, pos)
-    # drm = tmp[1]
-    pos = tmp[0]
-    tmp = readstring(data, pos)
-    # metadata = tmp[1]
-    pos = tmp[0]
-    segmentruntable = readbyte(data, pos)
-    pos += 1
-    if segmentruntable > 0:
-        tmp = readboxtype(data, pos)
-        boxtype = tmp[2]
-        boxsize = tmp[1]
-        pos = tmp[0]
-        if boxtype == b"asrt":
-            antal = readasrtbox(data, pos)
-            pos += boxsize
-    fragRunTableCount = readbyte(data, pos)
-    pos += 1
-    i = 0
-    first = 1
-    while i < fragRunTableCount:
-        tmp = readboxtype(data, pos)
-        boxtype = tmp[2]
-        boxsize = tmp[1]
-        pos = tmp[0]
-        if boxtype == b"afrt":
-            first = readafrtbox(data, pos)
-            pos += boxsize
-        i += 1
-    antal[1]["first"] = first
-    return antal
-
-
-# Note! A lot of variable assignments are commented out. These are
-# accessible values that we currently don't use.
-def readafrtbox(data, pos):
-    # version = readbyte(data, pos)
-    pos += 1
-    # flags = read24(data, pos)
-    pos += 3
-    # timescale = read32(data, pos)
-    pos += 4
-    qualityentry = readbyte(data, pos)
-    pos += 1
-    i = 0
-    while i < qualityentry:
-        temp = readstring(data, pos)
-        # qualitysegmulti = temp[1]
-        pos = temp[0]
-        i += 1
-    fragrunentrycount = read32(data, pos)
-    pos += 4
-    i = 0
-    first = 1
-    skip = False
-    while i < fragrunentrycount:
-        firstfragment = readu32(data, pos)
-        if not skip:
-            first = firstfragment
-            skip = True
-        pos += 4
-        # timestamp = read64(data, pos)
-        pos += 8
-        # duration = read32(data, pos)
-        pos += 4
-        i += 1
-    return first
-
-
-# Note! A lot of variable assignments are commented out. These are
-# accessible values that we currently don't use.
-def readasrtbox(data, pos):
-    # version = readbyte(data, pos)
-    pos += 1
-    # flags = read24(data, pos)
-    pos += 3
-    qualityentrycount = readbyte(data, pos)
-    pos += 1
-    qualitysegmentmodifers = []
-    i = 0
-    while i < qualityentrycount:
-        temp = readstring(data, pos)
-        qualitysegmentmodifers.append(temp[1])
-        pos = temp[0]
-        i += 1
-
-    seqCount = read32(data, pos)
-    pos += 4
-    ret = {}
-    i = 0
-
-    while i < seqCount:
-        firstseg = read32(data, pos)
-        pos += 4
-        fragPerSeg = read32(data, pos)
-        pos += 4
-        tmp = i + 1
-        ret[tmp] = {"first": firstseg, "total": fragPerSeg}
-        i += 1
-    return ret
+BOX_HEADER = struct.Struct(">I4s")
+U8 = struct.Struct(">B")
+U32 = struct.Struct(">I")
+U64 = struct.Struct(">Q")
+# version and flags, bootstrap version, profile/live/update, time
+# scale, current media time, SMPTE time code offset
+ABST_HEADER = struct.Struct(">IIBIQQ")
+# version and flags, time scale
+AFRT_HEADER = struct.Struct(">II")
+# first segment, fragments per segment
+SEGMENT_RUN = struct.Struct(">II")
+# first fragment, first fragment timestamp, fragment duration
+FRAGMENT_RUN = struct.Struct(">IQI")
+
+# The number of fragments in a segment isn't known (live)
+UNKNOWN_COUNT = 0xffffffff
+
+
+class BoxReader(object):
+    """
+    Reads the fields of a box, from pos to end, in the buffer of the
+    whole bootstrap. Nothing is copied but the strings, the readers
+    of the boxes inside it share the same buffer.
+    """
+    def __init__(self, data, pos=0, end=None):
+        if isinstance(data, BoxReader):
+            self.data, self.buf = data.data, data.buf
+        else:
+            self.data = data
+            # struct in Python 2 can't read from a memoryview, but
+            # doesn't copy a str either.
+            self.buf = data if is_py2 else memoryview(data)
+        self.pos = pos
+        self.end = len(self.data) if end is None else end
+
+    def unpack(self, fmt):
+        if self.pos + fmt.size > self.end:
+            raise ValueError("Truncated box at %d" % self.pos)
+        values = fmt.unpack_from(self.buf, self.pos)
+        self.pos += fmt.size
+        return values
+
+    def u8(self):
+        return self.unpack(U8)[0]
+
+    def u32(self):
+        return self.unpack(U32)[0]
+
+    def string(self):
+        end = self.data.find(b"\x00", self.pos, self.end)
+        if end < 0:
+            raise ValueError("Unterminated string at %d" % self.pos)
+        string = self.data[self.pos:end]
+        self.pos = end + 1
+        return string
+
+    def strings(self):
+        return [self.string() for _ in range(self.u8())]
+
+    def box(self):
+        """
+        Return the type of the next box and a reader of its contents,
+        and move past it.
+        """
+        start = self.pos
+        size, kind = self.unpack(BOX_HEADER)
+        if size == 1:
+            size = self.unpack(U64)[0]
+        elif size == 0:
+            size = self.end - start
+        end = start + size
+        if end < self.pos or end > self.end:
+            raise ValueError("Broken %r box at %d" % (kind, start))
+        reader = BoxReader(self, self.pos, end)
+        self.pos = end
+        return kind, reader
+
+    def boxes(self, count):
+        """
+        Return (type, reader) of the next count boxes.
+        """
+        return [self.box() for _ in range(count)]
+
+
+class SegmentRun(object):
+    __slots__ = ["first_segment", "fragments_per_segment"]
+
+    def __init__(self, first_segment, fragments_per_segment):
+        self.first_segment = first_segment
+        self.fragments_per_segment = fragments_per_segment
+
+    def __repr__(self):
+        return "<SegmentRun(%d, %d)>" % (self.first_segment, self.fragments_per_segment)
+
+
+class FragmentRun(object):
+    """
+    A run of fragments from first_fragment, each duration long. A
+    duration of 0 marks a discontinuity instead: 0 is the end of the
+    presentation, 1 a gap in the fragment numbers, 2 in the
+    timestamps and 3 in both.
+    """
+    __slots__ = ["first_fragment", "timestamp", "duration", "discontinuity"]
+
+    def __init__(self, first_fragment, timestamp, duration, discontinuity=None):
+        self.first_fragment = first_fragment
+        self.timestamp = timestamp
+        self.duration = duration
+        self.discontinuity = discontinuity
+
+    def __repr__(self):
+        return "<FragmentRun(%d, %d, %d, %r)>" % (self.first_fragment, self.timestamp, self.duration,
+                                                   self.discontinuity)
+
+
+class SegmentRunTable(object):
+    """ An asrt box """
+    def __init__(self, reader):
+        version_flags = reader.u32()
+        self.version = version_flags >> 24
+        self.update = bool(version_flags & 1)
+        self.qualities = reader.strings()
+        count = reader.u32()
+        if reader.pos + count * SEGMENT_RUN.size > reader.end:
+            raise ValueError("Truncated asrt box at %d" % reader.pos)
+        unpack_from, buf, pos = SEGMENT_RUN.unpack_from, reader.buf, reader.pos
+        self.runs = [SegmentRun(*unpack_from(buf, pos + i * SEGMENT_RUN.size)) for i in range(count)]
+        reader.pos += count * SEGMENT_RUN.size
+
+
+class FragmentRunTable(object):
+    """ An afrt box """
+    def __init__(self, reader):
+        version_flags, self.timescale = reader.unpack(AFRT_HEADER)
+        self.version = version_flags >> 24
+        self.update = bool(version_flags & 1)
+        self.qualities = reader.strings()
+        self.runs = []
+        # The entries are read here rather than with reader.unpack(),
+        # there can be many thousands of them in a live stream.
+        count = reader.u32()
+        unpack_from, buf, pos, end = FRAGMENT_RUN.unpack_from, reader.buf, reader.pos, reader.end
+        for _ in range(count):
+            if pos + FRAGMENT_RUN.size > end:
+                raise ValueError("Truncated afrt box at %d" % pos)
+            run = FragmentRun(*unpack_from(buf, pos))
+            pos += FRAGMENT_RUN.size
+            if run.duration == 0:
+                reader.pos = pos
+                run.discontinuity = reader.u8()
+                pos += 1
+            self.runs.append(run)
+        reader.pos = pos
+
+
+class Bootstrap(object):
+    """
+    An abst box, the bootstrap info of an HDS stream: which segments
+    and fragments there are.
+    """
+    def __init__(self, reader):
+        (version_flags, self.bootstrap_version, byte, self.timescale,
+         self.current_media_time, self.smpte_offset) = reader.unpack(ABST_HEADER)
+        self.version = version_flags >> 24
+        self.profile = (byte & 0xc0) >> 6
+        self.live = bool(byte & 0x20)
+        self.update = bool(byte & 0x10)
+        self.movie_identifier = reader.string()
+        self.servers = reader.strings()
+        self.qualities = reader.strings()
+        self.drm = reader.string()
+        self.metadata = reader.string()
+        self.segment_runs = [SegmentRunTable(x) for kind, x in reader.boxes(reader.u8()) if kind == b"asrt"]
+        self.fragment_runs = [FragmentRunTable(x) for kind, x in reader.boxes(reader.u8()) if kind == b"afrt"]
+
+    def fragment_numbers(self):
+        """
+        Yield the fragment numbers in order, skipping the gaps the
+        fragment run table has, and stopping at its end of
+        presentation if it has one.
+        """
+        runs = self.fragment_runs[0].runs if self.fragment_runs else []
+        if not runs:
+            runs = [FragmentRun(1, 0, 1)]
+        for i, run in enumerate(runs):
+            if run.duration == 0:
+                if run.discontinuity == 0:
+                    return
+                continue
+            if i + 1 < len(runs):
+                end = runs[i + 1].first_fragment
+            else:
+                end = None
+            number = run.first_fragment
+            while end is None or number < end:
+                yield number
+                number += 1
+
+    def fragments(self):
+        """
+        Return a list of (segment, fragment) numbers of every fragment
+        of the stream. Each run in the segment run table covers the
+        segments up to the next run, with its fragments per segment.
+        """
+        runs = self.segment_runs[0].runs if self.segment_runs else []
+        numbers = self.fragment_numbers()
+        fragments = []
+        for i, run in enumerate(runs):
+            if i + 1 < len(runs):
+                last = runs[i + 1].first_segment
+            else:
+                last = run.first_segment + 1
+            for segment in range(run.first_segment, last):
+                count = run.fragments_per_segment
+                if count == UNKNOWN_COUNT:
+                    count = self._live_count()
+                for _ in range(count):
+                    number = next(numbers, None)
+                    if number is None:
+                        return fragments
+                    fragments.append((segment, number))
+        return fragments
+
+    def _live_count(self):
+        """
+        How many fragments a live stream has up to now, from the
+        current media time and the last run of fragments.
+        """
+        table = self.fragment_runs[0] if self.fragment_runs else None
+        runs = [x for x in table.runs if x.duration] if table else []
+        if not runs or not self.timescale:
+            return 0
+        last = runs[-1]
+        now = self.current_media_time * table.timescale // self.timescale
+        last_number = last.first_fragment + max(now - last.timestamp, 0) // last.duration
+        return last_number - runs[0].first_fragment + 1
+
+
+def parse_bootstrap(data):
+    """
+    Parse the bootstrap info (an abst box) of an HDS stream.
+    """
+    kind, reader = BoxReader(data).box()
+    if kind != b"abst":
+        raise ValueError("Expected an abst box, not %r" % kind)
+    return Bootstrap(reader)
 
 
 def decode_f4f(fragID, fragData):
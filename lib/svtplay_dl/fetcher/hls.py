@@ -2,15 +2,18 @@
 # -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
 from __future__ import absolute_import
 import sys
-import os
 import re
+import time
 import copy
+import struct
+import binascii
 
-from svtplay_dl.output import progressbar, progress_stream, ETA, output
+from svtplay_dl.output import Progress, output, SegmentJournal
 from svtplay_dl.log import log
 from svtplay_dl.error import UIException, ServiceError
 from svtplay_dl.fetcher import VideoRetriever
-from svtplay_dl.utils import HTTP
+from svtplay_dl.utils import http_session, DEFAULT_POOLSIZE
+from svtplay_dl.utils.parallel import ordered_map
 
 
 class HLSException(UIException):
@@ -19,12 +22,6 @@ class HLSException(UIException):
         super(HLSException, self).__init__(message)
 
 
-class LiveHLSException(HLSException):
-    def __init__(self, url):
-        super(LiveHLSException, self).__init__(
-            url, "This is a live HLS stream, and they are not supported.")
-
-
 def _get_full_url(url, srcurl):
     if url[:4] == 'http':
         return url
@@ -49,16 +46,26 @@ def hlsparse(options, res, url):
         streams[0] = ServiceError("Can't read HLS playlist. {0}".format(res.status_code))
         return streams
     files = (parsem3u(res.text))[1]
-    http = HTTP(options)
+    http = http_session(options)
+    variants = []
     for i in files:
         try:
             bitrate = float(i[1]["BANDWIDTH"])/1000
         except KeyError:
             streams[0] = ServiceError("Can't read HLS playlist")
             return streams
-        urls = _get_full_url(i[0], url)
-        res2 = http.get(urls)
-        if res2.status_code < 400:
+        variants.append((bitrate, _get_full_url(i[0], url)))
+
+    def probe(variant):
+        if not options.hls_probe:
+            return True
+        res2 = http.get(variant[1])
+        return res2 is not None and res2.status_code < 400
+
+    # Check that every variant actually exists, all at the same time
+    workers = min(len(variants), DEFAULT_POOLSIZE) if options.hls_probe else 1
+    for (bitrate, urls), ok in zip(variants, ordered_map(probe, variants, workers)):
+        if ok:
             streams[int(bitrate)] = HLS(copy.copy(options), urls, bitrate, cookies=res.cookies)
     return streams
 
@@ -67,59 +74,226 @@ class HLS(VideoRetriever):
     def name(self):
         return "hls"
 
-    def download(self):
-        if self.options.live and not self.options.force:
-            raise LiveHLSException(self.url)
-
+    def download(self, pipe=None):
+        """
+        pipe is what to write the stream to instead of the .ts file,
+        see output().
+        """
         cookies = self.kwargs["cookies"]
+        if self.options.live:
+            self._download_live(cookies, pipe)
+            return
+
         m3u8 = self.http.request("get", self.url, cookies=cookies).text
         globaldata, files = parsem3u(m3u8)
-        encrypted = False
-        key = None
-        if "KEY" in globaldata:
-            keydata = globaldata["KEY"]
-            encrypted = True
-
-        if encrypted:
-            try:
-                from Crypto.Cipher import AES
-            except ImportError:
-                log.error("You need to install pycrypto to download encrypted HLS streams")
-                sys.exit(2)
+        sequence = int(globaldata.get("MEDIA-SEQUENCE", 0))
+        fetch = SegmentFetcher(self, cookies)
+        segments = list(fetch.segments((sequence + idx, url, info) for idx, (url, info) in enumerate(files)))
 
-            match = re.search(r'URI="(https?://.*?)"', keydata)
-            key = self.http.request("get", match.group(1)).content
-            rand = os.urandom(16)
-            decryptor = AES.new(key, AES.MODE_CBC, rand)
-
-        file_d = output(self.options, "ts")
+        file_d = output(self.options, "ts", resumable=True, pipe=pipe)
         if hasattr(file_d, "read") is False:
             return
 
-        n = 1
-        eta = ETA(len(files))
-        for i in files:
-            item = _get_full_url(i[0], self.url)
+        journal = None
+        skip = 0
+        if self.options.output != "-" and not pipe:
+            # Not when remuxing, a pipe can't be resumed
+            journal = SegmentJournal(self.options.output, self.url)
+            skip = journal.resume(file_d)
 
-            if self.options.output != "-" and not self.options.silent:
-                eta.increment()
-                progressbar(len(files), n, ''.join(['ETA: ', str(eta)]))
-                n += 1
+        progress = Progress(self.options, len(files), skip)
+        for data, chunks in ordered_map(fetch, segments[skip:], self.options.segment_workers):
+            progress.increment()
 
-            data = self.http.request("get", item, cookies=cookies)
             if data.status_code == 404:
                 break
-            data = data.content
-            if encrypted:
-                data = decryptor.decrypt(data)
-            file_d.write(data)
+            for chunk in chunks:
+                file_d.write(chunk)
+            if journal:
+                journal.update(file_d)
+
+        if self.options.output != "-":
+            file_d.close()
+            if journal:
+                journal.remove()
+            progress.finish()
+            self.finished = True
+
+    def _download_live(self, cookies, pipe=None):
+        """
+        Record a live stream: keep polling the playlist and add the
+        new segments to the file, until the stream ends, --duration
+        is reached or the user presses ctrl-c.
+        """
+        file_d = output(self.options, "ts", pipe=pipe)
+        if hasattr(file_d, "read") is False:
+            return
+
+        fetch = SegmentFetcher(self, cookies)
+        segments = fetch.segments(self._live_segments(cookies))
+        progress = Progress(self.options, 0)
+        recorded = 0.0
+        try:
+            for (data, chunks), (_, _, info) in ordered_map(lambda x: (fetch(x), x), segments, self.options.segment_workers):
+                if data.status_code == 404:
+                    log.warning("A segment of the live stream is missing, skipping it")
+                    continue
+                for chunk in chunks:
+                    file_d.write(chunk)
+                recorded += float(info.get("duration", 0))
+                progress.record(recorded)
+        except KeyboardInterrupt:
+            log.info("Stopped recording")
 
         if self.options.output != "-":
             file_d.close()
-            if not self.options.silent:
-                progress_stream.write('\n')
+            progress.finish()
             self.finished = True
 
+    def _live_segments(self, cookies):
+        """
+        Yield (sequence number, url, info) for the segments of a live
+        stream, as they show up in the playlist.
+
+        Recording starts close to the live edge, or with --live-start
+        at the oldest segment the server still has. Segments that
+        were already seen are recognized by their sequence number.
+        """
+        next_seq = None
+        recorded = 0.0
+        while True:
+            polled = time.time()
+            res = self.http.request("get", self.url, cookies=cookies, cache=False)
+            if res is None or res.status_code >= 400:
+                log.error("Can't read the playlist of the live stream")
+                return
+            globaldata, files = parsem3u(res.text)
+            sequence = int(globaldata.get("MEDIA-SEQUENCE", 0))
+
+            if next_seq is None:
+                if self.options.live_start:
+                    next_seq = sequence
+                else:
+                    # The RFC says not to start closer than three
+                    # segments from the end of the playlist
+                    next_seq = sequence + max(0, len(files) - 3)
+            elif sequence > next_seq:
+                log.warning("Lost %d segments of the live stream, they were gone from the playlist before we saw them",
+                            sequence - next_seq)
+                next_seq = sequence
+
+            new = False
+            for idx, (url, info) in enumerate(files):
+                if sequence + idx < next_seq:
+                    continue
+                new = True
+                yield sequence + idx, url, info
+                next_seq = sequence + idx + 1
+                recorded += float(info.get("duration", 0))
+                if self.options.duration and recorded >= self.options.duration:
+                    return
+
+            if "ENDLIST" in globaldata:
+                return
+            # Wait a target duration, or half of it if nothing happened
+            wait = float(globaldata.get("TARGETDURATION", 10))
+            if not new:
+                wait /= 2
+            time.sleep(max(0, polled + wait - time.time()))
+
+
+class SegmentFetcher(object):
+    """
+    Downloads (and decrypts) segments of a HLS stream. Call it with
+    (sequence number, url, info) and it returns the response and an
+    iterable of the data in the segment.
+    """
+    def __init__(self, stream, cookies):
+        self.http = stream.http
+        self.url = stream.url
+        self.cookies = cookies
+        self.workers = stream.options.segment_workers
+        # Segments can be encrypted with different keys, but usually
+        # it's the same few keys over and over. Fetch each one once.
+        self.keys = {}
+
+    def segments(self, segments):
+        """
+        Pass through the (sequence number, url, info) of segments,
+        fetching the keys they need on the way.
+        """
+        for segment in segments:
+            info = segment[2]
+            if "KEY" in info:
+                if info["KEY"].get("METHOD") != "AES-128":
+                    raise HLSException(self.url, "Unsupported HLS encryption method: %s" % info["KEY"].get("METHOD"))
+                keyurl = _get_full_url(info["KEY"]["URI"], self.url)
+                if keyurl not in self.keys:
+                    if not self.keys:
+                        try:
+                            from Crypto.Cipher import AES
+                        except ImportError:
+                            log.error("You need to install pycrypto to download encrypted HLS streams")
+                            sys.exit(2)
+                    self.keys[keyurl] = self.http.request("get", keyurl, cookies=self.cookies).content
+            yield segment
+
+    def __call__(self, segment):
+        sequence, url, info = segment
+        data = self.http.request("get", _get_full_url(url, self.url), cookies=self.cookies, stream=True)
+        if data.status_code == 404:
+            return data, None
+        chunks = data.iter_content(65536)
+        if "KEY" in info:
+            from Crypto.Cipher import AES
+            if "IV" in info["KEY"]:
+                iv = binascii.unhexlify(info["KEY"]["IV"][2:].zfill(32))
+            else:
+                # No explicit IV, use the media sequence number
+                iv = struct.pack(">QQ", 0, sequence)
+            key = self.keys[_get_full_url(info["KEY"]["URI"], self.url)]
+            chunks = _decrypt(chunks, AES.new(key, AES.MODE_CBC, iv))
+        if self.workers > 1:
+            # Let the worker do the downloading and decrypting,
+            # not the thread writing the file
+            chunks = list(chunks)
+        return data, chunks
+
+
+def _decrypt(chunks, decryptor):
+    """
+    Decrypt an iterable of AES-CBC encrypted byte strings, one block
+    aligned piece at a time, and strip the PKCS#7 padding at the end.
+    """
+    rest = b""
+    last = b""
+    for chunk in chunks:
+        data = rest + chunk
+        aligned = len(data) - len(data) % 16
+        rest = data[aligned:]
+        if not aligned:
+            continue
+        data = last + decryptor.decrypt(data[:aligned])
+        # Hold back the last block, it might be padding
+        last = data[-16:]
+        if len(data) > 16:
+            yield data[:-16]
+    if last:
+        padding = bytearray(last[-1:])[0]
+        if 0 < padding <= 16:
+            last = last[:-padding]
+        yield last
+
+
+def _parse_attributes(data):
+    """
+    Parse an attribute list, as used in e.g. EXT-X-KEY.
+
+        >>> sorted(_parse_attributes('METHOD=AES-128,URI="key?a=1,2",IV=0x01').items())
+        [('IV', '0x01'), ('METHOD', 'AES-128'), ('URI', 'key?a=1,2')]
+    """
+    return dict((key, value.strip('"')) for key, value in re.findall(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)', data))
+
 
 def parsem3u(data):
     if not data.startswith("#EXTM3U"):
@@ -128,6 +302,7 @@ def parsem3u(data):
     files = []
     streaminfo = {}
     globdata = {}
+    key = None
 
     data = data.replace("\r", "\n")
     for l in data.split("\n")[1:]:
@@ -142,7 +317,14 @@ def parsem3u(data):
                 if info[i][0] == "RESOLUTION":
                     streaminfo.update({info[i][0]: info[i][1]})
         elif l.startswith("#EXT-X-ENDLIST"):
+            globdata["ENDLIST"] = "None"
             break
+        elif l.startswith("#EXT-X-KEY:"):
+            # The key applies to every segment until the next EXT-X-KEY
+            globdata["KEY"] = l[11:].strip()
+            key = _parse_attributes(globdata["KEY"])
+            if key.get("METHOD") == "NONE":
+                key = None
         elif l.startswith("#EXT-X-"):
             line = [l[7:].strip().split(":", 1)]
             if len(line[0]) == 1:
@@ -159,6 +341,8 @@ def parsem3u(data):
         elif l[0] == '#':
             pass
         else:
+            if key:
+                streaminfo["KEY"] = key
             files.append((l, streaminfo))
             streaminfo = {}
 
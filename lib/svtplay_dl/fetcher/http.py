@@ -1,9 +1,23 @@
 # ex:ts=4:sw=4:sts=4:et
 # -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
 from __future__ import absolute_import
+import threading
 
-from svtplay_dl.output import output, ETA, progressbar
-from svtplay_dl.fetcher import VideoRetriever
+from svtplay_dl.output import output, Progress, SegmentJournal
+from svtplay_dl.error import UIException
+from svtplay_dl.fetcher import VideoRetriever, split_ranges
+from svtplay_dl.utils.parallel import ordered_map
+
+# The file is fetched in ranges of this size, at least, up to
+# MAX_RANGE_SIZE if there are few workers for a big file.
+MIN_RANGE_SIZE = 1024 * 1024
+MAX_RANGE_SIZE = 8 * 1024 * 1024
+
+
+class HTTPException(UIException):
+    def __init__(self, url, message):
+        self.url = url
+        super(HTTPException, self).__init__(message)
 
 
 class HTTP(VideoRetriever):
@@ -12,6 +26,12 @@ class HTTP(VideoRetriever):
 
     def download(self):
         """ Get the stream from HTTP """
+        if self.options.output != "-":
+            total_size = self._probe()
+            if total_size:
+                self._download_ranges(total_size)
+                return
+
         data = self.http.request("get", self.url, stream=True)
         try:
             total_size = data.headers['content-length']
@@ -24,15 +44,80 @@ class HTTP(VideoRetriever):
         if hasattr(file_d, "read") is False:
             return
 
-        eta = ETA(total_size)
+        progress = Progress(self.options, total_size, unit="bytes")
         for i in data.iter_content(8192):
             bytes_so_far += len(i)
             file_d.write(i)
-            if self.options.output != "-" and not self.options.silent:
-                eta.update(bytes_so_far)
-                progressbar(total_size, bytes_so_far, ''.join(["ETA: ", str(eta)]))
+            progress.update(bytes_so_far)
 
         if self.options.output != "-":
             file_d.close()
+            progress.finish()
             self.finished = True
 
+    def _probe(self):
+        """
+        Returns the size of the file if the server can send parts of
+        it, otherwise None.
+        """
+        data = self.http.request("get", self.url, stream=True, headers={"Range": "bytes=0-0"})
+        if data is None:
+            return None
+        data.close()
+        content_range = data.headers.get("Content-Range", "")
+        if data.status_code != 206 or "/" not in content_range:
+            return None
+        try:
+            return int(content_range[content_range.rfind("/") + 1:])
+        except ValueError:
+            # The size is "*", unknown
+            return None
+
+    def _download_ranges(self, total_size):
+        """
+        Download the file in byte ranges, --segment-workers at a time,
+        each written at its place in the file. The journal keeps
+        track of how far the file is complete, so --resume can go on
+        from there.
+        """
+        file_d = output(self.options, "mp4", resumable=True)
+        if hasattr(file_d, "read") is False:
+            return
+
+        journal = SegmentJournal(self.options.output, self.url)
+        journal.resume(file_d)
+        start = journal.offset
+        # Reserve the whole file up front
+        file_d.truncate(total_size)
+
+        workers = self.options.segment_workers
+        size = min(max(total_size // (workers * 4), MIN_RANGE_SIZE), MAX_RANGE_SIZE)
+        lock = threading.Lock()
+
+        def fetch(bytes_range):
+            # Ranges are of the file as it is, not of a compressed version
+            headers = {"Range": "bytes=%s-%s" % bytes_range, "Accept-Encoding": "identity"}
+            data = self.http.request("get", self.url, stream=True, headers=headers)
+            if data is None or data.status_code != 206:
+                raise HTTPException(self.url, "Can't download byte range %s-%s" % bytes_range)
+            pos = bytes_range[0]
+            for chunk in data.iter_content(65536):
+                with lock:
+                    file_d.seek(pos)
+                    file_d.write(chunk)
+                pos += len(chunk)
+            if pos != bytes_range[1] + 1:
+                raise HTTPException(self.url, "Got a short byte range %s-%s" % bytes_range)
+            return bytes_range
+
+        progress = Progress(self.options, total_size, start, unit="bytes")
+        for bytes_range in ordered_map(fetch, split_ranges(start, total_size, size), workers):
+            # Everything up to here is done
+            with lock:
+                journal.update(file_d, bytes_range[1] + 1)
+            progress.update(bytes_range[1] + 1)
+
+        file_d.close()
+        journal.remove()
+        progress.finish()
+        self.finished = True
@@ -6,7 +6,10 @@ import time
 import re
 import os
 import io
+import json
+import math
 import platform
+import threading
 from datetime import timedelta
 
 from svtplay_dl.utils import is_py2, filenamify, decode_html_entities, ensure_unicode
@@ -15,6 +18,19 @@ from svtplay_dl.log import log
 
 progress_stream = sys.stderr
 
+# When several downloads run at once (see --jobs), each thread labels
+# its progress bar, and the lock keeps the bars from being mixed up.
+_progress = threading.local()
+_progress_lock = threading.Lock()
+
+# How often a Progress is drawn, in seconds
+REDRAW_INTERVAL = 0.25
+JSON_INTERVAL = 1.0
+
+# Files in the directories we write to, see DirectoryIndex
+_directories = {}
+_directories_lock = threading.Lock()
+
 
 class ETA(object):
     """
@@ -23,20 +39,33 @@ class ETA(object):
     number of items and continuously updating with current
     progress, the class can calculate an estimation of how long
     time remains.
+
+    The speed is an exponentially weighted moving average, measured
+    over at least 'interval' seconds at a time and mostly based on
+    the last 'window' seconds, so the ETA follows changes in speed
+    instead of the average since the start.
     """
 
-    def __init__(self, end, start=0):
+    def __init__(self, end, start=0, interval=1.0, window=10.0):
         """
         Parameters:
-        end:   the end (or size, of start is 0)
-        start: the starting position, defaults to 0
+        end:      the end (or size, of start is 0)
+        start:    the starting position, defaults to 0
+        interval: how long to measure the speed at a time
+        window:   how long it takes for a change in speed to
+                  mostly show (the time constant of the average)
         """
         self.start = start
         self.end = end
         self.pos = start
+        self.interval = interval
+        self.window = window
+        self.rate = None
 
         self.now = time.time()
         self.start_time = self.now
+        self.sample_time = self.now
+        self.sample_pos = start
 
     def update(self, pos):
         """
@@ -47,6 +76,15 @@ class ETA(object):
         """
         self.pos = pos
         self.now = time.time()
+        elapsed = self.now - self.sample_time
+        if elapsed >= self.interval:
+            rate = (pos - self.sample_pos) / elapsed
+            if self.rate is None:
+                self.rate = rate
+            else:
+                self.rate += (1 - math.exp(-elapsed / self.window)) * (rate - self.rate)
+            self.sample_time = self.now
+            self.sample_pos = pos
 
     def increment(self, skip=1):
         """
@@ -64,19 +102,27 @@ class ETA(object):
         """
         return self.end - self.pos
 
-    def __str__(self):
+    @property
+    def seconds(self):
         """
-        returns: a time string of the format HH:MM:SS.
+        returns: How many seconds remains, or None if unknown
         """
-        duration = self.now - self.start_time
-
-        # Calculate how long it takes to process one item
+        if self.rate:
+            return self.left / self.rate
+        # Not measured yet, use the average so far
         try:
-            elm_time = duration / (self.end - self.left)
+            return (self.now - self.start_time) / (self.pos - self.start) * self.left
         except ZeroDivisionError:
-            return "(unknown)"
+            return None
 
-        return str(timedelta(seconds=int(elm_time * self.left)))
+    def __str__(self):
+        """
+        returns: a time string of the format HH:MM:SS.
+        """
+        seconds = self.seconds
+        if seconds is None:
+            return "(unknown)"
+        return str(timedelta(seconds=int(seconds)))
 
 
 def progress(byte, total, extra=""):
@@ -105,16 +151,190 @@ def progressbar(total, pos, msg=""):
     Of course, the ETA part should be supplied be the calling
     function.
     """
-    width = get_terminal_size()[0] - 40
+    label = getattr(_progress, "label", "")
+    width = get_terminal_size()[0] - 40 - len(label)
     rel_pos = int(float(pos)/total*width)
     bar = ''.join(["=" * rel_pos, "." * (width - rel_pos)])
 
     # Determine how many digits in total (base 10)
     digits_total = len(str(total))
     fmt_width = "%0" + str(digits_total) + "d"
-    fmt = "\r[" + fmt_width + "/" + fmt_width + "][%s] %s"
+    fmt = "\r" + label + "[" + fmt_width + "/" + fmt_width + "][%s] %s"
+
+    with _progress_lock:
+        progress_stream.write(fmt % (pos, total, bar, msg))
+
+
+def progress_message(msg):
+    """
+    Like progressbar(), but only shows msg. For when there is no
+    known end, like when recording a live stream.
+    """
+    label = getattr(_progress, "label", "")
+    with _progress_lock:
+        progress_stream.write("\r" + label + msg)
 
-    progress_stream.write(fmt % (pos, total, bar, msg))
+
+class Progress(object):
+    """
+    The progress of a download, shown as a progress bar (see
+    progressbar()) or with --progress=json as one JSON object per
+    line, for programs watching the download:
+
+      {"event": "progress", "file": "a.ts", "label": "", "unit": "segments",
+       "pos": 12, "total": 340, "rate": 1.2, "eta": 273}
+
+    followed by {"event": "done", ...} at the end. For a live stream
+    the event is "recording" with the number of seconds recorded.
+
+    Nothing is shown with --silent or when writing to stdout. The
+    output is redrawn at most every REDRAW_INTERVAL (JSON_INTERVAL)
+    seconds, so it can be updated for every chunk that arrives.
+    """
+
+    def __init__(self, options, total, start=0, unit="segments"):
+        self.options = options
+        self.total = total
+        self.unit = unit
+        self.mode = options.progress
+        if options.silent or options.output == "-":
+            self.mode = None
+        self.interval = JSON_INTERVAL if self.mode == "json" else REDRAW_INTERVAL
+        self.eta = ETA(total, start)
+        self.drawn = None
+
+    def update(self, pos):
+        self.eta.update(pos)
+        if self._due(bool(self.total) and pos >= self.total):
+            if self.mode == "json":
+                seconds = self.eta.seconds
+                self._json("progress", pos=pos, total=self.total, rate=self.eta.rate,
+                           eta=None if seconds is None else int(seconds))
+            elif not self.total:
+                # Unknown size
+                progress_message("Downloaded %dkB" % (pos >> 10))
+            else:
+                progressbar(self.total, pos, "ETA: %s" % self.eta)
+
+    def increment(self, skip=1):
+        self.update(self.eta.pos + skip)
+
+    def record(self, seconds):
+        """
+        Show how much of a live stream has been recorded, against
+        --duration if given.
+        """
+        if not self._due(False):
+            return
+        if self.mode == "json":
+            self._json("recording", seconds=seconds, duration=self.options.duration)
+        elif self.options.duration:
+            progressbar(int(self.options.duration), min(int(seconds), int(self.options.duration)),
+                        "Recorded: %s" % timedelta(seconds=int(seconds)))
+        else:
+            progress_message("Recorded: %s" % timedelta(seconds=int(seconds)))
+
+    def finish(self):
+        if self.mode == "json":
+            self._json("done", pos=self.eta.pos, total=self.total)
+        elif self.mode:
+            with _progress_lock:
+                progress_stream.write("\n")
+
+    def _due(self, last):
+        if not self.mode:
+            return False
+        now = time.time()
+        if not last and self.drawn is not None and now - self.drawn < self.interval:
+            return False
+        self.drawn = now
+        return True
+
+    def _json(self, event, **fields):
+        fields.update({"event": event, "file": self.options.output, "unit": self.unit,
+                       "label": getattr(_progress, "label", "").strip()})
+        line = json.dumps(fields, sort_keys=True)
+        with _progress_lock:
+            progress_stream.write(line + "\n")
+            progress_stream.flush()
+
+
+def set_progress_label(label):
+    """
+    Set a text to put in front of every progress bar drawn by the
+    current thread, e.g. which episode it is.
+    """
+    _progress.label = label
+
+
+class SegmentJournal(object):
+    """
+    Remembers how far a segmented download (HLS, HDS or DASH) has
+    come, in a small json file next to the output file. It is
+    updated after every segment written, so a download that is
+    interrupted can continue where it stopped with --resume instead
+    of starting over.
+    """
+
+    def __init__(self, filename, url):
+        """
+        Parameters:
+        filename: the output file that is being written
+        url:      the stream being downloaded. A journal left behind
+                  for another stream is ignored.
+        """
+        self.path = journal_filename(filename)
+        self.url = url
+        self.segments = 0
+        self.offset = 0
+
+        try:
+            with open(self.path) as fd:
+                data = json.load(fd)
+        except (IOError, ValueError):
+            return
+        if data.get("url") == url:
+            self.segments = int(data["segments"])
+            self.offset = int(data["offset"])
+
+    def resume(self, file_d):
+        """
+        Throw away anything written after the last completed
+        segment. Returns the number of segments to skip.
+
+        Unless file_d was opened by output() to continue it with
+        --resume, the download starts over and a journal left behind
+        is removed.
+        """
+        if "+" not in getattr(file_d, "mode", ""):
+            self.segments = 0
+            self.offset = 0
+            self.remove()
+            return 0
+        if self.segments:
+            log.info("Resuming download after segment %d", self.segments)
+        file_d.seek(self.offset)
+        file_d.truncate()
+        return self.segments
+
+    def update(self, file_d, offset=None):
+        """
+        Mark one more segment as completely written to file_d. The
+        file is complete up to offset, by default where it is now.
+        """
+        file_d.flush()
+        self.segments += 1
+        self.offset = file_d.tell() if offset is None else offset
+        with open(self.path, "w") as fd:
+            json.dump({"url": self.url, "segments": self.segments, "offset": self.offset}, fd)
+
+    def remove(self):
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+
+def journal_filename(filename):
+    return "%s.part.json" % filename
 
 
 def filename(stream):
@@ -141,7 +361,7 @@ def filename(stream):
     return True
 
 
-def output(options, extention="mp4", openfd=True, mode="wb", **kwargs):
+def output(options, extention="mp4", openfd=True, mode="wb", resumable=False, pipe=None, **kwargs):
     subtitlefiles = ["srt", "smi", "tt","sami", "wrst"]
     if is_py2:
         file_d = file
@@ -159,7 +379,16 @@ def output(options, extention="mp4", openfd=True, mode="wb", **kwargs):
         if ext and extention == "srt" and ext.group(1).split(".")[-1] in subtitlefiles:
             options.output = "%s.srt" % options.output[:options.output.rfind(ext.group(1))]
         log.info("Outfile: %s", options.output)
-        if os.path.isfile(options.output) or \
+        # pipe(filename) returns a file-like object that remuxes what
+        # is written to it while downloading, see get_one_media()
+        remux = pipe is not None and openfd and extention in ["ts", "flv"]
+        resume = resumable and options.resume and \
+            os.path.isfile(options.output) and os.path.isfile(journal_filename(options.output))
+        if resume:
+            # Pick up where we left off, see SegmentJournal
+            mode = "r+b"
+        elif os.path.isfile(options.output) or \
+                (remux and os.path.isfile("%s.mp4" % os.path.splitext(options.output)[0])) or \
                 findexpisode(os.path.dirname(os.path.realpath(options.output)), options.service, os.path.basename(options.output)):
             if extention in subtitlefiles:
                 if not options.force_subtitle:
@@ -169,8 +398,16 @@ def output(options, extention="mp4", openfd=True, mode="wb", **kwargs):
                 if not options.force:
                     log.error("File (%s) already exists. Use --force to overwrite" % options.output)
                     return None
-        if openfd:
+        if remux:
+            file_d = pipe(options.output)
+            # There's nothing left for postprocess.remux() to do
+            options.output = file_d.filename
+            add_to_directory_index(options.output)
+        elif openfd:
+            add_to_directory_index(options.output)
             file_d = open(options.output, mode, **kwargs)
+        else:
+            add_to_directory_index(options.output)
     else:
         if openfd:
             if is_py2:
@@ -181,25 +418,80 @@ def output(options, extention="mp4", openfd=True, mode="wb", **kwargs):
     return file_d
 
 
+class DirectoryIndex(object):
+    """
+    The files in a directory, indexed on the video id in their
+    names (see findexpisode). It is built the first time it's needed
+    and then kept up to date with the files we create, so that the
+    directory only has to be listed once per run.
+    """
+    episode_re = re.compile(r"-(\w+)-\w+.(\w{2,3})$")
+
+    def __init__(self, directory):
+        self.directory = directory
+        # video id -> extension -> file names
+        self.videos = {}
+        try:
+            files = os.listdir(directory)
+        except OSError:
+            files = []
+        for i in files:
+            if os.path.isfile(os.path.join(directory, i)):
+                self.add(i)
+
+    def add(self, name):
+        match = self.episode_re.search(name)
+        if match:
+            self.videos.setdefault(match.group(1), {}).setdefault(match.group(2), set()).add(name)
+
+    def find(self, videoid):
+        """
+        Return (extension, file name) for the files with the given
+        video id that are still there.
+        """
+        found = []
+        for extention, names in self.videos.get(videoid, {}).items():
+            for name in names:
+                if os.path.isfile(os.path.join(self.directory, name)):
+                    found.append((extention, name))
+        return found
+
+
+def directory_index(directory):
+    with _directories_lock:
+        if directory not in _directories:
+            _directories[directory] = DirectoryIndex(directory)
+        return _directories[directory]
+
+
+def add_to_directory_index(filename):
+    path = os.path.realpath(filename)
+    with _directories_lock:
+        index = _directories.get(os.path.dirname(path))
+        if index:
+            index.add(os.path.basename(path))
+
+
 def findexpisode(directory, service, name):
     ignorefiles = ["srt", "smi", "tt","sami", "wrst","txt"]
-    match = re.search(r"-(\w+)-\w+.(\w{2,3})$", name)
+    match = DirectoryIndex.episode_re.search(name)
     if not match:
         return False
-    
+
     videoid = match.group(1)
     extention = match.group(2)
 
-    files = [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]
-    for i in files:
-        match = re.search(r"-(\w+)-\w+.(\w{2,3})$", i)
-        if match:
-            if service:
-                if extention in ignorefiles:
-                    if name.find(service) and match.group(1) == videoid and match.group(2) == extention:
-                        return True
-                elif match.group(2) not in ignorefiles and match.group(2) != "m4a":
-                    if name.find(service) and match.group(1) == videoid:
-                        return True
+    if not service or not name.find(service):
+        return False
+
+    index = directory_index(directory)
+    with _directories_lock:
+        found = index.find(videoid)
+    for ext, _ in found:
+        if extention in ignorefiles:
+            if ext == extention:
+                return True
+        elif ext not in ignorefiles and ext != "m4a":
+            return True
 
     return False
@@ -1,12 +1,14 @@
-from json import dumps
-from random import sample
 import subprocess
 import os
-import platform
-from requests import post, codes, Timeout
+from tempfile import TemporaryFile
 
 from svtplay_dl.log import log
-from svtplay_dl.utils import which, is_py3
+from svtplay_dl.error import UIException
+from svtplay_dl.utils import which
+from svtplay_dl.output import add_to_directory_index
+from svtplay_dl.postprocess.mp4 import mux_files
+from svtplay_dl.postprocess.ts import TSRemuxer, remux_file
+from svtplay_dl.postprocess.language import label_language, subtitle_language
 
 
 class postprocess(object):
@@ -23,72 +25,29 @@ class postprocess(object):
                 break
 
     def sublanguage(self):
-        # parse() function partly borrowed from a guy on github. /thanks!
-        # https://github.com/riobard/srt.py/blob/master/srt.py
-        def parse(self):
-            def parse_block(block):
-                lines = block.strip('-').split('\n')
-                txt = '\r\n'.join(lines[2:])
-                return txt
-
-            if platform.system() == "Windows" and is_py3:
-                fd = open(self, encoding="utf8")
-            else:
-                fd = open(self)
-            return list(map(parse_block,
-                            fd.read().strip().replace('\r', '').split('\n\n')))
-
-        def query(self):
-            random_sentences = ' '.join(sample(parse(self), 8)).replace('\r\n', '')
-            url = 'https://whatlanguage.herokuapp.com'
-            payload = {"query": random_sentences}
-            headers = {'content-type': 'application/json'} # Note: requests handles json from version 2.4.2 and onwards so i use json.dumps for now.
-            try:
-                r = post(url, data=dumps(payload), headers=headers, timeout=30) # Note: reasonable timeout i guess? svtplay-dl is mainly used while multitasking i presume, and it is heroku after all (fast enough)
-                if r.status_code == codes.ok:
-                    try:
-                        response = r.json()
-                        return response['language']
-                    except TypeError:
-                        return 'und'
-                else:
-                    log.error("Server error appeared. Setting language as undetermined.")
-                    return 'und'
-            except Timeout:
-                log.error("30 seconds server timeout reached. Setting language as undetermined.")
-                return 'und'
-
+        """
+        Return the language codes of the subtitles, from their labels
+        when the service gave us one we know, otherwise by looking at
+        the text (see postprocess/language.py).
+        """
         langs = []
-        exceptions = {
-            'lulesamiska': 'smj',
-            'meankieli': 'fit',
-            'jiddisch': 'yid'
-        }
         if len(self.subfixes) >= 2:
             log.info("Determining the languages of the subtitles.")
         else: log.info("Determining the language of the subtitle.")
-        if self.get_all_subtitles:
-            from re import match
-            for subfix in self.subfixes:
-                if [exceptions[key] for key in exceptions.keys() if match(key, subfix.strip('-'))]:
-                    if 'oversattning' in subfix.strip('-'):
-                        subfix = subfix.strip('-').split('.')[0]
-                    else:
-                        subfix = subfix.strip('-')
-                    langs += [exceptions[subfix]]
-                    continue
-                subfile = "{0}.srt".format(os.path.splitext(self.stream.options.output)[0] + subfix)
-                langs += [query(subfile)]
-        else:
-            subfile = "{0}.srt".format(os.path.splitext(self.stream.options.output)[0])
-            langs += [query(subfile)]
+        name = os.path.splitext(self.stream.options.output)[0]
+        subfixes = self.subfixes if self.get_all_subtitles else [""]
+        for subfix in subfixes:
+            lang = label_language(subfix)
+            if lang is None:
+                lang = subtitle_language("{0}.srt".format(name + subfix))
+            langs += [lang]
         if len(langs) >= 2:
             log.info("Language codes: " + ', '.join(langs))
         else: log.info("Language code: " + langs[0])
         return langs
 
     def remux(self):
-        if self.detect is None:
+        if self.detect is None and not self.stream.options.output.endswith((".ts", ".mp4")):
             log.error("Cant detect ffmpeg or avconv. Cant mux files without it.")
             return
         if self.stream.finished is False:
@@ -99,31 +58,17 @@ class postprocess(object):
             name, ext = os.path.splitext(orig_filename)
             new_name = u"{0}.mp4".format(name)
 
+            if self.detect is None:
+                self.remux_ts(orig_filename, new_name)
+                return
+
             if self.merge_subtitle:
                 log.info(u"Muxing %s and merging its subtitle into %s", orig_filename, new_name)
             else:
                 log.info(u"Muxing %s into %s".format(orig_filename, new_name))
 
             tempfile = u"{0}.temp".format(orig_filename)
-            arguments = ["-map", "0:v", "-map", "0:a", "-c", "copy", "-copyts", "-f", "mp4"]
-            if ext == ".ts":
-                arguments += ["-bsf:a", "aac_adtstoasc"]
-            cmd = [self.detect, "-i", orig_filename]
-
-            if self.merge_subtitle:
-                langs = self.sublanguage()
-                for stream_num, language in enumerate(langs):
-                    arguments += ["-map", str(stream_num + 1), "-c:s:" + str(stream_num), "mov_text", "-metadata:s:s:" + str(stream_num), "language=" + language]
-                if len(self.subfixes) >= 2:
-                    for subfix in self.subfixes:
-                        subfile = "{0}.srt".format(name + subfix)
-                        cmd += ["-i", subfile]
-                else:
-                    subfile = "{0}.srt".format(name)
-                    cmd += ["-i", subfile]
-
-            arguments += ["-y", tempfile]
-            cmd += arguments
+            cmd = self._remux_cmd(orig_filename, ext, tempfile)
             p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
             stdout, stderr = p.communicate()
             if p.returncode != 0:
@@ -134,14 +79,89 @@ class postprocess(object):
 
             if self.merge_subtitle and not self.external_subtitle:
                 log.info("Muxing done, removing the old files.")
-                if len(self.subfixes) >= 2:
-                    for subfix in self.subfixes:
-                        subfile = "{0}.srt".format(name + subfix)
-                        os.remove(subfile)
-                else: os.remove(subfile)
+                self._remove_subtitles(name)
             else: log.info("Muxing done, removing the old file.")
             os.remove(orig_filename)
             os.rename(tempfile, new_name)
+            add_to_directory_index(new_name)
+            self.stream.options.output = new_name
+
+    def remux_ts(self, orig_filename, new_name):
+        """
+        Remux MPEG-TS to mp4 without ffmpeg, see postprocess/ts.py.
+        """
+        if self.merge_subtitle:
+            log.warning("Cant merge the subtitle without ffmpeg or avconv, it is kept in a separate file")
+        log.info(u"Muxing %s into %s", orig_filename, new_name)
+        tempfile = u"{0}.temp".format(orig_filename)
+        try:
+            with open(tempfile, "wb") as fd:
+                remux_file(orig_filename, fd)
+        except ValueError as e:
+            log.error("Something went wrong: %s", e)
+            os.remove(tempfile)
+            return
+        log.info("Muxing done, removing the old file.")
+        os.remove(orig_filename)
+        os.rename(tempfile, new_name)
+        add_to_directory_index(new_name)
+        self.stream.options.output = new_name
+
+    def remux_pipe(self, filename):
+        """
+        Start ffmpeg remuxing to mp4 from a pipe, instead of from a
+        file after the download. Returns a file-like object to write
+        the .ts or .flv stream to, see RemuxPipe. Without ffmpeg,
+        MPEG-TS is remuxed by TSRemuxPipe instead.
+        """
+        name, ext = os.path.splitext(filename)
+        new_name = u"{0}.mp4".format(name)
+        if self.detect is None:
+            if self.merge_subtitle:
+                log.warning("Cant merge the subtitle without ffmpeg or avconv, it is kept in a separate file")
+            log.info(u"Muxing into %s while downloading", new_name)
+            return TSRemuxPipe(u"{0}.temp".format(new_name), new_name)
+        if self.merge_subtitle:
+            log.info(u"Muxing and merging the subtitle into %s while downloading", new_name)
+        else:
+            log.info(u"Muxing into %s while downloading", new_name)
+        tempfile = u"{0}.temp".format(new_name)
+        cmd = self._remux_cmd("pipe:0", ext, tempfile, name)
+        remove = []
+        if self.merge_subtitle and not self.external_subtitle:
+            remove = self._subtitle_files(name)
+        return RemuxPipe(cmd, tempfile, new_name, remove)
+
+    def _remux_cmd(self, source, ext, tempfile, name=None):
+        if name is None:
+            name = os.path.splitext(source)[0]
+        arguments = ["-map", "0:v", "-map", "0:a", "-c", "copy", "-copyts", "-f", "mp4"]
+        if ext == ".ts":
+            arguments += ["-bsf:a", "aac_adtstoasc"]
+        cmd = [self.detect]
+        if source == "pipe:0":
+            # Don't make ffmpeg guess what's coming
+            cmd += ["-f", "mpegts" if ext == ".ts" else "flv"]
+        cmd += ["-i", source]
+
+        if self.merge_subtitle:
+            langs = self.sublanguage()
+            for stream_num, language in enumerate(langs):
+                arguments += ["-map", str(stream_num + 1), "-c:s:" + str(stream_num), "mov_text", "-metadata:s:s:" + str(stream_num), "language=" + language]
+            for subfile in self._subtitle_files(name):
+                cmd += ["-i", subfile]
+
+        arguments += ["-y", tempfile]
+        return cmd + arguments
+
+    def _subtitle_files(self, name):
+        if len(self.subfixes) >= 2:
+            return ["{0}.srt".format(name + subfix) for subfix in self.subfixes]
+        return ["{0}.srt".format(name)]
+
+    def _remove_subtitles(self, name):
+        for subfile in self._subtitle_files(name):
+            os.remove(subfile)
 
     def merge(self):
         if self.detect is None:
@@ -194,3 +214,148 @@ class postprocess(object):
                     os.remove(subfile)
             else: os.remove(subfile)
         os.rename(tempfile, orig_filename)
+
+    def merge_mp4(self):
+        """
+        Merge the video and audio of a DASH download without ffmpeg.
+        """
+        if self.stream.finished is False:
+            return
+
+        orig_filename = self.stream.options.output
+        name = os.path.splitext(orig_filename)[0]
+        audio_filename = u"{0}.m4a".format(name)
+        if not os.path.isfile(audio_filename):
+            return
+        if self.merge_subtitle:
+            log.warning("Cant merge the subtitle without ffmpeg or avconv, it is kept in a separate file")
+        log.info("Merge audio and video into %s", orig_filename)
+
+        tempfile = u"{0}.temp".format(orig_filename)
+        try:
+            with open(tempfile, "wb") as fd:
+                mux_files([orig_filename, audio_filename], fd)
+        except ValueError as e:
+            log.error("Something went wrong: %s", e)
+            os.remove(tempfile)
+            return
+
+        log.info("Merging done, removing old files.")
+        os.remove(orig_filename)
+        os.remove(audio_filename)
+        os.rename(tempfile, orig_filename)
+
+
+class RemuxPipe(object):
+    """
+    A file-like object that feeds what is written to it to ffmpeg,
+    which remuxes it into an mp4 file at the same time. The mp4 is
+    put in place when the pipe is closed, if ffmpeg was happy. If
+    ffmpeg quits before that, writing raises UIException so the
+    download stops instead of going on for nothing.
+    """
+    def __init__(self, cmd, tempfile, filename, remove=None):
+        self.tempfile = tempfile
+        self.filename = filename
+        self.remove = remove or []
+        self.written = 0
+        self.closed = False
+        # ffmpeg writes a lot on stderr while working. Keep it in a
+        # file so it can't fill up a pipe and stop ffmpeg.
+        self.stderr = TemporaryFile()
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=self.stderr, stderr=self.stderr)
+
+    def write(self, data):
+        try:
+            self.proc.stdin.write(data)
+        except (IOError, OSError):
+            self._failed()
+        self.written += len(data)
+
+    def read(self, *args):
+        raise IOError("Can't read from ffmpeg")
+
+    def tell(self):
+        return self.written
+
+    def flush(self):
+        try:
+            self.proc.stdin.flush()
+        except (IOError, OSError):
+            self._failed()
+
+    def _failed(self):
+        # ffmpeg has quit, close() tells why
+        self.close()
+        raise UIException("ffmpeg stopped remuxing into %s" % self.filename)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        self.proc.wait()
+        self.stderr.seek(0)
+        stderr = self.stderr.read().decode('utf-8', 'replace')
+        self.stderr.close()
+        if self.proc.returncode != 0:
+            msg = stderr.strip().split('\n')[-1]
+            log.error("Something went wrong: %s", msg)
+            if os.path.isfile(self.tempfile):
+                os.remove(self.tempfile)
+            return
+        log.info("Muxing done.")
+        for filename in self.remove:
+            os.remove(filename)
+        os.rename(self.tempfile, self.filename)
+
+
+class TSRemuxPipe(object):
+    """
+    Like RemuxPipe, but the MPEG-TS written to it is remuxed by
+    TSRemuxer, for when there is no ffmpeg.
+    """
+    def __init__(self, tempfile, filename):
+        self.tempfile = tempfile
+        self.filename = filename
+        self.error = None
+        self.closed = False
+        self.fd = open(tempfile, "wb")
+        self.remuxer = TSRemuxer(self.fd)
+
+    def write(self, data):
+        try:
+            self.remuxer.write(data)
+        except ValueError as e:
+            self.error = e
+            self.close()
+            raise UIException("Stopped remuxing into %s" % self.filename)
+
+    def read(self, *args):
+        raise IOError("Can't read from the remuxer")
+
+    def tell(self):
+        return self.remuxer.tell()
+
+    def flush(self):
+        self.fd.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.error is None:
+            try:
+                self.remuxer.close()
+            except ValueError as e:
+                self.error = e
+        self.fd.close()
+        if self.error is not None:
+            log.error("Something went wrong: %s", self.error)
+            os.remove(self.tempfile)
+            return
+        log.info("Muxing done.")
+        os.rename(self.tempfile, self.filename)
@@ -0,0 +1,256 @@
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil; coding: utf-8 -*-
+"""
+Find out the language of a subtitle without asking anyone.
+
+Every language has a profile of how often each character trigram
+(" hj", "hjä", ...) is in a sample of everyday dialogue, and a text
+gets the language most likely to have given its trigrams (naive
+Bayes). That tells apart the Nordic languages, and the other ones we
+see subtitles in, from a few lines of text. A language code is ISO
+639-3, as ffmpeg wants it for the metadata.
+"""
+from __future__ import absolute_import, unicode_literals
+import re
+import math
+import hashlib
+import threading
+
+from svtplay_dl.utils import ensure_unicode
+
+WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+TAG_RE = re.compile(r"<[^>]*>")
+TIMING_RE = re.compile(r"^\s*\d+\s*$|-->")
+
+# Smoothing, for trigrams that aren't in the sample of a language
+ALPHA = 0.1
+# Fewer trigrams than this say too little about the language
+MIN_NGRAMS = 20
+# If fewer of the trigrams than this are in the sample of the most
+# likely language, the text is in none of the languages we know.
+MIN_COVERAGE = 0.4
+
+SAMPLES = {
+    "swe": "Hej, vad gör du här? Jag trodde att du skulle vara hemma i kväll. Vi måste prata om det som "
+           "hände igår. Det är inte så lätt att förklara, men jag ska försöka. Kan du komma hit ett tag? "
+           "Nej, jag vill inte det. Varför säger du så? Han har redan gått, och hon vet ingenting om det. "
+           "Tack så mycket för hjälpen. Vi ses i morgon bitti. Jag älskar dig, men jag kan inte stanna "
+           "längre. Hur mycket kostar det? Det här är min bror och hans fru. Barnen leker ute i "
+           "trädgården. Vad tycker du om den nya lärarens förslag? Vi behöver mer tid. Och sedan gick de "
+           "tillsammans till stationen för att hämta mormor. Kom ihåg att stänga dörren. Jag har aldrig "
+           "sett någonting liknande. Det var en gång en flicka som bodde i skogen.",
+    "nor": "Hei, hva gjør du her? Jeg trodde at du skulle være hjemme i kveld. Vi må snakke om det som "
+           "skjedde i går. Det er ikke så lett å forklare, men jeg skal prøve. Kan du komme hit en "
+           "stund? Nei, jeg vil ikke det. Hvorfor sier du det? Han har allerede gått, og hun vet "
+           "ingenting om det. Tusen takk for hjelpen. Vi ses i morgen tidlig. Jeg elsker deg, men jeg "
+           "kan ikke bli lenger. Hvor mye koster det? Dette er broren min og kona hans. Barna leker ute "
+           "i hagen. Hva synes du om forslaget til den nye læreren? Vi trenger mer tid. Og så gikk de "
+           "sammen til stasjonen for å hente bestemor. Husk å lukke døra. Jeg har aldri sett noe "
+           "lignende. Det var en gang en jente som bodde i skogen.",
+    "dan": "Hej, hvad laver du her? Jeg troede, at du skulle være hjemme i aften. Vi bliver nødt til at "
+           "tale om det, der skete i går. Det er ikke så let at forklare, men jeg vil prøve. Kan du "
+           "komme herhen et øjeblik? Nej, det vil jeg ikke. Hvorfor siger du det? Han er allerede gået, "
+           "og hun ved ikke noget om det. Mange tak for hjælpen. Vi ses i morgen tidlig. Jeg elsker "
+           "dig, men jeg kan ikke blive længere. Hvor meget koster det? Det her er min bror og hans "
+           "kone. Børnene leger ude i haven. Hvad synes du om den nye lærers forslag? Vi har brug for "
+           "mere tid. Og så gik de sammen hen til stationen for at hente mormor. Husk at lukke døren. "
+           "Jeg har aldrig set noget lignende. Der var engang en pige, som boede i skoven.",
+    "fin": "Hei, mitä sinä teet täällä? Luulin, että olisit kotona tänä iltana. Meidän täytyy puhua "
+           "siitä, mitä eilen tapahtui. Sitä ei ole helppo selittää, mutta yritän. Voitko tulla tänne "
+           "hetkeksi? En, en halua. Miksi sanot noin? Hän on jo lähtenyt, eikä hän tiedä siitä mitään. "
+           "Kiitos paljon avusta. Nähdään huomenna aamulla. Minä rakastan sinua, mutta en voi jäädä "
+           "pidempään. Paljonko se maksaa? Tämä on minun veljeni ja hänen vaimonsa. Lapset leikkivät "
+           "ulkona puutarhassa. Mitä mieltä olet uuden opettajan ehdotuksesta? Tarvitsemme lisää aikaa. "
+           "Sitten he menivät yhdessä asemalle hakemaan isoäitiä. Muista sulkea ovi. En ole koskaan "
+           "nähnyt mitään tällaista. Olipa kerran tyttö, joka asui metsässä.",
+    "isl": "Halló, hvað ert þú að gera hér? Ég hélt að þú yrðir heima í kvöld. Við verðum að tala um það "
+           "sem gerðist í gær. Það er ekki auðvelt að útskýra, en ég skal reyna. Getur þú komið hingað "
+           "smástund? Nei, ég vil það ekki. Af hverju segir þú þetta? Hann er þegar farinn, og hún veit "
+           "ekkert um það. Takk kærlega fyrir hjálpina. Sjáumst snemma í fyrramálið. Ég elska þig, en "
+           "ég get ekki verið lengur. Hvað kostar þetta? Þetta er bróðir minn og konan hans. Börnin eru "
+           "að leika sér úti í garðinum. Hvað finnst þér um tillögu nýja kennarans? Við þurfum meiri "
+           "tíma. Svo fóru þau saman á stöðina að sækja ömmu. Mundu að loka dyrunum. Ég hef aldrei séð "
+           "neitt þessu líkt. Einu sinni var stelpa sem bjó í skóginum.",
+    "eng": "Hi, what are you doing here? I thought you would be at home tonight. We have to talk about "
+           "what happened yesterday. It is not that easy to explain, but I will try. Can you come over "
+           "here for a moment? No, I don't want to. Why would you say that? He has already left, and "
+           "she doesn't know anything about it. Thank you so much for the help. See you early tomorrow "
+           "morning. I love you, but I can't stay any longer. How much does it cost? This is my brother "
+           "and his wife. The children are playing outside in the garden. What do you think about the "
+           "new teacher's suggestion? We need more time. And then they went together to the station to "
+           "pick up grandmother. Remember to close the door. I have never seen anything like it. Once "
+           "upon a time there was a girl who lived in the forest.",
+    "deu": "Hallo, was machst du hier? Ich dachte, du wärst heute Abend zu Hause. Wir müssen darüber "
+           "reden, was gestern passiert ist. Es ist nicht so leicht zu erklären, aber ich werde es "
+           "versuchen. Kannst du kurz herkommen? Nein, das will ich nicht. Warum sagst du das? Er ist "
+           "schon gegangen, und sie weiß nichts davon. Vielen Dank für die Hilfe. Wir sehen uns morgen "
+           "früh. Ich liebe dich, aber ich kann nicht länger bleiben. Wie viel kostet das? Das ist mein "
+           "Bruder und seine Frau. Die Kinder spielen draußen im Garten. Was hältst du von dem Vorschlag "
+           "des neuen Lehrers? Wir brauchen mehr Zeit. Und dann gingen sie zusammen zum Bahnhof, um die "
+           "Großmutter abzuholen. Denk daran, die Tür zu schließen. So etwas habe ich noch nie gesehen. "
+           "Es war einmal ein Mädchen, das im Wald wohnte.",
+    "fra": "Salut, qu'est-ce que tu fais ici? Je pensais que tu serais à la maison ce soir. Nous devons "
+           "parler de ce qui s'est passé hier. Ce n'est pas si facile à expliquer, mais je vais "
+           "essayer. Tu peux venir ici un moment? Non, je ne veux pas. Pourquoi tu dis ça? Il est déjà "
+           "parti, et elle ne sait rien. Merci beaucoup pour ton aide. On se voit demain matin. Je "
+           "t'aime, mais je ne peux pas rester plus longtemps. Combien ça coûte? C'est mon frère et sa "
+           "femme. Les enfants jouent dehors dans le jardin. Que penses-tu de la proposition du nouveau "
+           "professeur? Nous avons besoin de plus de temps. Et puis ils sont allés ensemble à la gare "
+           "pour chercher la grand-mère. N'oublie pas de fermer la porte. Je n'ai jamais vu une chose "
+           "pareille. Il était une fois une fille qui vivait dans la forêt.",
+    "spa": "Hola, ¿qué haces aquí? Pensaba que estarías en casa esta noche. Tenemos que hablar de lo que "
+           "pasó ayer. No es tan fácil de explicar, pero lo intentaré. ¿Puedes venir aquí un momento? "
+           "No, no quiero. ¿Por qué dices eso? Él ya se ha ido, y ella no sabe nada de eso. Muchas "
+           "gracias por la ayuda. Nos vemos mañana temprano. Te quiero, pero no puedo quedarme más "
+           "tiempo. ¿Cuánto cuesta? Este es mi hermano y su mujer. Los niños están jugando fuera en el "
+           "jardín. ¿Qué te parece la propuesta del nuevo profesor? Necesitamos más tiempo. Y luego "
+           "fueron juntos a la estación para recoger a la abuela. Recuerda cerrar la puerta. Nunca he "
+           "visto nada parecido. Había una vez una niña que vivía en el bosque.",
+    "ita": "Ciao, che cosa fai qui? Pensavo che saresti stato a casa stasera. Dobbiamo parlare di quello "
+           "che è successo ieri. Non è così facile da spiegare, ma ci proverò. Puoi venire qui un "
+           "attimo? No, non voglio. Perché dici così? Lui è già andato via, e lei non ne sa niente. "
+           "Grazie mille per l'aiuto. Ci vediamo domani mattina presto. Ti amo, ma non posso restare più "
+           "a lungo. Quanto costa? Questo è mio fratello e sua moglie. I bambini giocano fuori nel "
+           "giardino. Che cosa pensi della proposta del nuovo insegnante? Abbiamo bisogno di più tempo. "
+           "E poi sono andati insieme alla stazione a prendere la nonna. Ricordati di chiudere la porta. "
+           "Non ho mai visto niente del genere. C'era una volta una ragazza che viveva nel bosco.",
+    "nld": "Hoi, wat doe jij hier? Ik dacht dat je vanavond thuis zou zijn. We moeten praten over wat er "
+           "gisteren is gebeurd. Het is niet zo makkelijk uit te leggen, maar ik zal het proberen. Kun "
+           "je even hier komen? Nee, dat wil ik niet. Waarom zeg je dat? Hij is al weggegaan, en zij "
+           "weet er niets van. Heel erg bedankt voor de hulp. Tot morgenochtend vroeg. Ik hou van je, "
+           "maar ik kan niet langer blijven. Hoeveel kost het? Dit is mijn broer en zijn vrouw. De "
+           "kinderen spelen buiten in de tuin. Wat vind je van het voorstel van de nieuwe leraar? We "
+           "hebben meer tijd nodig. En toen gingen ze samen naar het station om oma op te halen. Vergeet "
+           "niet de deur dicht te doen. Ik heb nog nooit zoiets gezien. Er was eens een meisje dat in "
+           "het bos woonde.",
+    "por": "Olá, o que você está fazendo aqui? Eu pensei que você estaria em casa hoje à noite. Nós "
+           "precisamos falar sobre o que aconteceu ontem. Não é tão fácil de explicar, mas vou tentar. "
+           "Você pode vir aqui um momento? Não, eu não quero. Por que você diz isso? Ele já foi embora, "
+           "e ela não sabe nada sobre isso. Muito obrigado pela ajuda. Até amanhã cedo. Eu te amo, mas "
+           "não posso ficar mais tempo. Quanto custa? Este é o meu irmão e a mulher dele. As crianças "
+           "estão brincando lá fora no jardim. O que você acha da proposta do novo professor? "
+           "Precisamos de mais tempo. E então eles foram juntos à estação buscar a avó. Lembre-se de "
+           "fechar a porta. Nunca vi nada parecido. Era uma vez uma menina que morava na floresta.",
+    "pol": "Cześć, co ty tutaj robisz? Myślałem, że będziesz dziś wieczorem w domu. Musimy porozmawiać "
+           "o tym, co się wczoraj stało. To nie jest takie łatwe do wyjaśnienia, ale spróbuję. Możesz "
+           "tu przyjść na chwilę? Nie, nie chcę. Dlaczego tak mówisz? On już wyszedł, a ona nic o tym "
+           "nie wie. Dziękuję bardzo za pomoc. Do zobaczenia jutro rano. Kocham cię, ale nie mogę "
+           "zostać dłużej. Ile to kosztuje? To jest mój brat i jego żona. Dzieci bawią się na dworze w "
+           "ogrodzie. Co myślisz o propozycji nowego nauczyciela? Potrzebujemy więcej czasu. A potem "
+           "poszli razem na dworzec po babcię. Pamiętaj, żeby zamknąć drzwi. Nigdy nie widziałem "
+           "czegoś takiego. Dawno temu była sobie dziewczynka, która mieszkała w lesie.",
+    "rus": "Привет, что ты здесь делаешь? Я думал, что ты сегодня вечером будешь дома. Нам нужно "
+           "поговорить о том, что случилось вчера. Это не так легко объяснить, но я попробую. Ты "
+           "можешь подойти сюда на минутку? Нет, я не хочу. Почему ты так говоришь? Он уже ушёл, а "
+           "она ничего об этом не знает. Большое спасибо за помощь. Увидимся завтра утром. Я люблю "
+           "тебя, но я не могу остаться дольше. Сколько это стоит? Это мой брат и его жена. Дети "
+           "играют на улице в саду. Что ты думаешь о предложении нового учителя? Нам нужно больше "
+           "времени. А потом они вместе пошли на вокзал за бабушкой. Не забудь закрыть дверь. Я "
+           "никогда не видел ничего подобного. Жила-была девочка, которая жила в лесу. Мой отец каждый "
+           "день ездит на работу, а мы с мамой остаёмся дома. Где они были всю ночь? Мы их искали "
+           "везде. Давай пойдём купаться, вода тёплая. Мне кажется, что он нам не поможет.",
+}
+
+# Subtitle labels (as in the file name suffix), in Swedish as the
+# services give them, for when the service has told us the language.
+LABELS = {
+    "svenska": "swe", "norska": "nor", "danska": "dan", "finska": "fin",
+    "islandska": "isl", "engelska": "eng", "tyska": "deu", "franska": "fra",
+    "spanska": "spa", "italienska": "ita", "nederlandska": "nld", "portugisiska": "por",
+    "polska": "pol", "ryska": "rus", "arabiska": "ara", "persiska": "fas",
+    "dari": "prs", "somaliska": "som", "tigrinja": "tir", "kurdiska": "kur",
+    "bosniska": "bos", "romani": "rom", "nordsamiska": "sme", "sydsamiska": "sma",
+    "lulesamiska": "smj", "meankieli": "fit", "jiddisch": "yid", "teckensprak": "swl",
+}
+
+
+def ngrams(text, size=3):
+    """
+    Count the character n-grams of the words in text, with a space
+    before and after every word.
+
+        >>> sorted(ngrams("Hej hej").items())
+        [(' he', 2), ('ej ', 2), ('hej', 2)]
+    """
+    counts = {}
+    for word in WORD_RE.findall(ensure_unicode(text).lower()):
+        word = " %s " % word
+        for i in range(len(word) - size + 1):
+            gram = word[i:i + size]
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def profiles():
+    """
+    The profile of every language, made from SAMPLES the first time
+    it is needed: the log probability of each trigram, and of one
+    that isn't in the sample.
+    """
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            counts = dict((lang, ngrams(sample)) for lang, sample in SAMPLES.items())
+            vocabulary = len(set(gram for x in counts.values() for gram in x))
+            _profiles = {}
+            for lang, grams in counts.items():
+                total = math.log(sum(grams.values()) + ALPHA * vocabulary)
+                logprob = dict((gram, math.log(count + ALPHA) - total) for gram, count in grams.items())
+                _profiles[lang] = (logprob, math.log(ALPHA) - total)
+        return _profiles
+
+
+def detect_language(text):
+    """
+    Return the language of text, or "und" if it isn't in one we know
+    or is too short to tell.
+
+        >>> detect_language("Jag vet inte vad hon har gjort med pengarna.")
+        'swe'
+    """
+    counts = ngrams(text)
+    total = sum(counts.values())
+    if total < MIN_NGRAMS:
+        return "und"
+    best, best_score = None, None
+    for lang, (logprob, unknown) in profiles().items():
+        score = sum(count * logprob.get(gram, unknown) for gram, count in counts.items())
+        if best_score is None or score > best_score:
+            best, best_score = lang, score
+    logprob = profiles()[best][0]
+    if sum(count for gram, count in counts.items() if gram in logprob) < MIN_COVERAGE * total:
+        return "und"
+    return best
+
+
+def label_language(subfix):
+    """
+    Return the language of a subtitle from its label, e.g.
+    "-lulesamiska.oversattning", or None if we don't know the label.
+    """
+    words = WORD_RE.findall(ensure_unicode(subfix).lower())
+    if words:
+        return LABELS.get(words[0])
+    return None
+
+
+_cache = {}
+
+
+def subtitle_language(filename):
+    """
+    Return the language of an SRT file. The answer is kept for files
+    with the same content, in case we see the file again.
+    """
+    with open(filename, "rb") as fd:
+        data = fd.read()
+    digest = hashlib.sha1(data).hexdigest()
+    if digest not in _cache:
+        text = data.decode("utf-8", "replace")
+        lines = [TAG_RE.sub("", x) for x in text.splitlines() if not TIMING_RE.search(x)]
+        _cache[digest] = detect_language(" ".join(lines))
+    return _cache[digest]
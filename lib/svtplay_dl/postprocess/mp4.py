@@ -0,0 +1,311 @@
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+from __future__ import absolute_import
+import struct
+
+# Top level boxes that only describe one of the inputs, or nothing
+# at all. They are left out of the muxed file.
+_dropped = [b"styp", b"sidx", b"ssix", b"mfra", b"free", b"skip"]
+
+
+def iter_boxes(data, start=0, end=None):
+    """
+    Yield (type, offset, size, header size) of the boxes in
+    data[start:end].
+
+        >>> list(iter_boxes(b"\\x00\\x00\\x00\\x08free\\x00\\x00\\x00\\x09mdat!"))
+        [(b'free', 0, 8, 8), (b'mdat', 8, 9, 8)]
+    """
+    if end is None:
+        end = len(data)
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise ValueError("Broken MP4 box %r at %d" % (kind, pos))
+        yield kind, pos, size, header
+        pos += size
+
+
+def read_boxes(file_d):
+    """
+    Yield (type, data) for each top level box in a file, reading
+    one box at a time.
+    """
+    while True:
+        head = file_d.read(8)
+        if len(head) < 8:
+            return
+        size, kind = struct.unpack(">I4s", head)
+        if size == 1:
+            extended = file_d.read(8)
+            size = struct.unpack(">Q", extended)[0]
+            head += extended
+        elif size == 0:
+            yield kind, head + file_d.read()
+            return
+        yield kind, head + file_d.read(size - len(head))
+
+
+def read_fragments(file_d):
+    """
+    Read a fragmented MP4 file in pieces that FragmentedMP4Muxer.add()
+    can take: first everything before the first moof, then each moof
+    together with the boxes after it.
+    """
+    piece = []
+    for kind, data in read_boxes(file_d):
+        if kind == b"moof" and piece:
+            yield b"".join(piece)
+            piece = []
+        piece.append(data)
+    if piece:
+        yield b"".join(piece)
+
+
+def find_box(data, path, start=0, end=None):
+    """
+    Find a box by its path of types, like [b"trak", b"mdia", b"mdhd"].
+    Returns (offset, size, header size) of the first match, or None.
+    """
+    for kind, pos, size, header in iter_boxes(data, start, end):
+        if kind == path[0]:
+            if len(path) == 1:
+                return pos, size, header
+            found = find_box(data, path[1:], pos + header, pos + size)
+            if found:
+                return found
+    return None
+
+
+def box(kind, payload):
+    return struct.pack(">I4s", len(payload) + 8, kind) + payload
+
+
+class _Track(object):
+    """
+    One input of the muxer, described by the moov of its init segment.
+    """
+    def __init__(self, moov):
+        self.moov = bytearray(moov)
+        found = find_box(self.moov, [b"moov", b"trak"])
+        if found is None:
+            raise ValueError("No track in MP4 init segment")
+        pos, size, _ = found
+        self.trak = bytearray(self.moov[pos:pos + size])
+
+        pos, _, header = find_box(self.trak, [b"trak", b"mdia", b"mdhd"])
+        if self.trak[pos + header] == 1:
+            self.timescale = struct.unpack_from(">I", self.trak, pos + header + 20)[0]
+        else:
+            self.timescale = struct.unpack_from(">I", self.trak, pos + header + 12)[0]
+
+        found = find_box(self.moov, [b"moov", b"mvex", b"trex"])
+        if found is None:
+            raise ValueError("Not a fragmented MP4 (no trex box)")
+        pos, size, _ = found
+        self.trex = bytearray(self.moov[pos:pos + size])
+
+        self.track_id = None
+        # (decode time in seconds, fragment, where it was in the input)
+        self.pending = []
+        self.position = 0
+        self.time = 0
+        self.done = False
+
+    def set_track_id(self, track_id):
+        self.track_id = track_id
+        pos, _, header = find_box(self.trak, [b"trak", b"tkhd"])
+        if self.trak[pos + header] == 1:
+            struct.pack_into(">I", self.trak, pos + header + 20, track_id)
+        else:
+            struct.pack_into(">I", self.trak, pos + header + 12, track_id)
+        struct.pack_into(">I", self.trex, 12, track_id)
+
+
+class FragmentedMP4Muxer(object):
+    """
+    Mux fragmented MP4 (as used by DASH) from several inputs into
+    one fragmented MP4, without ffmpeg.
+
+    Data is given to add() as it arrives: the init segment, which has
+    the moov, and then media segments with moof/mdat pairs. The moov
+    of all inputs are combined into one, and the fragments are
+    written in decode time order, so the output is interleaved and
+    playable as it is being written. Only the fragments that can't be
+    placed yet are kept in memory.
+    """
+    def __init__(self, file_d, names):
+        """
+        Parameters:
+        file_d:   where to write the muxed file
+        names:    one name for each input, e.g. ["video", "audio"].
+                  The first one's ftyp and movie header are used.
+        """
+        self.file_d = file_d
+        self.names = names
+        self.tracks = {}
+        self.ftyp = None
+        self.header_written = False
+        self.written = 0
+        self.sequence = 0
+
+    def add(self, name, data):
+        """
+        Add the next piece of input name. It must be made of whole
+        boxes.
+        """
+        track = self.tracks.get(name)
+        fragment = None
+        fragments = []
+        for kind, pos, size, _ in iter_boxes(data):
+            if kind == b"ftyp":
+                if self.ftyp is None and name == self.names[0]:
+                    self.ftyp = bytes(data[pos:pos + size])
+            elif kind == b"moov":
+                if self.header_written:
+                    raise ValueError("Got an init segment for %s after the first fragment" % name)
+                track = _Track(data[pos:pos + size])
+                self.tracks[name] = track
+            elif kind == b"moof":
+                if track is None:
+                    raise ValueError("Got a fragment for %s before its init segment" % name)
+                fragment = bytearray(data[pos:pos + size])
+                fragments.append((self._decode_time(track, fragment), fragment, track.position + pos))
+            elif kind in _dropped:
+                continue
+            elif fragment is not None:
+                fragment.extend(data[pos:pos + size])
+        if track is not None:
+            track.position += len(data)
+            track.pending.extend(fragments)
+        self._flush()
+
+    def end(self, name):
+        """
+        There is no more data for input name.
+        """
+        if name in self.tracks:
+            self.tracks[name].done = True
+        else:
+            # Never got started, go on without it
+            self.names = [x for x in self.names if x != name]
+        self._flush()
+
+    def close(self):
+        for name in list(self.names):
+            self.end(name)
+
+    def _decode_time(self, track, moof):
+        found = find_box(moof, [b"moof", b"traf", b"tfdt"])
+        if found:
+            pos, _, header = found
+            if moof[pos + header] == 1:
+                decode_time = struct.unpack_from(">Q", moof, pos + header + 4)[0]
+            else:
+                decode_time = struct.unpack_from(">I", moof, pos + header + 4)[0]
+            track.time = float(decode_time) / track.timescale
+        # Without tfdt, keep the order they came in
+        return track.time
+
+    def _write_header(self):
+        tracks = [self.tracks[x] for x in self.names]
+        for idx, track in enumerate(tracks):
+            track.set_track_id(idx + 1)
+
+        first = tracks[0].moov
+        children = []
+        mvex = []
+        for kind, pos, size, header in iter_boxes(first, 8):
+            child = bytearray(first[pos:pos + size])
+            if kind == b"mvhd":
+                # next_track_ID is the last field
+                struct.pack_into(">I", child, size - 4, len(tracks) + 1)
+                children.append(child)
+            elif kind == b"trak":
+                continue
+            elif kind == b"mvex":
+                for kind2, pos2, size2, _ in iter_boxes(child, header):
+                    if kind2 != b"trex":
+                        mvex.append(child[pos2:pos2 + size2])
+            else:
+                children.append(child)
+        children.extend(x.trak for x in tracks)
+        children.append(box(b"mvex", b"".join(bytes(x) for x in mvex + [t.trex for t in tracks])))
+
+        if self.ftyp:
+            self._write(self.ftyp)
+        self._write(box(b"moov", b"".join(bytes(x) for x in children)))
+        self.header_written = True
+
+    def _write_fragment(self, track, fragment, source):
+        self.sequence += 1
+        pos, _, header = find_box(fragment, [b"moof", b"mfhd"])
+        struct.pack_into(">I", fragment, pos + header + 4, self.sequence)
+
+        moof = next(iter_boxes(fragment))
+        for kind, pos, size, header in iter_boxes(fragment, moof[3], moof[2]):
+            if kind != b"traf":
+                continue
+            tfhd, _, tfhd_header = find_box(fragment, [b"tfhd"], pos + header, pos + size)
+            flags = struct.unpack_from(">I", fragment, tfhd + tfhd_header)[0] & 0xffffff
+            struct.pack_into(">I", fragment, tfhd + tfhd_header + 4, track.track_id)
+            if flags & 0x1:
+                # An explicit base-data-offset is relative to the start
+                # of the file, and the fragment has moved.
+                offset = struct.unpack_from(">Q", fragment, tfhd + tfhd_header + 8)[0]
+                struct.pack_into(">Q", fragment, tfhd + tfhd_header + 8, offset + self.written - source)
+        self._write(fragment)
+
+    def _write(self, data):
+        self.file_d.write(data)
+        self.written += len(data)
+
+    def _flush(self):
+        if not self.header_written:
+            if any(x not in self.tracks for x in self.names):
+                return
+            self._write_header()
+
+        tracks = [self.tracks[x] for x in self.names]
+        while True:
+            if any(not x.pending and not x.done for x in tracks):
+                # Can't know what comes next until that one has data
+                return
+            waiting = [x for x in tracks if x.pending]
+            if not waiting:
+                return
+            track = min(waiting, key=lambda x: x.pending[0][0])
+            _, fragment, source = track.pending.pop(0)
+            self._write_fragment(track, fragment, source)
+
+
+def mux_files(filenames, file_d):
+    """
+    Mux the fragmented MP4 files in filenames into file_d, e.g.
+    the video and the audio of a DASH download.
+    """
+    muxer = FragmentedMP4Muxer(file_d, list(filenames))
+    files = [open(x, "rb") for x in filenames]
+    readers = dict((name, read_fragments(fd)) for name, fd in zip(filenames, files))
+    try:
+        while readers:
+            for name in list(readers):
+                # Only read from the files the muxer is waiting for
+                if muxer.header_written and muxer.tracks[name].pending:
+                    continue
+                try:
+                    muxer.add(name, next(readers[name]))
+                except StopIteration:
+                    del readers[name]
+                    muxer.end(name)
+        muxer.close()
+    finally:
+        for fd in files:
+            fd.close()
@@ -0,0 +1,574 @@
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+"""
+Remux MPEG-TS with H.264 video and AAC audio, as used by HLS, into
+fragmented MP4 without ffmpeg.
+"""
+from __future__ import absolute_import
+import struct
+
+from svtplay_dl.postprocess.mp4 import box
+
+# stream_type in the PMT
+STREAM_TYPES = {0x1b: "video", 0x0f: "audio"}
+
+AAC_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350]
+
+# Length of a fragment in 90 kHz, at least
+FRAGMENT_DURATION = 90000
+# A fragment is cut without waiting for a key frame after this long
+# (in 90 kHz) or this many bytes of video, so a stream with few or no
+# IDR frames isn't all kept in memory.
+MAX_FRAGMENT_DURATION = 10 * 90000
+MAX_FRAGMENT_SIZE = 16 * 1024 * 1024
+# A timestamp going backwards, or forward by more than this (in
+# 90 kHz), is a discontinuity (e.g. EXT-X-DISCONTINUITY or an ad) and
+# the timeline continues from where it was instead.
+MAX_GAP = 10 * 90000
+# Audio frames up to 10 ms (in 90 kHz) later than the ones before them
+# end are not a gap
+AUDIO_TOLERANCE = 900
+
+UNITY_MATRIX = struct.pack(">9I", 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+
+
+def fullbox(kind, version, flags, payload):
+    return box(kind, struct.pack(">I", (version << 24) | flags) + payload)
+
+
+class BitReader(object):
+    """
+    Read bits and Exp-Golomb codes, for parsing a SPS.
+    """
+    def __init__(self, data):
+        self.data = bytearray(data)
+        self.pos = 0
+
+    def bits(self, n):
+        value = 0
+        for _ in range(n):
+            byte = self.data[self.pos >> 3] if self.pos >> 3 < len(self.data) else 0
+            value = (value << 1) | ((byte >> (7 - (self.pos & 7))) & 1)
+            self.pos += 1
+        return value
+
+    def ue(self):
+        zeros = 0
+        while self.bits(1) == 0 and zeros < 32:
+            zeros += 1
+        return (1 << zeros) - 1 + self.bits(zeros)
+
+    def se(self):
+        value = self.ue()
+        if value & 1:
+            return (value + 1) // 2
+        return -(value // 2)
+
+
+def parse_sps(nal):
+    """
+    Get what the MP4 headers need from a H.264 sequence parameter set:
+    the size of the picture, and for the high profiles the chroma
+    format and bit depths.
+    """
+    # Remove the emulation prevention bytes
+    reader = BitReader(bytes(nal[1:]).replace(b"\x00\x00\x03", b"\x00\x00"))
+    sps = {"profile": reader.bits(8), "compatibility": reader.bits(8), "level": reader.bits(8),
+           "chroma_format": 1, "bit_depth_luma": 8, "bit_depth_chroma": 8}
+    reader.ue()
+    if sps["profile"] in [100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135]:
+        sps["chroma_format"] = reader.ue()
+        if sps["chroma_format"] == 3:
+            reader.bits(1)
+        sps["bit_depth_luma"] = reader.ue() + 8
+        sps["bit_depth_chroma"] = reader.ue() + 8
+        reader.bits(1)
+        if reader.bits(1):
+            for i in range(8 if sps["chroma_format"] != 3 else 12):
+                if reader.bits(1):
+                    last = next_scale = 8
+                    for _ in range(16 if i < 6 else 64):
+                        if next_scale:
+                            next_scale = (last + reader.se() + 256) % 256
+                        last = next_scale or last
+    reader.ue()
+    poc_type = reader.ue()
+    if poc_type == 0:
+        reader.ue()
+    elif poc_type == 1:
+        reader.bits(1)
+        reader.se()
+        reader.se()
+        for _ in range(reader.ue()):
+            reader.se()
+    reader.ue()
+    reader.bits(1)
+    width = (reader.ue() + 1) * 16
+    height = reader.ue() + 1
+    frame_mbs_only = reader.bits(1)
+    height *= (2 - frame_mbs_only) * 16
+    if not frame_mbs_only:
+        reader.bits(1)
+    reader.bits(1)
+    if reader.bits(1):
+        left, right, top, bottom = reader.ue(), reader.ue(), reader.ue(), reader.ue()
+        crop_x = 2 if sps["chroma_format"] in [1, 2] else 1
+        crop_y = (2 if sps["chroma_format"] == 1 else 1) * (2 - frame_mbs_only)
+        width -= (left + right) * crop_x
+        height -= (top + bottom) * crop_y
+    sps["width"] = width
+    sps["height"] = height
+    return sps
+
+
+def split_nal_units(data):
+    """
+    Split H.264 Annex B data into its NAL units.
+
+        >>> split_nal_units(b"\\x00\\x00\\x00\\x01\\x09\\xf0\\x00\\x00\\x01\\x65\\x88")
+        [b'\\t\\xf0', b'e\\x88']
+    """
+    units = []
+    start = data.find(b"\x00\x00\x01")
+    while start >= 0:
+        end = data.find(b"\x00\x00\x01", start + 3)
+        if end < 0:
+            unit = data[start + 3:]
+        else:
+            unit = data[start + 3:end]
+        # A four byte start code leaves a zero at the end
+        unit = unit.rstrip(b"\x00") if end >= 0 else unit
+        if unit:
+            units.append(bytes(unit))
+        start = end
+    return units
+
+
+def _timestamp(data, pos):
+    return (((data[pos] >> 1) & 7) << 30) | (data[pos + 1] << 22) | ((data[pos + 2] >> 1) << 15) | \
+        (data[pos + 3] << 7) | (data[pos + 4] >> 1)
+
+
+class TSDemuxer(object):
+    """
+    Split MPEG-TS into PES packets of the first H.264 and AAC streams.
+    callback(kind, pts, dts, data) is called for each PES, where kind
+    is "video" or "audio", and the timestamps are in 90 kHz.
+    """
+    def __init__(self, callback):
+        self.callback = callback
+        self.rest = bytearray()
+        self.pmt_pid = None
+        self.streams = {}
+        self.pes = {}
+
+    def feed(self, data):
+        buf = self.rest
+        buf.extend(data)
+        pos = 0
+        end = len(buf)
+        while end - pos >= 188:
+            if buf[pos] != 0x47:
+                # Lost sync, look for the next packet
+                pos += 1
+                continue
+            self._packet(buf, pos)
+            pos += 188
+        self.rest = buf[pos:]
+
+    def close(self):
+        for pid in list(self.pes):
+            self._pes(pid)
+
+    def _packet(self, buf, pos):
+        start = (buf[pos + 1] & 0x40) != 0
+        pid = ((buf[pos + 1] & 0x1f) << 8) | buf[pos + 2]
+        control = (buf[pos + 3] >> 4) & 3
+        payload = pos + 4
+        if control & 2:
+            payload += 1 + buf[pos + 4]
+        if not control & 1 or payload >= pos + 188:
+            return
+
+        if pid == 0 and start:
+            section = payload + 1 + buf[payload]
+            length = ((buf[section + 1] & 0x0f) << 8) | buf[section + 2]
+            for i in range(section + 8, section + 3 + length - 4, 4):
+                if (buf[i] << 8) | buf[i + 1]:
+                    self.pmt_pid = ((buf[i + 2] & 0x1f) << 8) | buf[i + 3]
+                    break
+        elif pid == self.pmt_pid and start:
+            section = payload + 1 + buf[payload]
+            length = ((buf[section + 1] & 0x0f) << 8) | buf[section + 2]
+            i = section + 12 + (((buf[section + 10] & 0x0f) << 8) | buf[section + 11])
+            while i < section + 3 + length - 4:
+                kind = STREAM_TYPES.get(buf[i])
+                es_pid = ((buf[i + 1] & 0x1f) << 8) | buf[i + 2]
+                if kind and kind not in self.streams.values():
+                    self.streams[es_pid] = kind
+                i += 5 + (((buf[i + 3] & 0x0f) << 8) | buf[i + 4])
+        elif pid in self.streams:
+            if start:
+                if pid in self.pes:
+                    self._pes(pid)
+                self.pes[pid] = bytearray()
+            if pid in self.pes:
+                self.pes[pid].extend(buf[payload:pos + 188])
+
+    def _pes(self, pid):
+        data = self.pes.pop(pid)
+        if len(data) < 9 or data[0] != 0 or data[1] != 0 or data[2] != 1:
+            return
+        flags = data[7]
+        pts = dts = None
+        if flags & 0x80:
+            pts = dts = _timestamp(data, 9)
+        if flags & 0x40:
+            dts = _timestamp(data, 14)
+        self.callback(self.streams[pid], pts, dts, data[9 + data[8]:])
+
+
+class _Sample(object):
+    def __init__(self, dts, cto, data, key):
+        self.dts = dts
+        self.cto = cto
+        self.data = data
+        self.key = key
+        self.duration = None
+
+
+class TSRemuxer(object):
+    """
+    A file-like object that takes MPEG-TS and writes fragmented MP4
+    to file_d, one fragment for every key frame at least a second
+    after the last one. Only the current fragment is kept in memory.
+
+    H.264 is changed from Annex B to length prefixed NAL units, with
+    the SPS and PPS moved to the avcC box, and the ADTS headers are
+    taken off AAC, which goes in the esds box.
+
+    Raises ValueError for streams it can't handle.
+    """
+    def __init__(self, file_d):
+        self.file_d = file_d
+        self.demuxer = TSDemuxer(self._pes)
+        self.written = 0
+        self.sequence = 0
+        self.header_written = False
+        self.base = None
+        self.sps = None
+        self.pps = None
+        self.audio_config = None
+        self.video = []
+        self.audio = []
+        self.audio_rest = bytearray()
+        # Where the next audio frame starts, in the audio sample rate
+        self.audio_next = None
+        self.video_size = 0
+        self.last_dts = {}
+        # Added to every timestamp, to go over discontinuities
+        self.offset = 0
+
+    def write(self, data):
+        try:
+            self.demuxer.feed(data)
+        except struct.error as e:
+            raise ValueError("Broken stream: %s" % e)
+        self.written += len(data)
+
+    def read(self, *args):
+        raise IOError("Can't read from the remuxer")
+
+    def tell(self):
+        return self.written
+
+    def flush(self):
+        pass
+
+    def close(self):
+        try:
+            self.demuxer.close()
+            if self.video:
+                self.video[-1].duration = self._frame_duration()
+            self._fragment(None)
+        except struct.error as e:
+            raise ValueError("Broken stream: %s" % e)
+
+    def _unwrap(self, kind, ts):
+        # Timestamps are 33 bits, and wrap after a day and a bit
+        last = self.last_dts.get(kind)
+        if last is not None:
+            while ts < last - (1 << 32):
+                ts += 1 << 33
+        self.last_dts[kind] = ts
+        return ts
+
+    def _frame_duration(self):
+        if len(self.video) > 1 and self.video[-2].duration:
+            return self.video[-2].duration
+        return 3000
+
+    def _rebase(self, ts, expected, after):
+        """
+        Return ts on our timeline. If it isn't shortly after the
+        timestamp after, it is taken as expected instead, and so are
+        the timestamps after it.
+        """
+        ts += self.offset
+        if ts <= after or ts - after > MAX_GAP:
+            self.offset += expected - ts
+            ts = expected
+        return ts
+
+    def _pes(self, kind, pts, dts, data):
+        if kind == "video":
+            self._video(pts, dts, data)
+        else:
+            self._audio(pts, data)
+
+    def _video(self, pts, dts, data):
+        if dts is None:
+            return
+        dts = self._unwrap("video", dts)
+        cto = (pts - dts) % (1 << 33)
+        if self.video:
+            previous = self.video[-1]
+            dts = self._rebase(dts, previous.dts + self._frame_duration(), previous.dts)
+        else:
+            dts += self.offset
+        sample = bytearray()
+        key = False
+        for nal in split_nal_units(bytes(data)):
+            nal_type = bytearray(nal[:1])[0] & 0x1f
+            if nal_type == 7:
+                if self.sps is None:
+                    self.sps = nal
+                continue
+            if nal_type == 8:
+                if self.pps is None:
+                    self.pps = nal
+                continue
+            if nal_type == 9:
+                continue
+            if nal_type == 5:
+                key = True
+            sample.extend(struct.pack(">I", len(nal)))
+            sample.extend(nal)
+        if not sample:
+            return
+
+        if self.video:
+            previous = self.video[-1]
+            previous.duration = dts - previous.dts
+            length = dts - self.video[0].dts
+            if (key and length >= FRAGMENT_DURATION) or length >= MAX_FRAGMENT_DURATION or \
+                    self.video_size >= MAX_FRAGMENT_SIZE:
+                self._fragment(dts)
+        self.video.append(_Sample(dts, cto, sample, key))
+        self.video_size += len(sample)
+
+    def _audio(self, pts, data):
+        data = self.audio_rest + data
+        pos = 0
+        frames = 0
+        rate = None
+        if pts is not None:
+            pts = self._unwrap("audio", pts)
+        while pos + 7 <= len(data):
+            if data[pos] != 0xff or data[pos + 1] & 0xf0 != 0xf0:
+                pos += 1
+                continue
+            length = ((data[pos + 3] & 3) << 11) | (data[pos + 4] << 3) | (data[pos + 5] >> 5)
+            if length < 7:
+                pos += 1
+                continue
+            if pos + length > len(data):
+                break
+            header = 7 if data[pos + 1] & 1 else 9
+            profile = (data[pos + 2] >> 6) & 3
+            rate_index = (data[pos + 2] >> 2) & 0xf
+            channels = ((data[pos + 2] & 1) << 2) | (data[pos + 3] >> 6)
+            if rate_index >= len(AAC_RATES):
+                raise ValueError("Unsupported AAC sample rate")
+            rate = AAC_RATES[rate_index]
+            if self.audio_config is None:
+                self.audio_config = (profile + 1, rate_index, channels, rate)
+            if frames == 0 and pts is not None:
+                # Follow the PES timestamps, so a gap in the audio
+                # doesn't put it out of sync with the video.
+                if self.audio_next is None:
+                    self.audio_next = (pts + self.offset) * rate // 90000
+                else:
+                    expected = self.audio_next * 90000 // rate
+                    start = self._rebase(pts, expected, expected - 1024 * 90000 // rate)
+                    if start - expected > AUDIO_TOLERANCE:
+                        self.audio_next = start * rate // 90000
+            elif self.audio_next is None:
+                self.audio_next = 0
+            self.audio.append(_Sample(self.audio_next, 0, data[pos + header:pos + length], True))
+            self.audio_next += 1024
+            frames += 1
+            pos += length
+        self.audio_rest = data[pos:]
+        if "video" not in self.demuxer.streams.values() and len(self.audio) >= 200:
+            self._fragment(None)
+
+    def _write(self, data):
+        self.file_d.write(data)
+
+    def _tracks(self):
+        tracks = []
+        if "video" in self.demuxer.streams.values():
+            tracks.append("video")
+        if "audio" in self.demuxer.streams.values():
+            tracks.append("audio")
+        return tracks
+
+    def _write_header(self):
+        tracks = self._tracks()
+        if not tracks:
+            raise ValueError("No H.264 or AAC in the stream")
+        traks = []
+        trexs = []
+        for track_id, kind in enumerate(tracks, 1):
+            if kind == "video":
+                traks.append(self._video_trak(track_id))
+            else:
+                traks.append(self._audio_trak(track_id))
+            trexs.append(fullbox(b"trex", 0, 0, struct.pack(">5I", track_id, 1, 0, 0, 0)))
+
+        mvhd = fullbox(b"mvhd", 0, 0, struct.pack(">5IH10x", 0, 0, 1000, 0, 0x10000, 0x100) +
+                       UNITY_MATRIX + b"\0" * 24 + struct.pack(">I", len(tracks) + 1))
+        self._write(box(b"ftyp", b"isom" + struct.pack(">I", 0x200) + b"isomiso2iso6avc1mp41"))
+        self._write(box(b"moov", mvhd + b"".join(traks) + box(b"mvex", b"".join(trexs))))
+        self.header_written = True
+
+    def _trak(self, track_id, timescale, handler, width, height, media_header, sample_entry):
+        volume = 0x100 if handler == b"soun" else 0
+        tkhd = fullbox(b"tkhd", 0, 3, struct.pack(">5I8xhhhH", 0, 0, track_id, 0, 0, 0, 0, volume, 0) +
+                       UNITY_MATRIX + struct.pack(">II", width << 16, height << 16))
+        mdhd = fullbox(b"mdhd", 0, 0, struct.pack(">4IHH", 0, 0, timescale, 0, 0x55c4, 0))
+        name = b"VideoHandler\0" if handler == b"vide" else b"SoundHandler\0"
+        hdlr = fullbox(b"hdlr", 0, 0, struct.pack(">I", 0) + handler + b"\0" * 12 + name)
+        dinf = box(b"dinf", fullbox(b"dref", 0, 0, struct.pack(">I", 1) + fullbox(b"url ", 0, 1, b"")))
+        stbl = box(b"stbl", fullbox(b"stsd", 0, 0, struct.pack(">I", 1) + sample_entry) +
+                   fullbox(b"stts", 0, 0, struct.pack(">I", 0)) +
+                   fullbox(b"stsc", 0, 0, struct.pack(">I", 0)) +
+                   fullbox(b"stsz", 0, 0, struct.pack(">II", 0, 0)) +
+                   fullbox(b"stco", 0, 0, struct.pack(">I", 0)))
+        minf = box(b"minf", media_header + dinf + stbl)
+        return box(b"trak", tkhd + box(b"mdia", mdhd + hdlr + minf))
+
+    def _video_trak(self, track_id):
+        if self.sps is None or self.pps is None:
+            raise ValueError("No SPS/PPS in the H.264 stream")
+        sps = parse_sps(self.sps)
+        avcc = struct.pack(">5B", 1, sps["profile"], sps["compatibility"], sps["level"], 0xff)
+        avcc += struct.pack(">BH", 0xe1, len(self.sps)) + self.sps
+        avcc += struct.pack(">BH", 1, len(self.pps)) + self.pps
+        if sps["profile"] in [100, 110, 122, 144]:
+            avcc += struct.pack(">4B", 0xfc | sps["chroma_format"], 0xf8 | (sps["bit_depth_luma"] - 8),
+                                0xf8 | (sps["bit_depth_chroma"] - 8), 0)
+        avc1 = box(b"avc1", b"\0" * 6 + struct.pack(">H", 1) + b"\0" * 16 +
+                   struct.pack(">HHIIIH", sps["width"], sps["height"], 0x480000, 0x480000, 0, 1) +
+                   b"\0" * 32 + struct.pack(">Hh", 0x18, -1) + box(b"avcC", avcc))
+        vmhd = fullbox(b"vmhd", 0, 1, b"\0" * 8)
+        return self._trak(track_id, 90000, b"vide", sps["width"], sps["height"], vmhd, avc1)
+
+    def _audio_trak(self, track_id):
+        if self.audio_config is None:
+            raise ValueError("No AAC frames in the audio stream")
+        objecttype, rate_index, channels, rate = self.audio_config
+        config = struct.pack(">H", (objecttype << 11) | (rate_index << 7) | (channels << 3))
+        decoder = struct.pack(">BB", 0x40, 0x15) + b"\0" * 11 + struct.pack(">BB", 5, len(config)) + config
+        es = struct.pack(">HB", track_id, 0) + struct.pack(">BB", 4, len(decoder)) + decoder + struct.pack(">BBB", 6, 1, 2)
+        esds = fullbox(b"esds", 0, 0, struct.pack(">BB", 3, len(es)) + es)
+        mp4a = box(b"mp4a", b"\0" * 6 + struct.pack(">H", 1) + b"\0" * 8 +
+                   struct.pack(">HHHHI", channels, 16, 0, 0, rate << 16) + esds)
+        smhd = fullbox(b"smhd", 0, 0, b"\0" * 4)
+        return self._trak(track_id, rate, b"soun", 0, 0, smhd, mp4a)
+
+    def _fragment(self, until):
+        """
+        Write the video samples before the dts until (everything if
+        None) and the audio up to the same time, as one fragment.
+        """
+        tracks = self._tracks()
+        if until is not None and any(not getattr(self, x) for x in tracks):
+            return
+        if not self.header_written:
+            self._write_header()
+        rate = self.audio_config[3] if self.audio_config else 90000
+        if self.base is None:
+            starts = []
+            if self.video:
+                starts.append(self.video[0].dts)
+            if self.audio:
+                starts.append(-(-self.audio[0].dts * 90000 // rate))
+            self.base = min(starts) if starts else 0
+
+        runs = []
+        if "video" in tracks:
+            if until is None:
+                video = self.video
+                self.video = []
+            else:
+                video = [x for x in self.video if x.dts < until]
+                self.video = self.video[len(video):]
+            self.video_size = sum(len(x.data) for x in self.video)
+            if video:
+                runs.append((tracks.index("video") + 1, max(0, video[0].dts - self.base), video))
+        if "audio" in tracks:
+            if until is None:
+                audio = self.audio
+            else:
+                # As much audio as there is video in the fragment
+                end = until * rate // 90000
+                audio = [x for x in self.audio if x.dts < end]
+            self.audio = self.audio[len(audio):]
+            following = audio[1:] + self.audio[:1]
+            for sample, after in zip(audio, following):
+                sample.duration = max(1, after.dts - sample.dts)
+            if audio:
+                if len(following) < len(audio):
+                    audio[-1].duration = 1024
+                runs.append((tracks.index("audio") + 1, max(0, audio[0].dts - self.base * rate // 90000), audio))
+
+        runs = [x for x in runs if x[2]]
+        if not runs:
+            return
+        self.sequence += 1
+        moof_size = len(self._moof(runs, 0))
+        self._write(self._moof(runs, moof_size + 8))
+        mdat = [x.data for _, _, samples in runs for x in samples]
+        self._write(struct.pack(">I4s", 8 + sum(len(x) for x in mdat), b"mdat"))
+        for data in mdat:
+            self._write(bytes(data))
+
+    def _moof(self, runs, offset):
+        trafs = []
+        for track_id, decode_time, samples in runs:
+            tfhd = fullbox(b"tfhd", 0, 0x020000, struct.pack(">I", track_id))
+            tfdt = fullbox(b"tfdt", 1, 0, struct.pack(">Q", decode_time))
+            entries = []
+            for sample in samples:
+                flags = 0x02000000 if sample.key else 0x01010000
+                entries.append(struct.pack(">IIIi", sample.duration, len(sample.data), flags, sample.cto))
+            trun = fullbox(b"trun", 1, 0xf01, struct.pack(">Ii", len(samples), offset) + b"".join(entries))
+            trafs.append(box(b"traf", tfhd + tfdt + trun))
+            offset += sum(len(x.data) for x in samples)
+        return box(b"moof", fullbox(b"mfhd", 0, 0, struct.pack(">I", self.sequence)) + b"".join(trafs))
+
+
+def remux_file(source, file_d):
+    """
+    Remux the MPEG-TS file source into file_d.
+    """
+    remuxer = TSRemuxer(file_d)
+    with open(source, "rb") as fd:
+        while True:
+            data = fd.read(188 * 1024)
+            if not data:
+                break
+            remuxer.write(data)
+    remuxer.close()
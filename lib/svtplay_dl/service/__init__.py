@@ -3,7 +3,7 @@
 from __future__ import absolute_import
 import re
 from svtplay_dl.utils.urllib import urlparse
-from svtplay_dl.utils import download_thumbnail, is_py2, HTTP
+from svtplay_dl.utils import download_thumbnail, is_py2, http_session
 
 import logging
 
@@ -20,7 +20,7 @@ class Service(object):
         self._error = False
         self.subtitle = None
         self.cookies = {}
-        self.http = HTTP(options)
+        self.http = http_session(options)
 
     @property
     def url(self):
@@ -33,23 +33,7 @@ class Service(object):
 
     @classmethod
     def handles(cls, url):
-        urlp = urlparse(url)
-
-        # Apply supported_domains_re regexp to the netloc. This
-        # is meant for 'dynamic' domains, e.g. containing country
-        # information etc.
-        for domain_re in [re.compile(x) for x in cls.supported_domains_re]:
-            if domain_re.match(urlp.netloc):
-                return True
-
-        if urlp.netloc in cls.supported_domains:
-            return True
-
-        # For every listed domain, try with www. subdomain as well.
-        if urlp.netloc in ['www.'+x for x in cls.supported_domains]:
-            return True
-
-        return False
+        return handles_url(url, cls.supported_domains, cls.supported_domains_re)
 
     def get_subtitle(self, options):
         pass
@@ -79,6 +63,101 @@ class Service(object):
         log.warning("--all-episodes not implemented for this service")
         return [self.url]
 
+def handles_url(url, supported_domains, supported_domains_re):
+    netloc = urlparse(url).netloc
+
+    # Apply supported_domains_re regexp to the netloc. This
+    # is meant for 'dynamic' domains, e.g. containing country
+    # information etc. The re module caches the compiled patterns.
+    for domain_re in supported_domains_re:
+        if re.match(domain_re, netloc):
+            return True
+
+    if netloc in supported_domains:
+        return True
+
+    # For every listed domain, try with www. subdomain as well.
+    if netloc.startswith("www.") and netloc[4:] in supported_domains:
+        return True
+
+    return False
+
+
+class ServiceIndex(list):
+    """
+    A list of services, in the order they should be tried, that can
+    find the service for a URL without asking every one of them.
+
+    Plain domains (and their www. variants) are looked up in a dict,
+    and the supported_domains_re of all services are combined into
+    one regexp. The first service in the list that handles the URL
+    wins, just like when calling handles() on each of them in turn.
+    The index is rebuilt if services are added or removed.
+    """
+    def __init__(self, *args):
+        super(ServiceIndex, self).__init__(*args)
+        self._size = None
+
+    def _build(self):
+        self._domains = {}
+        patterns = []
+        for idx, service in enumerate(self):
+            for domain in service.supported_domains:
+                self._domains.setdefault(domain, idx)
+                self._domains.setdefault("www." + domain, idx)
+            if service.supported_domains_re:
+                patterns.append("(?P<s%d>%s)" % (idx, "|".join("(?:%s)" % x for x in service.supported_domains_re)))
+        self._domains_re = re.compile("|".join(patterns)) if patterns else None
+        self._size = len(self)
+
+    def find(self, url):
+        if self._size != len(self):
+            self._build()
+        netloc = urlparse(url).netloc
+
+        found = self._domains.get(netloc)
+        if self._domains_re:
+            match = self._domains_re.match(netloc)
+            if match:
+                # lastgroup is the outermost group, i.e. the service
+                idx = int(match.lastgroup[1:])
+                if found is None or idx < found:
+                    found = idx
+        if found is None:
+            return None
+        return self[found]
+
+
+class LazyService(object):
+    """
+    Stands in for a service class until it is actually used. It
+    knows which domains the service handles from service/table.py,
+    so the module of a service is only imported once a URL matches
+    it, or it is called to create a service object.
+    """
+    def __init__(self, module, name, supported_domains, supported_domains_re):
+        self.module = module
+        self.__name__ = name
+        self.supported_domains = supported_domains
+        self.supported_domains_re = supported_domains_re
+        self._cls = None
+
+    def __repr__(self):
+        return "<LazyService(%s)>" % self.__name__
+
+    def handles(self, url):
+        return handles_url(url, self.supported_domains, self.supported_domains_re)
+
+    def load(self):
+        if self._cls is None:
+            module = __import__("svtplay_dl.service.%s" % self.module, fromlist=[self.__name__])
+            self._cls = getattr(module, self.__name__)
+        return self._cls
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+
 def opengraph_get(html, prop):
     """
     Extract specified OpenGraph property from html.
@@ -109,107 +188,99 @@ class OpenGraphThumbMixin(object):
         download_thumbnail(options, url)
 
 
+# Embedded players Generic knows about, in the order they are tried:
+# (regexp, template for the url to look up, what to return).
+# "embed" returns the embedded url and a service for it, "page"
+# returns the page url and a service for the page, "site" returns the
+# page url and a service for the embedded url, and "raw" is like
+# "site" but always uses the Raw service.
+_embeds = [
+    (r"src=[\"\'](http://www.svt.se/wd[^\'\"]+)[\"\']", "%s", "embed"),
+    (r"src=\"(http://player.vimeo.com/video/[0-9]+)\" ", "%s", "embed"),
+    (r"tv4play.se/iframe/video/(\d+)?", "http://www.tv4play.se/?video_id=%s", "embed"),
+    (r"embed.bambuser.com/broadcast/(\d+)", "http://bambuser.com/v/%s", "embed"),
+    (r'src="(http://tv.aftonbladet[^"]*)"', "%s", "embed"),
+    (r'a href="(http://tv.aftonbladet[^"]*)" class="abVi', "%s", "embed"),
+    (r"iframe src='(http://www.svtplay[^']*)'", "%s", "embed"),
+    (r'src="(http://mm-resource-service.herokuapp.com[^"]*)"', "%s", "page"),
+    (r'src="([^.]+\.solidtango.com[^"+]+)"', "%s", "site"),
+    (r"(lemonwhale|lwcdn.com)", "http://lemonwhale.com", "page"),
+    (r's.src="(https://csp-ssl.picsearch.com[^"]+|http://csp.picsearch.com/rest[^"]+)', "%s", "page"),
+    (r"(picsearch_ajax_auth|screen9-ajax-auth)", "http://csp.picsearch.com", "page"),
+    (r'iframe src="(//csp.screen9.com[^"]+)"', "http:%s", "page"),
+    (r'source src="([^"]+)" type="application/x-mpegURL"', "%s", "raw"),
+]
+# All of _embeds in one regexp. Each is a lookahead, so the matches
+# don't use up the page and one embed can't hide another that starts
+# inside it. Where several start at the same place, the first of them
+# in _embeds is the one that matches.
+_embed_re = re.compile("|".join("(?=(?P<embed%d>%s))" % (idx, x[0]) for idx, x in enumerate(_embeds)))
+
+
+def find_embeds(data):
+    """
+    Find the embedded players in data in one pass over it. Returns
+    {index in _embeds: the url group of its first match}.
+
+        >>> find_embeds('<a src="http://player.vimeo.com/video/1" > lwcdn.com')
+        {1: 'http://player.vimeo.com/video/1', 9: 'lwcdn.com'}
+    """
+    found = {}
+    for match in _embed_re.finditer(data):
+        idx = int(match.lastgroup[len("embed"):])
+        if idx not in found:
+            found[idx] = match.group(_embed_re.groupindex[match.lastgroup] + 1)
+            if idx == 0:
+                # Nothing can come before it
+                break
+    return found
+
+
 class Generic(Service):
     ''' Videos embed in sites '''
     def get(self, sites):
-        data = self.http.request("get", self.url).text
-        match = re.search(r"src=(\"|\')(http://www.svt.se/wd[^\'\"]+)(\"|\')", data)
-        stream = None
-        if match:
-            url = match.group(2)
-            for i in sites:
-                if i.handles(url):
-                    url = url.replace("&amp;", "&").replace("&#038;", "&")
-                    return url, i(self.options, url)
-
-        match = re.search(r"src=\"(http://player.vimeo.com/video/[0-9]+)\" ", data)
-        if match:
-            for i in sites:
-                if i.handles(match.group(1)):
-                    return match.group(1), i(self.options, url)
-        match = re.search(r"tv4play.se/iframe/video/(\d+)?", data)
-        if match:
-            url = "http://www.tv4play.se/?video_id=%s" % match.group(1)
-            for i in sites:
-                if i.handles(url):
-                    return url, i(self.options, url)
-        match = re.search(r"embed.bambuser.com/broadcast/(\d+)", data)
-        if match:
-            url = "http://bambuser.com/v/%s" % match.group(1)
-            for i in sites:
-                if i.handles(url):
-                    return url, i(self.options, url)
-        match = re.search(r'src="(http://tv.aftonbladet[^"]*)"', data)
-        if match:
-            url = match.group(1)
-            for i in sites:
-                if i.handles(url):
-                    return url, i(self.options, url)
-        match = re.search(r'a href="(http://tv.aftonbladet[^"]*)" class="abVi', data)
-        if match:
-            url = match.group(1)
-            for i in sites:
-                if i.handles(url):
-                    return url, i(self.options, url)
-
-        match = re.search(r"iframe src='(http://www.svtplay[^']*)'", data)
-        if match:
-            url = match.group(1)
-            for i in sites:
-                if i.handles(url):
-                    return url, i(self.options, url)
-
-        match = re.search('src="(http://mm-resource-service.herokuapp.com[^"]*)"', data)
-        if match:
-            url = match.group(1)
-            for i in sites:
-                if i.handles(url):
-                    return self.url, i(self.options, self.url)
-        match = re.search(r'src="([^.]+\.solidtango.com[^"+]+)"', data)
-        if match:
-            url = match.group(1)
-            for i in sites:
-                if i.handles(url):
-                    return self.url, i(self.options, url)
-        match = re.search('(lemonwhale|lwcdn.com)', data)
-        if match:
-            url = "http://lemonwhale.com"
-            for i in sites:
-                if i.handles(url):
-                    return self.url, i(self.options, self.url)
-        match = re.search('s.src="(https://csp-ssl.picsearch.com[^"]+|http://csp.picsearch.com/rest[^"]+)', data)
-        if match:
-            url = match.group(1)
-            for i in sites:
-                if i.handles(url):
-                    return self.url, i(self.options, self.url)
-        match = re.search('(picsearch_ajax_auth|screen9-ajax-auth)', data)
-        if match:
-            url = "http://csp.picsearch.com"
-            for i in sites:
-                if i.handles(url):
-                    return self.url, i(self.options, self.url)
-        match = re.search('iframe src="(//csp.screen9.com[^"]+)"', data)
-        if match:
-            url = "http:%s" % match.group(1)
-            for i in sites:
-                if i.handles(url):
-                    return self.url, i(self.options, self.url)
-
-        match = re.search('source src="([^"]+)" type="application/x-mpegURL"', data)
-        if match:
-            for i in sites:
-                if i.__name__ == "Raw":
-                    return self.url, i(self.options, match.group(1))
-
-        return self.url, stream
+        data = self.get_urldata()
+        if not isinstance(sites, ServiceIndex):
+            sites = ServiceIndex(sites)
+
+        found = find_embeds(data)
+        for idx in sorted(found):
+            template, mode = _embeds[idx][1:]
+            if "%s" in template:
+                url = template % found[idx]
+            else:
+                url = template
+            url = url.replace("&amp;", "&").replace("&#038;", "&")
+
+            if mode == "raw":
+                service = None
+                for i in sites:
+                    if i.__name__ == "Raw":
+                        service = i
+                        break
+            else:
+                service = sites.find(url)
+            if service is None:
+                continue
+
+            if mode == "embed":
+                return url, service(self.options, url)
+            if mode == "page":
+                stream = service(self.options, self.url)
+                # Save the service from downloading the page again
+                stream._urldata = data
+                return self.url, stream
+            return self.url, service(self.options, url)
+
+        return self.url, None
 
 def service_handler(sites, options, url):
     handler = None
 
-    for i in sites:
-        if i.handles(url):
-            handler = i(options, url)
-            break
+    if not isinstance(sites, ServiceIndex):
+        sites = ServiceIndex(sites)
+    service = sites.find(url)
+    if service:
+        handler = service(options, url)
 
     return handler
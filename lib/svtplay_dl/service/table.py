@@ -0,0 +1,121 @@
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# This file is generated by scripts/gen-service-table.py, edit the
+# supported_domains / supported_domains_re of the service instead.
+#
+# (module, class, supported_domains, supported_domains_re), in the
+# order services are tried.
+services = [
+    ('aftonbladet', 'Aftonbladet',
+     ['tv.aftonbladet.se'],
+     []),
+    ('bambuser', 'Bambuser',
+     ['bambuser.com'],
+     []),
+    ('bigbrother', 'Bigbrother',
+     ['bigbrother.se'],
+     []),
+    ('dbtv', 'Dbtv',
+     ['dbtv.no'],
+     []),
+    ('disney', 'Disney',
+     ['disney.se', 'video.disney.se', 'disneyjunior.disney.se'],
+     []),
+    ('dplay', 'Dplay',
+     ['dplay.se', 'dplay.dk', 'dplay.no'],
+     []),
+    ('dr', 'Dr',
+     ['dr.dk'],
+     []),
+    ('efn', 'Efn',
+     [],
+     ['www.efn.se']),
+    ('expressen', 'Expressen',
+     ['expressen.se'],
+     []),
+    ('facebook', 'Facebook',
+     [],
+     ['www.facebook.com']),
+    ('filmarkivet', 'Filmarkivet',
+     ['filmarkivet.se'],
+     []),
+    ('flowonline', 'Flowonline',
+     [],
+     ['^([a-z]{1,4}\\.|www\\.)?flowonline\\.tv$']),
+    ('hbo', 'Hbo',
+     ['hbo.com'],
+     []),
+    ('twitch', 'Twitch',
+     [],
+     ['^(?:(?:[a-z]{2}-)?[a-z]{2}\\.)?(www\\.|clips\\.)?twitch\\.tv$']),
+    ('lemonwhale', 'Lemonwhale',
+     ['svd.se', 'vk.se', 'lemonwhale.com'],
+     []),
+    ('mtvservices', 'Mtvservices',
+     ['colbertnation.com', 'thedailyshow.com'],
+     []),
+    ('mtvnn', 'Mtvnn',
+     ['nickelodeon.se', 'nickelodeon.nl', 'nickelodeon.no', 'www.comedycentral.se', 'nickelodeon.dk'],
+     []),
+    ('nhl', 'NHL',
+     ['nhl.com'],
+     []),
+    ('nrk', 'Nrk',
+     ['nrk.no', 'tv.nrk.no', 'p3.no', 'tv.nrksuper.no'],
+     []),
+    ('qbrick', 'Qbrick',
+     ['di.seXX'],
+     []),
+    ('picsearch', 'Picsearch',
+     ['dn.se', 'mobil.dn.se', 'di.se', 'csp.picsearch.com', 'csp.screen9.com'],
+     []),
+    ('pokemon', 'Pokemon',
+     ['pokemon.com'],
+     []),
+    ('ruv', 'Ruv',
+     ['ruv.is'],
+     []),
+    ('radioplay', 'Radioplay',
+     ['radioplay.se'],
+     []),
+    ('solidtango', 'Solidtango',
+     ['mm-resource-service.herokuapp.com', 'solidtango.com'],
+     ['^([^.]+\\.)*solidtango.com']),
+    ('sr', 'Sr',
+     ['sverigesradio.se'],
+     []),
+    ('svtplay', 'Svtplay',
+     ['svtplay.se', 'svt.se', 'beta.svtplay.se', 'svtflow.se'],
+     []),
+    ('oppetarkiv', 'OppetArkiv',
+     ['oppetarkiv.se'],
+     []),
+    ('tv4play', 'Tv4play',
+     ['tv4play.se', 'tv4.se'],
+     []),
+    ('urplay', 'Urplay',
+     ['urplay.se', 'ur.se', 'betaplay.ur.se', 'urskola.se'],
+     []),
+    ('viaplay', 'Viaplay',
+     ['tv3play.se', 'tv6play.se', 'tv8play.se', 'tv10play.se', 'tv3play.no', 'tv3play.dk', 'tv6play.no', 'viasat4play.no', 'tv3play.ee', 'tv3play.lv', 'tv3play.lt', 'tvplay.lv', 'viagame.com', 'juicyplay.se', 'viafree.se', 'viafree.dk', 'viafree.no', 'play.tv3.lt', 'tv3play.tv3.ee', 'tvplay.skaties.lv'],
+     []),
+    ('viasatsport', 'Viasatsport',
+     [],
+     ['www.viasatsport.se']),
+    ('vimeo', 'Vimeo',
+     ['vimeo.com'],
+     []),
+    ('vg', 'Vg',
+     ['vg.no', 'vgtv.no'],
+     []),
+    ('youplay', 'Youplay',
+     ['www.affarsvarlden.se'],
+     []),
+    ('riksdagen', 'Riksdagen',
+     [],
+     ['www.riksdagen.se']),
+    ('raw', 'Raw',
+     [],
+     []),
+]
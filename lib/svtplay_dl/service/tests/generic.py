@@ -0,0 +1,49 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import unittest
+from svtplay_dl.service import Generic, LazyService, ServiceIndex
+from svtplay_dl.service.table import services
+from svtplay_dl import Options
+
+
+class genericTest(unittest.TestCase):
+    def get(self, data, url="http://example.com/page"):
+        generic = Generic(Options(), url)
+        generic._urldata = data
+        return generic.get(ServiceIndex(LazyService(*x) for x in services))
+
+    def test_nothing(self):
+        self.assertEqual(self.get("<html></html>"), ("http://example.com/page", None))
+
+    def test_embed(self):
+        url, stream = self.get('<iframe src="http://www.svt.se/wd?a=1&amp;b=2"></iframe>')
+        self.assertEqual(url, "http://www.svt.se/wd?a=1&b=2")
+        self.assertEqual(stream.__class__.__name__, "Svtplay")
+        self.assertEqual(stream.url, url)
+
+    def test_order(self):
+        # Earlier embeds in the list win, wherever they are on the page
+        url, stream = self.get('lwcdn.com <a href="embed.bambuser.com/broadcast/42">')
+        self.assertEqual(url, "http://bambuser.com/v/42")
+        self.assertEqual(stream.__class__.__name__, "Bambuser")
+
+    def test_overlapping(self):
+        # The raw <source> contains the svt.se embed, which comes first
+        url, stream = self.get('<source src="http://www.svt.se/wd?id=1" type="application/x-mpegURL">')
+        self.assertEqual(url, "http://www.svt.se/wd?id=1")
+        self.assertEqual(stream.__class__.__name__, "Svtplay")
+        url, stream = self.get('<source src="http://lwcdn.com/v.m3u8" type="application/x-mpegURL">')
+        self.assertEqual(stream.__class__.__name__, "Lemonwhale")
+
+    def test_page(self):
+        data = '<script src="http://lwcdn.com/player.js"></script>'
+        url, stream = self.get(data)
+        self.assertEqual(url, "http://example.com/page")
+        self.assertEqual(stream.__class__.__name__, "Lemonwhale")
+        self.assertEqual(stream.get_urldata(), data)
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import unittest
+from svtplay_dl.service import LazyService, ServiceIndex
+from svtplay_dl.service.table import services
+
+
+class tableTest(unittest.TestCase):
+    def test_up_to_date(self):
+        # If this fails, run scripts/gen-service-table.py
+        for row in services:
+            cls = LazyService(*row).load()
+            self.assertEqual(list(cls.supported_domains), row[2])
+            self.assertEqual(list(cls.supported_domains_re), row[3])
+
+    def test_lazy(self):
+        service = LazyService("svtplay", "Svtplay", ["svtplay.se"], [])
+        self.assertTrue(service.handles("http://www.svtplay.se/video/1"))
+        self.assertFalse(service.handles("http://www.tv4play.se/"))
+        self.assertEqual(service.load().__name__, "Svtplay")
+
+
+class serviceIndexTest(unittest.TestCase):
+    urls = [
+        "http://www.svtplay.se/video/1090393/del-9",
+        "http://svtplay.se/video/1090393/del-9",
+        "http://www.oppetarkiv.se/video/1129844/jacobs-stege-avsnitt-1-av-1",
+        "http://en.www.twitch.tv/example",
+        "http://clips.twitch.tv/example",
+        "http://foo.solidtango.com/video/bar",
+        "http://solidtango.com/video/bar",
+        "http://www.efn.se/video",
+        "http://www.dn.se/nyheter",
+        "http://www.tv3play.lv/programs",
+        "http://www.example.com/",
+    ]
+
+    def test_same_as_handles(self):
+        index = ServiceIndex(LazyService(*x) for x in services)
+        for url in self.urls:
+            expected = None
+            for service in index:
+                if service.handles(url):
+                    expected = service
+                    break
+            self.assertTrue(index.find(url) is expected, url)
+
+    def test_order(self):
+        first = LazyService("a", "A", [], [r"^(www\.)?example\.com$"])
+        second = LazyService("b", "B", ["example.com"], [])
+        self.assertTrue(ServiceIndex([first, second]).find("http://example.com/") is first)
+        self.assertTrue(ServiceIndex([second, first]).find("http://example.com/") is second)
+
+    def test_rebuild(self):
+        index = ServiceIndex()
+        self.assertTrue(index.find("http://example.com/") is None)
+        service = LazyService("a", "A", ["example.com"], [])
+        index.append(service)
+        self.assertTrue(index.find("http://www.example.com/") is service)
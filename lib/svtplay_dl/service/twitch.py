@@ -76,7 +76,8 @@ class Twitch(Service):
         access = self._get_access_token(videoid)
 
         if options.output_auto:
-            data = self.http.request("get", "https://api.twitch.tv/kraken/videos/v%s" % videoid)
+            data = self.http.request("get", "https://api.twitch.tv/kraken/videos/v%s" % videoid,
+                                     headers={"Client-ID": self.client_ID})
             if data.status_code == 404:
                 yield ServiceError("Can't find the video")
                 return
@@ -131,8 +132,7 @@ class Twitch(Service):
         # path unless the API method already is absolute.
         if method[0] != '/':
             method = '/kraken/%s' % method
-        self.http.headers["Client-ID"] = self.client_ID
-        payload = self.http.request("get", url)
+        payload = self.http.request("get", url, headers={"Client-ID": self.client_ID})
         return json.loads(payload.text)
 
     def _get_hls_url(self, channel):
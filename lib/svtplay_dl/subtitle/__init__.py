@@ -2,12 +2,27 @@ import xml.etree.ElementTree as ET
 import json
 import re
 from svtplay_dl.log import log
-from svtplay_dl.utils import is_py2, is_py3, decode_html_entities, HTTP
+from svtplay_dl.utils import is_py2, is_py3, decode_html_entities, http_session
 from svtplay_dl.utils.io import StringIO
 from svtplay_dl.output import output
+from svtplay_dl.subtitle.cue import Cue, parse_time, timestr, write_cues
 from requests import __build__ as requests_version
 import platform
 
+XMLNS_RE = re.compile(' xmlns="[^"]+"')
+SYNC_RE = re.compile(r"<SYNC Start=(\d+)>")
+SVCC_RE = re.compile("<P Class=SVCC>(.*)")
+SMI_TAG_RE = re.compile(r'<(?!\/?i).*?>')
+BAD_CHAR_RE = re.compile(r'\x96')
+BLANK_RE = re.compile(r"^[\r\n]+")
+TIMING_RE = re.compile(r"([\d:\.]+) --> ([\d:\.]+)")
+CUE_ID_RE = re.compile(r"^(\d+)\s")
+TAG_RE = re.compile('<[^>]*>')
+COLOR_RE = re.compile('<(3[0-7])>')
+CLOSE_TAG_RE = re.compile('</3[0-7]>')
+COLORS = {'30': '#000000', '31': '#ff0000', '32': '#00ff00', '33': '#ffff00',
+          '34': '#0000ff', '35': '#ff00ff', '36': '#00ffff', '37': '#ffffff'}
+
 
 class subtitle(object):
     def __init__(self, options, subtype, url, subfix = None):
@@ -15,7 +30,7 @@ class subtitle(object):
         self.subtitle = None
         self.options = options
         self.subtype = subtype
-        self.http = HTTP(options)
+        self.http = http_session(options)
         self.subfix = subfix
         self.bom = False
 
@@ -26,127 +41,98 @@ class subtitle(object):
             return
 
         data = None
+        cues = None
         if "mtgx" in self.url and subdata.content[:3] == b"\xef\xbb\xbf":
             subdata.encoding = "utf-8"
             self.bom = True
 
         if self.subtype == "tt":
-            data = self.tt(subdata)
+            cues = self.tt(subdata)
         if self.subtype == "json":
-            data = self.json(subdata)
+            cues = self.json(subdata)
         if self.subtype == "sami":
-            data = self.sami(subdata)
+            cues = self.sami(subdata)
         if self.subtype == "smi":
-            data = self.smi(subdata)
+            cues = self.smi(subdata)
         if self.subtype == "wrst":
-            data = self.wrst(subdata)
+            cues = self.wrst(subdata)
         if self.subtype == "raw":
             data = self.raw(subdata)
-            
+
         if self.subfix:
             self.options.output = self.options.output + self.subfix
-            
+
         if self.options.get_raw_subtitles:
             subdata = self.raw(subdata)
             self.save_file(subdata, self.subtype)
-        
-        self.save_file(data, "srt")
-        
-    def save_file(self, data, subtype):
+
+        self.save_file(data, "srt", cues)
+
+    def save_file(self, data, subtype, cues=None):
         if platform.system() == "Windows" and is_py3:
             file_d = output(self.options, subtype, mode="wt", encoding="utf-8")
         else:
             file_d = output(self.options, subtype, mode="wt")
         if hasattr(file_d, "read") is False:
             return
-        file_d.write(data)
+        if cues is not None:
+            write_cues(cues, file_d)
+        else:
+            file_d.write(data)
         file_d.close()
-        
-        
-    def raw(self, subdata): 
+
+    def raw(self, subdata):
         if is_py2:
             data = subdata.text.encode("utf-8")
         else:
             data = subdata.text
         return data
-        
+
+    # The converters below return a list of Cue, see subtitle/cue.py
+
     def tt(self, subdata):
-        i = 1
-        data = ""
         if is_py2:
             subs = subdata.text.encode("utf8")
         else:
             subs = subdata.text
 
-        subdata = re.sub(' xmlns="[^"]+"', '', subs, count=1)
+        subdata = XMLNS_RE.sub('', subs, count=1)
         tree = ET.XML(subdata)
         xml = tree.find("body").find("div")
-        plist = list(xml.findall("p"))
-        for node in plist:
+        cues = []
+        for node in xml.findall("p"):
             tag = norm(node.tag)
             if tag == "p" or tag == "span":
-                begin = node.attrib["begin"]
-                if not ("dur" in node.attrib):
-                    duration = node.attrib["duration"]
+                begin = parse_time(node.attrib["begin"])
+                if "end" in node.attrib:
+                    end = parse_time(node.attrib["end"])
                 else:
-                    duration = node.attrib["dur"]
-                if not ("end" in node.attrib):
-                    begin2 = begin.split(":")
-                    duration2 = duration.split(":")
-                    try:
-                        sec = float(begin2[2]) + float(duration2[2])
-                    except ValueError:
-                        sec = 0.000
-                    end = "%02d:%02d:%06.3f" % (int(begin2[0]), int(begin2[1]), sec)
-                else:
-                    end = node.attrib["end"]
-                data += '%s\n%s --> %s\n' % (i, begin.replace(".", ","), end.replace(".", ","))
-                data = tt_text(node, data)
-                data += "\n"
-                i += 1
-        if is_py2:
-            data = data.encode("utf8")
-        return data
+                    end = begin + parse_time(node.attrib.get("dur", node.attrib.get("duration")))
+                cues.append(Cue(begin, end, tt_text(node)))
+        return cues
 
     def json(self, subdata):
         data = json.loads(subdata.text)
-        number = 1
-        subs = ""
-        for i in data:
-            subs += "%s\n%s --> %s\n" % (number, timestr(int(i["startMillis"])), timestr(int(i["endMillis"])))
-            if is_py2:
-                subs += "%s\n\n" % i["text"].encode("utf-8")
-            else:
-                subs += "%s\n\n" % i["text"]
-            number += 1
-
-        return subs
+        return [Cue(int(i["startMillis"]), int(i["endMillis"]), i["text"].splitlines()) for i in data]
 
     def sami(self, subdata):
         text = subdata.text
         if is_py2:
             text = text.encode("utf8")
-        text = re.sub(r'&', '&amp;', text)
+        text = text.replace('&', '&amp;')
         tree = ET.fromstring(text)
         subt = tree.find("Font")
-        subs = ""
-        n = 0
-        for i in subt.getiterator():
+        cues = []
+        cue = None
+        for i in subt.iter():
             if i.tag == "Subtitle":
-                n = i.attrib["SpotNumber"]
-
-                if i.attrib["SpotNumber"] == "1":
-                    subs += "%s\n%s --> %s\n" % (i.attrib["SpotNumber"], timecolon(i.attrib["TimeIn"]), timecolon(i.attrib["TimeOut"]))
-                else:
-                    subs += "\n%s\n%s --> %s\n" % (i.attrib["SpotNumber"], timecolon(i.attrib["TimeIn"]), timecolon(i.attrib["TimeOut"]))
-            else:
-                if int(n) > 0 and i.text:
-                    subs += "%s\n" % decode_html_entities(i.text)
-
-        if is_py2:
-            subs = subs.encode('utf8')
-        subs = re.sub('&amp;', r'&', subs)
-        return subs
+                cue = Cue(parse_time(i.attrib["TimeIn"], fraction_ms=True),
+                          parse_time(i.attrib["TimeOut"], fraction_ms=True))
+                if int(i.attrib["SpotNumber"]) > 0:
+                    cues.append(cue)
+            elif cue is not None and i.text:
+                cue.lines.extend(decode_html_entities(i.text).replace('&amp;', '&').split("\n"))
+        return cues
 
     def smi(self, subdata):
         if requests_version < 0x20300:
@@ -157,50 +143,37 @@ class subtitle(object):
         else:
             subdata.encoding = "ISO-8859-1"
             subdata = subdata.text
-        ssubdata = StringIO(subdata)
         timea = 0
-        number = 1
         data = None
-        subs = ""
-        TAG_RE = re.compile(r'<(?!\/?i).*?>')
-        bad_char = re.compile(r'\x96')
-        for i in ssubdata.readlines():
+        cues = []
+        for i in StringIO(subdata).readlines():
             i = i.rstrip()
-            sync = re.search(r"<SYNC Start=(\d+)>", i)
+            sync = SYNC_RE.search(i)
             if sync:
                 if int(sync.group(1)) != int(timea):
                     if data and data != "&nbsp;":
-                        subs += "%s\n%s --> %s\n" % (number, timestr(timea), timestr(sync.group(1)))
-                        text = "%s\n" % TAG_RE.sub('', data.replace("<br>", "\n"))
-                        text = decode_html_entities(text)
-                        if text[len(text)-2] != "\n":
-                            text += "\n"
-                        subs += text
-                        number += 1
+                        text = decode_html_entities(SMI_TAG_RE.sub('', data.replace("<br>", "\n")))
+                        text = BAD_CHAR_RE.sub('-', text.replace('\r', ''))
+                        cues.append(Cue(int(timea), int(sync.group(1)), [x for x in text.split("\n") if x]))
                 timea = sync.group(1)
-            text = re.search("<P Class=SVCC>(.*)", i)
+            text = SVCC_RE.search(i)
             if text:
                 data = text.group(1)
-        recomp = re.compile(r'\r')
-        text = bad_char.sub('-', recomp.sub('', subs))
-        if is_py2 and isinstance(text, unicode):
-            return text.encode("utf-8")
-        return text
+        return cues
 
     def wrst(self, subdata):
         ssubdata = StringIO(subdata.text)
-        srt = ""
         subtract = False
         number_b = 1
         number = 0
         block = 0
-        subnr = False
+        cues = []
         if self.bom:
             ssubdata.read(1)
         for i in ssubdata.readlines():
-            match = re.search(r"^[\r\n]+", i)
-            match2 = re.search(r"([\d:\.]+ --> [\d:\.]+)", i)
-            match3 = re.search(r"^(\d+)\s", i)
+            match = BLANK_RE.search(i)
+            match2 = TIMING_RE.search(i)
+            match3 = CUE_ID_RE.search(i)
             if i[:6] == "WEBVTT":
                 continue
             elif "X-TIMESTAMP" in i:
@@ -209,75 +182,30 @@ class subtitle(object):
                 continue
             elif match and number_b > 1:
                 block = 0
-                srt += "\n"
             elif match2:
-                if not subnr:
-                    srt += "%s\n" % number_b
-                matchx = re.search(r'(\d+):(\d+)[.:]([\d\.]+) --> (\d+):(\d+)[.:]([\d\.]+)', i)
-                hour1 = int(matchx.group(1))
-                hour2 = int(matchx.group(4))
-                if int(number) == 1:
-                    if hour1 > 9:
-                        subtract = True
+                start = parse_time(match2.group(1))
+                end = parse_time(match2.group(2))
+                # Timestamps of streams that start at 10:00:00
+                if int(number) == 1 and start >= 10 * 3600000:
+                    subtract = True
                 if subtract:
-                    hour1 -= 10
-                    hour2 -= 10
-                time = "%s:%s:%s --> %s:%s:%s\n" % (hour1, matchx.group(2), matchx.group(3).replace(".", ","), hour2, matchx.group(5), matchx.group(6).replace(".", ","))
-                srt += time
+                    start -= 10 * 3600000
+                    end -= 10 * 3600000
+                cues.append(Cue(start, end))
                 block = 1
-                subnr = False
                 number_b += 1
-
             elif match3 and block == 0:
                 number = match3.group(1)
-                srt += "%s\n" % number
-                subnr = True
-            else:
+            elif block:
                 if self.options.convert_subtitle_colors:
-                    colors = {'30': '#000000', '31': '#ff0000', '32': '#00ff00', '33': '#ffff00', '34': '#0000ff', '35': '#ff00ff', '36': '#00ffff', '37': '#ffffff'}
-                    sub = i
-                    for tag, color in colors.items():
-                        regex1 = '<' + tag + '>'
-                        replace = '<font color="' + color + '">'
-                        sub = re.sub(regex1, replace, sub)
-                        
-                    sub = re.sub('</.+>', '</font>',sub)
+                    sub = COLOR_RE.sub(lambda m: '<font color="%s">' % COLORS[m.group(1)], i)
+                    sub = CLOSE_TAG_RE.sub('</font>', sub)
                 else:
-                    sub = re.sub('<[^>]*>', '', i)
-                                        
-                srt += sub.strip()
-                srt+="\n"
-        srt = decode_html_entities(srt)
-        if is_py2:
-            return srt.encode("utf-8")
-        return srt
-
-
-def timestr(msec):
-    """
-    Convert a millisecond value to a string of the following
-    format:
-
-        HH:MM:SS,SS
-
-    with 10 millisecond precision. Note the , seperator in
-    the seconds.
-    """
-    sec = float(msec) / 1000
-
-    hours = int(sec / 3600)
-    sec -= hours * 3600
-
-    minutes = int(sec / 60)
-    sec -= minutes * 60
-
-    output = "%02d:%02d:%06.3f" % (hours, minutes, sec)
-    return output.replace(".", ",")
-
-
-def timecolon(data):
-    match = re.search(r"(\d+:\d+:\d+):(\d+)", data)
-    return "%s,%s" % (match.group(1), match.group(2))
+                    sub = TAG_RE.sub('', i)
+                sub = sub.strip()
+                if sub:
+                    cues[-1].lines.append(decode_html_entities(sub))
+        return cues
 
 
 def norm(name):
@@ -288,14 +216,14 @@ def norm(name):
         return name
 
 
-def tt_text(node, data):
-    if node.text:
-        data += "%s\n" % node.text.strip(' \t\n\r')
+def tt_text(node):
+    lines = []
+    texts = [node.text]
     for i in node:
-        if i.text:
-            data += "%s\n" % i.text.strip(' \t\n\r')
-        if i.tail:
-            text = i.tail.strip(' \t\n\r')
+        texts.extend([i.text, i.tail])
+    for text in texts:
+        if text:
+            text = text.strip(' \t\n\r')
             if text:
-                data += "%s\n" % text
-    return data
+                lines.append(text)
+    return lines
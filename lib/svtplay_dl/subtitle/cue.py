@@ -0,0 +1,95 @@
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+"""
+The subtitle converters parse into a list of Cue, and one writer
+makes SRT (or WebVTT) out of that, a cue at a time.
+"""
+from __future__ import absolute_import
+import re
+
+from svtplay_dl.utils import is_py2
+
+# HH:MM:SS.fff, MM:SS.fff or SS.fff, with . , or : before the fraction
+CLOCK_RE = re.compile(r"^\s*(?:(?:(\d+):)?(\d+):)?(\d+)(?:[.,:](\d+))?\s*$")
+# Offset time in TTML, e.g. 1.5s or 100ms
+OFFSET_RE = re.compile(r"^\s*([\d.]+)(h|m|s|ms)\s*$")
+OFFSET_UNITS = {"h": 3600000, "m": 60000, "s": 1000, "ms": 1}
+
+
+class Cue(object):
+    """
+    A subtitle shown from start to end (in milliseconds), with the
+    lines of text to show.
+    """
+    __slots__ = ["start", "end", "lines"]
+
+    def __init__(self, start, end, lines=None):
+        self.start = start
+        self.end = end
+        self.lines = lines if lines is not None else []
+
+    def __repr__(self):
+        return "<Cue(%s --> %s %r)>" % (self.start, self.end, self.lines)
+
+
+def parse_time(text, fraction_ms=False):
+    """
+    Parse a timestamp into milliseconds. The digits after the seconds
+    are a fraction, unless fraction_ms is set, when they are a number
+    of milliseconds (like in SAMI, HH:MM:SS:mmm).
+
+        >>> parse_time("01:02:03.5"), parse_time("02:03,250"), parse_time("1.5s")
+        (3723500, 123250, 1500)
+    """
+    match = CLOCK_RE.match(text)
+    if match:
+        hours, minutes, seconds, fraction = match.groups()
+        msec = ((int(hours or 0) * 60 + int(minutes or 0)) * 60 + int(seconds)) * 1000
+        if fraction:
+            if fraction_ms:
+                msec += int(fraction)
+            else:
+                msec += int(round(float("0." + fraction) * 1000))
+        return msec
+    match = OFFSET_RE.match(text)
+    if match:
+        return int(round(float(match.group(1)) * OFFSET_UNITS[match.group(2)]))
+    raise ValueError("Invalid timestamp: %r" % text)
+
+
+def timestr(msec, separator=","):
+    """
+    Convert a millisecond value to a string of the following
+    format:
+
+        HH:MM:SS,mmm
+
+    Note the , seperator in the seconds (. for WebVTT).
+    """
+    msec = int(msec)
+    hours, msec = divmod(msec, 3600000)
+    minutes, msec = divmod(msec, 60000)
+    seconds, msec = divmod(msec, 1000)
+    return "%02d:%02d:%02d%s%03d" % (hours, minutes, seconds, separator, msec)
+
+
+def write_cues(cues, file_d, fmt="srt"):
+    """
+    Write cues to file_d as SRT or WebVTT, one cue at a time. Cues
+    without text are left out, and the rest are numbered from 1.
+    """
+    separator = "."
+    if fmt == "vtt":
+        file_d.write("WEBVTT\n\n")
+    else:
+        separator = ","
+    number = 0
+    for cue in cues:
+        if not cue.lines:
+            continue
+        number += 1
+        text = "%d\n%s --> %s\n%s\n\n" % (number, timestr(cue.start, separator), timestr(cue.end, separator),
+                                          "\n".join(cue.lines))
+        if is_py2 and isinstance(text, unicode):
+            text = text.encode("utf-8")
+        file_d.write(text)
@@ -0,0 +1,34 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+
+from svtplay_dl.utils.archive import DownloadArchive
+
+
+class DownloadArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "archive.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_archive(self):
+        archive = DownloadArchive(self.filename)
+        self.assertFalse(archive.has("svtplay", "http://www.svtplay.se/video/1"))
+        archive.add("svtplay", "http://www.svtplay.se/video/1", filename="a.mp4")
+        self.assertTrue(archive.has("svtplay", "http://www.svtplay.se/video/1"))
+        self.assertFalse(archive.has("svtplay", "http://www.svtplay.se/video/1", "subtitle"))
+
+        # It's kept between runs
+        archive = DownloadArchive(self.filename)
+        self.assertTrue(archive.has("svtplay", "http://www.svtplay.se/video/1"))
@@ -0,0 +1,76 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import time
+import threading
+import unittest
+
+from svtplay_dl.utils.bandwidth import BandwidthScheduler, parse_limit
+
+
+class ParseTest(unittest.TestCase):
+    def test_default(self):
+        self.assertEqual(parse_limit("100k"), (102400, []))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, parse_limit, "fast")
+        self.assertRaises(ValueError, parse_limit, "8-17=1M")
+        self.assertRaises(ValueError, parse_limit, "08:00-25:00=1M")
+
+
+class ScheduleTest(unittest.TestCase):
+    def rate(self, rules, hour, minute):
+        scheduler = BandwidthScheduler(rules, localtime=lambda now: time.struct_time((2017, 1, 1, hour, minute, 0, 6, 1, 0)))
+        return scheduler.rate(0)
+
+    def test_day(self):
+        self.assertEqual(self.rate("1M,08:00-17:00=1k", 12, 0), 1024)
+        self.assertEqual(self.rate("1M,08:00-17:00=1k", 17, 0), 1024 ** 2)
+
+    def test_midnight(self):
+        self.assertEqual(self.rate("1M,23:00-06:00=0", 2, 30), 0)
+        self.assertEqual(self.rate("1M,23:00-06:00=0", 23, 30), 0)
+        self.assertEqual(self.rate("1M,23:00-06:00=0", 6, 0), 1024 ** 2)
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_rate(self):
+        scheduler = BandwidthScheduler("100k")
+        job = scheduler.job()
+        start = time.time()
+        for _ in range(5):
+            job.consume(20480)
+        # The first one is free, the rest wait for what came before
+        self.assertTrue(0.7 < time.time() - start < 1.5)
+
+    def test_unlimited(self):
+        scheduler = BandwidthScheduler("0")
+        start = time.time()
+        scheduler.job().consume(1024 ** 3)
+        scheduler.job().consume(1024 ** 3)
+        self.assertTrue(time.time() - start < 0.5)
+
+    def test_weights(self):
+        scheduler = BandwidthScheduler("400k")
+        got = {1: 0, 3: 0}
+        stop = time.time() + 1.0
+
+        def download(weight):
+            job = scheduler.job(weight)
+            while time.time() < stop:
+                job.consume(4096)
+                got[weight] += 4096
+
+        threads = [threading.Thread(target=download, args=(x,)) for x in got]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(2.0 < float(got[3]) / got[1] < 4.5, got)
+        # Together they get the whole limit
+        self.assertTrue(300 * 1024 < got[1] + got[3] < 520 * 1024, got)
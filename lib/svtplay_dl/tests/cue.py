@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import unittest
+
+from svtplay_dl import Options
+from svtplay_dl.subtitle import subtitle
+from svtplay_dl.subtitle.cue import Cue, parse_time, write_cues
+from svtplay_dl.utils.io import StringIO
+
+
+class FakeSubdata(object):
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.encoding = None
+
+
+class ParseTimeTest(unittest.TestCase):
+    def test_fraction_ms(self):
+        self.assertEqual(parse_time("00:00:01:5", fraction_ms=True), 1005)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, parse_time, "soon")
+
+
+class WriteCuesTest(unittest.TestCase):
+    def write(self, cues, fmt="srt"):
+        file_d = StringIO()
+        write_cues(cues, file_d, fmt)
+        return file_d.getvalue()
+
+    def test_srt(self):
+        cues = [Cue(0, 1500, ["a"]), Cue(2000, 3000), Cue(3600000, 3600001, ["b", "c"])]
+        self.assertEqual(self.write(cues),
+                         "1\n00:00:00,000 --> 00:00:01,500\na\n\n"
+                         "2\n01:00:00,000 --> 01:00:00,001\nb\nc\n\n")
+
+    def test_vtt(self):
+        self.assertEqual(self.write([Cue(0, 1500, ["a"])], "vtt"),
+                         "WEBVTT\n\n1\n00:00:00.000 --> 00:00:01.500\na\n\n")
+
+
+class WrstTest(unittest.TestCase):
+    VTT = ("WEBVTT\n\n1\n10:00:01.000 --> 10:00:02.500\n<36>Hi</36> &amp; <i>you</i>\n\n"
+           "2\n10:00:03.000 --> 10:00:04.000\none\ntwo\n")
+
+    def cues(self, colors=False):
+        options = Options()
+        options.convert_subtitle_colors = colors
+        cues = subtitle(options, "wrst", "http://example.com/sub.vtt").wrst(FakeSubdata(self.VTT))
+        return [(x.start, x.end, x.lines) for x in cues]
+
+    def test_wrst(self):
+        self.assertEqual(self.cues(), [(1000, 2500, ["Hi & you"]), (3000, 4000, ["one", "two"])])
+
+    def test_colors(self):
+        self.assertEqual(self.cues(True)[0][2], ['<font color="#00ffff">Hi</font> & <i>you</i>'])
@@ -0,0 +1,45 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import unittest
+import xml.etree.ElementTree as ET
+import svtplay_dl.fetcher.dash as dash
+
+MPD = '''<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="dynamic" profiles="urn:mpeg:dash:profile:isoff-live:2011"
+ availabilityStartTime="1970-01-01T00:00:00Z" timeShiftBufferDepth="PT4S">
+<Period start="PT0S"><AdaptationSet contentType="video">%s<Representation id="v1" bandwidth="1000"/></AdaptationSet></Period>
+</MPD>'''
+
+
+class LiveSegmentsTest(unittest.TestCase):
+    def segments(self, template, now):
+        xml = ET.XML(MPD % template)
+        return dash.live_segments(xml, "http://example.com/live/a.mpd", "video", "v1", now)
+
+    def test_duration(self):
+        init, segments = self.segments('<SegmentTemplate timescale="10" duration="20" startNumber="1" '
+                                       'media="$RepresentationID$/$Number$.m4s" initialization="$RepresentationID$/i.mp4"/>', 11)
+        self.assertEqual(init, "http://example.com/live/v1/i.mp4")
+        # 5 segments are done at 11s, but only 4 seconds are kept
+        self.assertEqual([x[:3] for x in segments], [(4, "http://example.com/live/v1/4.m4s", 6.0),
+                                                     (5, "http://example.com/live/v1/5.m4s", 8.0)])
+
+    def test_timeline(self):
+        init, segments = self.segments('<SegmentTemplate timescale="10" media="$Time$.m4s">'
+                                       '<SegmentTimeline><S t="100" d="20" r="2"/><S d="30"/></SegmentTimeline>'
+                                       '</SegmentTemplate>', 16.5)
+        self.assertEqual(init, None)
+        # The last one isn't available until 19s
+        self.assertEqual([(x[0], x[2], x[3]) for x in segments], [(100, 10.0, 2.0), (120, 12.0, 2.0), (140, 14.0, 2.0)])
+
+    def test_timeline_repeat_until_now(self):
+        _, segments = self.segments('<SegmentTemplate timescale="1" media="$Number$.m4s">'
+                                    '<SegmentTimeline><S t="0" d="2" r="-1"/></SegmentTimeline>'
+                                    '</SegmentTemplate>', 7)
+        self.assertEqual([x[1] for x in segments], ["http://example.com/live/1.m4s", "http://example.com/live/2.m4s",
+                                                    "http://example.com/live/3.m4s"])
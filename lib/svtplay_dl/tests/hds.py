@@ -0,0 +1,74 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import struct
+import unittest
+
+from svtplay_dl.fetcher.hds import parse_bootstrap
+
+
+def box(kind, payload):
+    return struct.pack(">I4s", len(payload) + 8, kind) + payload
+
+
+def strings(values):
+    return struct.pack(">B", len(values)) + b"".join(x + b"\x00" for x in values)
+
+
+def asrt(runs):
+    data = struct.pack(">I", 0) + strings([]) + struct.pack(">I", len(runs))
+    return box(b"asrt", data + b"".join(struct.pack(">II", *x) for x in runs))
+
+
+def afrt(runs, timescale=1000):
+    data = struct.pack(">II", 0, timescale) + strings([b"high"]) + struct.pack(">I", len(runs))
+    for run in runs:
+        data += struct.pack(">IQI", *run[:3])
+        if run[2] == 0:
+            data += struct.pack(">B", run[3])
+    return box(b"afrt", data)
+
+
+def abst(segment_runs, fragment_runs, live=False, current=0):
+    data = struct.pack(">IIBIQQ", 0, 1, 0x20 if live else 0, 1000, current, 0)
+    data += b"movie\x00" + strings([b"http://example.com/"]) + strings([b"high"]) + b"\x00\x00"
+    data += struct.pack(">B", 1) + asrt(segment_runs)
+    data += struct.pack(">B", 1) + afrt(fragment_runs)
+    return box(b"abst", data)
+
+
+class BootstrapTest(unittest.TestCase):
+    def test_vod(self):
+        bootstrap = parse_bootstrap(abst([(1, 3)], [(1, 0, 4000)]))
+        self.assertFalse(bootstrap.live)
+        self.assertEqual(bootstrap.movie_identifier, b"movie")
+        self.assertEqual(bootstrap.servers, [b"http://example.com/"])
+        self.assertEqual(bootstrap.fragment_runs[0].qualities, [b"high"])
+        self.assertEqual(bootstrap.fragments(), [(1, 1), (1, 2), (1, 3)])
+
+    def test_segment_runs(self):
+        # Segments 1 and 2 have two fragments each, segment 3 has one
+        bootstrap = parse_bootstrap(abst([(1, 2), (3, 1)], [(1, 0, 4000)]))
+        self.assertEqual(bootstrap.fragments(), [(1, 1), (1, 2), (2, 3), (2, 4), (3, 5)])
+
+    def test_discontinuity(self):
+        # Fragments 3 and 4 are missing, and the stream ends after 6
+        runs = [(1, 0, 4000), (3, 8000, 0, 1), (5, 8000, 4000), (7, 16000, 0, 0)]
+        bootstrap = parse_bootstrap(abst([(1, 10)], runs))
+        self.assertEqual(bootstrap.fragment_runs[0].runs[1].discontinuity, 1)
+        self.assertEqual(bootstrap.fragments(), [(1, 1), (1, 2), (1, 5), (1, 6)])
+
+    def test_live(self):
+        bootstrap = parse_bootstrap(abst([(1, 0xffffffff)], [(10, 40000, 4000)], live=True, current=52000))
+        self.assertTrue(bootstrap.live)
+        self.assertEqual(bootstrap.fragments(), [(1, 10), (1, 11), (1, 12), (1, 13)])
+
+    def test_truncated(self):
+        data = abst([(1, 3)], [(1, 0, 4000)])
+        self.assertRaises(ValueError, parse_bootstrap, data[:-10])
+        self.assertRaises(ValueError, parse_bootstrap, box(b"free", b""))
@@ -10,7 +10,9 @@
 
 from __future__ import absolute_import
 import unittest
+import mock
 import svtplay_dl.fetcher.hls as hls
+from svtplay_dl import Options
 
 
 class HlsTest(unittest.TestCase):
@@ -56,3 +58,92 @@ class HlsTest(unittest.TestCase):
             self.assertEqual(
                 hls._get_full_url(test['segment'], test['srcurl']),
                 test['expected'])
+
+    def test_parsem3u_keys(self):
+        globaldata, files = hls.parsem3u(
+            '#EXTM3U\n'
+            '#EXT-X-MEDIA-SEQUENCE:3\n'
+            '#EXTINF:10,\n'
+            'clear.ts\n'
+            '#EXT-X-KEY:METHOD=AES-128,URI="https://example.com/k1"\n'
+            '#EXTINF:10,\n'
+            'first.ts\n'
+            '#EXT-X-KEY:METHOD=AES-128,URI="k2",IV=0x01\n'
+            '#EXTINF:10,\n'
+            'second.ts\n'
+            '#EXT-X-KEY:METHOD=NONE\n'
+            '#EXTINF:10,\n'
+            'last.ts\n')
+        self.assertEqual(globaldata["MEDIA-SEQUENCE"], "3")
+        self.assertFalse("KEY" in files[0][1])
+        self.assertEqual(files[1][1]["KEY"], {"METHOD": "AES-128", "URI": "https://example.com/k1"})
+        self.assertEqual(files[2][1]["KEY"], {"METHOD": "AES-128", "URI": "k2", "IV": "0x01"})
+        self.assertFalse("KEY" in files[3][1])
+
+
+class DecryptTest(unittest.TestCase):
+    class decryptor(object):
+        def __init__(self):
+            self.calls = []
+
+        def decrypt(self, data):
+            self.calls.append(len(data))
+            return data
+
+    def test_block_aligned(self):
+        decryptor = self.decryptor()
+        data = b"a" * 40 + b"\x08" * 8
+        chunks = [data[:5], data[5:30], data[30:]]
+        self.assertEqual(b"".join(hls._decrypt(chunks, decryptor)), b"a" * 40)
+        for size in decryptor.calls:
+            self.assertEqual(size % 16, 0)
+
+    def test_full_padding_block(self):
+        data = b"b" * 16 + b"\x10" * 16
+        self.assertEqual(b"".join(hls._decrypt([data], self.decryptor())), b"b" * 16)
+
+
+class FakePlaylists(object):
+    def __init__(self, playlists):
+        self.playlists = playlists
+
+    def request(self, method, url, **kwargs):
+        res = mock.Mock(status_code=200)
+        res.text = self.playlists.pop(0)
+        return res
+
+
+def playlist(first, last, end=False):
+    lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:10", "#EXT-X-MEDIA-SEQUENCE:%d" % first]
+    for i in range(first, last + 1):
+        lines += ["#EXTINF:10,", "s%d.ts" % i]
+    if end:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines)
+
+
+class LiveTest(unittest.TestCase):
+    def segments(self, playlists, **kwargs):
+        options = Options()
+        for key, value in kwargs.items():
+            setattr(options, key, value)
+        stream = hls.HLS(options, "http://example.com/live.m3u8", 0, cookies={})
+        stream.http = FakePlaylists(playlists)
+        with mock.patch("time.sleep"):
+            return [x[0] for x in stream._live_segments({})]
+
+    def test_live_edge(self):
+        self.assertEqual(self.segments([playlist(0, 5), playlist(2, 7), playlist(4, 9, True)]),
+                         [3, 4, 5, 6, 7, 8, 9])
+
+    def test_live_start(self):
+        self.assertEqual(self.segments([playlist(0, 5), playlist(3, 8, True)], live_start=True),
+                         [0, 1, 2, 3, 4, 5, 6, 7, 8])
+
+    def test_duration(self):
+        self.assertEqual(self.segments([playlist(0, 5), playlist(2, 7)], duration=25),
+                         [3, 4, 5])
+
+    def test_lost_segments(self):
+        self.assertEqual(self.segments([playlist(0, 5), playlist(8, 10, True)]),
+                         [3, 4, 5, 8, 9, 10])
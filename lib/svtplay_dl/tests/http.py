@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import os
+import re
+import json
+import shutil
+import tempfile
+import unittest
+
+from svtplay_dl import Options
+from svtplay_dl.fetcher.http import HTTP, HTTPException
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def iter_content(self, size):
+        for i in range(0, len(self.content), size):
+            yield self.content[i:i + size]
+
+    def close(self):
+        pass
+
+
+class FakeHTTP(object):
+    """
+    A server for a file, which can send byte ranges if ranges is set.
+    """
+    def __init__(self, content, ranges=True, fail=None):
+        self.content = content
+        self.ranges = ranges
+        self.fail = fail
+        self.requested = []
+
+    def request(self, method, url, stream=False, headers=None):
+        match = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("Range", ""))
+        if not self.ranges or not match:
+            return FakeResponse(200, {"content-length": str(len(self.content))}, self.content)
+        first, last = int(match.group(1)), int(match.group(2))
+        self.requested.append((first, last))
+        if first == self.fail:
+            return FakeResponse(500, {}, b"")
+        content_range = "bytes %d-%d/%d" % (first, last, len(self.content))
+        return FakeResponse(206, {"Content-Range": content_range}, self.content[first:last + 1])
+
+
+class HTTPDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.options = Options()
+        self.options.silent = True
+        self.options.output = os.path.join(self.tmpdir, "video.mp4")
+        self.options.segment_workers = 3
+        self.content = os.urandom(5 * 1024 * 1024 + 17)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def download(self, server):
+        stream = HTTP(self.options, "http://example.com/video.mp4")
+        stream.http = server
+        stream.download()
+        return stream
+
+    def read(self):
+        with open(self.options.output, "rb") as fd:
+            return fd.read()
+
+    def test_ranges(self):
+        server = FakeHTTP(self.content)
+        stream = self.download(server)
+        self.assertTrue(stream.finished)
+        self.assertEqual(self.read(), self.content)
+        # The probe, and then the whole file in parts
+        self.assertEqual(server.requested[0], (0, 0))
+        self.assertEqual(len(server.requested), 1 + 6)
+        self.assertFalse(os.path.exists(self.options.output + ".part.json"))
+
+    def test_no_ranges(self):
+        stream = self.download(FakeHTTP(self.content, ranges=False))
+        self.assertTrue(stream.finished)
+        self.assertEqual(self.read(), self.content)
+
+    def test_resume(self):
+        server = FakeHTTP(self.content, fail=3 * 1024 * 1024)
+        self.assertRaises(HTTPException, self.download, server)
+        with open(self.options.output + ".part.json") as fd:
+            self.assertEqual(json.load(fd)["offset"], 3 * 1024 * 1024)
+
+        self.options.resume = True
+        server = FakeHTTP(self.content)
+        stream = self.download(server)
+        self.assertTrue(stream.finished)
+        self.assertEqual(self.read(), self.content)
+        # Only what was missing
+        self.assertEqual(server.requested[1][0], 3 * 1024 * 1024)
+
+    def test_no_resume(self):
+        server = FakeHTTP(self.content, fail=3 * 1024 * 1024)
+        self.assertRaises(HTTPException, self.download, server)
+
+        # Without --resume the journal left behind isn't used
+        self.options.force = True
+        server = FakeHTTP(self.content)
+        stream = self.download(server)
+        self.assertTrue(stream.finished)
+        self.assertEqual(self.read(), self.content)
+        self.assertEqual(server.requested[1][0], 0)
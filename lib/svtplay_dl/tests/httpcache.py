@@ -0,0 +1,92 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import shutil
+import tempfile
+import unittest
+
+from requests.cookies import RequestsCookieJar
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from svtplay_dl.utils.httpcache import HTTPCache
+
+
+class FakeServer(object):
+    def __init__(self, content_type="application/json"):
+        self.content_type = content_type
+        self.requests = []
+
+    def __call__(self, method, url, **kwargs):
+        headers = kwargs.get("headers") or {}
+        self.requests.append(headers)
+        res = Response()
+        res.url = url
+        res.cookies = RequestsCookieJar()
+        res.cookies.set("session", "abc", domain="example.com", path="/")
+        if headers.get("If-None-Match") == '"v1"':
+            res.status_code = 304
+            res.headers = CaseInsensitiveDict()
+            res._content = b""
+        else:
+            res.status_code = 200
+            res.headers = CaseInsensitiveDict({"Content-Type": self.content_type, "ETag": '"v1"'})
+            res._content = b'{"id": 1}'
+        return res
+
+
+class HTTPCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ttl(self):
+        cache = HTTPCache(self.directory, "0,api.svt.se=600")
+        server = FakeServer()
+        for _ in range(2):
+            res = cache.request(server, "get", "http://api.svt.se/video/1")
+            self.assertEqual(res.json(), {"id": 1})
+        self.assertEqual(len(server.requests), 1)
+
+    def test_revalidate(self):
+        cache = HTTPCache(self.directory)
+        server = FakeServer()
+        cache.request(server, "get", "http://example.com/")
+        res = cache.request(server, "get", "http://example.com/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {"id": 1})
+        self.assertEqual(server.requests[1]["If-None-Match"], '"v1"')
+
+    def test_media(self):
+        cache = HTTPCache(self.directory, "600")
+        server = FakeServer("video/mp2t")
+        cache.request(server, "get", "http://example.com/seg1.ts")
+        cache.request(server, "get", "http://example.com/seg1.ts")
+        self.assertEqual(len(server.requests), 2)
+
+    def test_cacheable(self):
+        cache = HTTPCache(self.directory)
+        self.assertTrue(cache.cacheable("get", {}))
+        self.assertFalse(cache.cacheable("post", {}))
+        self.assertTrue(cache.cacheable("get", {"cookies": {"token": "1"}}))
+        self.assertFalse(cache.cacheable("get", {"stream": True}))
+        self.assertFalse(cache.cacheable("get", {"headers": {"Range": "bytes=0-1"}}))
+
+    def test_cookies(self):
+        cache = HTTPCache(self.directory, "600")
+        server = FakeServer()
+        cookies = {"token": "1"}
+        for _ in range(2):
+            res = cache.request(server, "get", "http://example.com/playlist.m3u8", cookies=cookies)
+            self.assertEqual(res.cookies.get("session"), "abc")
+        self.assertEqual(len(server.requests), 1)
+        # Other cookies, another entry
+        cache.request(server, "get", "http://example.com/playlist.m3u8", cookies={"token": "2"})
+        self.assertEqual(len(server.requests), 2)
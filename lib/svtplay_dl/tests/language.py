@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil; coding: utf-8 -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from svtplay_dl.postprocess.language import detect_language, label_language, subtitle_language
+
+
+class DetectTest(unittest.TestCase):
+    def test_nordic(self):
+        self.assertEqual(detect_language("Mamma, var är mina skor? Jag hittar dem inte någonstans."), "swe")
+        self.assertEqual(detect_language("Det er lige meget hvad du mener, vi gør det alligevel."), "dan")
+        self.assertEqual(detect_language("Det spiller ingen rolle hva du mener, vi gjør det uansett."), "nor")
+        self.assertEqual(detect_language("Äiti, missä minun kenkäni ovat? En löydä niitä mistään."), "fin")
+
+    def test_other(self):
+        self.assertEqual(detect_language("Mum, where are my shoes? I can't find them anywhere."), "eng")
+        self.assertEqual(detect_language("Mama, wo sind meine Schuhe? Ich finde sie nirgends."), "deu")
+
+    def test_unknown(self):
+        self.assertEqual(detect_language("Hej!"), "und")
+        self.assertEqual(detect_language("Lorem ipsum dolor sit amet, consectetur adipiscing elit"), "und")
+
+
+class LabelTest(unittest.TestCase):
+    def test_label(self):
+        self.assertEqual(label_language("-svenska"), "swe")
+        self.assertEqual(label_language("-lulesamiska.oversattning"), "smj")
+        self.assertEqual(label_language("-SDH"), None)
+        self.assertEqual(label_language(""), None)
+
+
+class SubtitleFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_srt(self):
+        filename = os.path.join(self.tmpdir, "video.srt")
+        with open(filename, "wb") as fd:
+            fd.write("1\n00:00:01,000 --> 00:00:02,000\n<i>Im Sommer fahren wir aufs Land</i>\n\n"
+                     "2\n00:00:03,000 --> 00:00:04,000\nund baden jeden Tag.\n\n".encode("utf-8"))
+        self.assertEqual(subtitle_language(filename), "deu")
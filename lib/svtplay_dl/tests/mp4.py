@@ -0,0 +1,109 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from svtplay_dl.postprocess.mp4 import FragmentedMP4Muxer, box, iter_boxes, find_box, mux_files
+
+
+def fullbox(kind, version, flags, payload):
+    return box(kind, struct.pack(">I", version << 24 | flags) + payload)
+
+
+def init(track_id, timescale):
+    mvhd = fullbox(b"mvhd", 0, 0, struct.pack(">IIII", 0, 0, 1000, 0) + b"\0" * 76 + struct.pack(">I", track_id + 1))
+    tkhd = fullbox(b"tkhd", 0, 3, struct.pack(">III", 0, 0, track_id) + b"\0" * 68)
+    mdhd = fullbox(b"mdhd", 0, 0, struct.pack(">IIIIHH", 0, 0, timescale, 0, 0, 0))
+    trex = fullbox(b"trex", 0, 0, struct.pack(">IIIII", track_id, 1, 0, 0, 0))
+    moov = box(b"moov", mvhd + box(b"trak", tkhd + box(b"mdia", mdhd)) + box(b"mvex", trex))
+    return box(b"ftyp", b"iso6\0\0\0\0") + moov
+
+
+def fragment(track_id, time, payload, flags=0x20000, base=0):
+    tfhd = struct.pack(">I", track_id)
+    if flags & 1:
+        tfhd += struct.pack(">Q", base)
+    traf = box(b"traf", fullbox(b"tfhd", 0, flags, tfhd) + fullbox(b"tfdt", 1, 0, struct.pack(">Q", time)))
+    return box(b"styp", b"msdh") + box(b"moof", fullbox(b"mfhd", 0, 0, struct.pack(">I", 1)) + traf) + box(b"mdat", payload)
+
+
+def fragments(data):
+    """(sequence, track id, base data offset, mdat) of each fragment"""
+    result = []
+    for kind, pos, size, header in iter_boxes(data):
+        if kind == b"moof":
+            mfhd = find_box(data, [b"mfhd"], pos + header, pos + size)
+            tfhd = find_box(data, [b"traf", b"tfhd"], pos + header, pos + size)
+            flags = struct.unpack_from(">I", data, tfhd[0] + 8)[0]
+            base = struct.unpack_from(">Q", data, tfhd[0] + 16)[0] if flags & 1 else None
+            result.append([struct.unpack_from(">I", data, mfhd[0] + 12)[0],
+                           struct.unpack_from(">I", data, tfhd[0] + 12)[0], base])
+        elif kind == b"mdat":
+            result[-1].append(data[pos + header:pos + size])
+    return result
+
+
+class FragmentedMP4MuxerTest(unittest.TestCase):
+    def test_interleave(self):
+        out = io.BytesIO()
+        muxer = FragmentedMP4Muxer(out, ["video", "audio"])
+        muxer.add("video", init(1, 1000))
+        for n in range(3):
+            muxer.add("video", fragment(1, n * 2000, b"v%d" % n))
+        muxer.add("audio", init(1, 48000))
+        for n in range(5):
+            muxer.add("audio", fragment(1, n * 48000, b"a%d" % n))
+        muxer.close()
+        data = out.getvalue()
+
+        moov = find_box(data, [b"moov"])
+        self.assertEqual([x[0] for x in iter_boxes(data, moov[0] + 8, moov[0] + moov[1])],
+                         [b"mvhd", b"trak", b"trak", b"mvex"])
+        self.assertEqual([(x[0], x[1], x[3]) for x in fragments(data)],
+                         [(1, 1, b"v0"), (2, 2, b"a0"), (3, 2, b"a1"), (4, 1, b"v1"), (5, 2, b"a2"),
+                          (6, 2, b"a3"), (7, 1, b"v2"), (8, 2, b"a4")])
+
+    def test_base_data_offset(self):
+        out = io.BytesIO()
+        muxer = FragmentedMP4Muxer(out, ["video", "audio"])
+        video = init(1, 1000)
+        muxer.add("video", video)
+        # The data is 100 bytes after the start of the segment, which
+        # has a 12 byte styp before the moof
+        muxer.add("video", fragment(1, 0, b"v", flags=1, base=len(video) + 100))
+        muxer.add("audio", init(1, 1000))
+        muxer.close()
+        data = out.getvalue()
+
+        moof = find_box(data, [b"moof"])
+        self.assertEqual(fragments(data)[0][2], moof[0] + 100 - 12)
+
+
+class MuxFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_mux_files(self):
+        names = []
+        for name, timescale in [("v.mp4", 1000), ("a.m4a", 100)]:
+            names.append(os.path.join(self.tmpdir, name))
+            with open(names[-1], "wb") as fd:
+                fd.write(init(1, timescale))
+                for n in range(3):
+                    fd.write(fragment(1, n * timescale, name[:1].encode("ascii") + str(n).encode("ascii")))
+        out = io.BytesIO()
+        mux_files(names, out)
+        self.assertEqual([x[3] for x in fragments(out.getvalue())], [b"v0", b"a0", b"v1", b"a1", b"v2", b"a2"])
@@ -6,8 +6,13 @@
 #   pylint: disable-msg=C0103
 
 from __future__ import absolute_import
+import os
+import json
+import shutil
+import tempfile
 import unittest
 import svtplay_dl.output
+from svtplay_dl import Options
 from mock import patch
 
 
@@ -126,3 +131,141 @@ class EtaTest(unittest.TestCase):
         eta.update(90)
         self.assertEqual(eta.left, 10)
         self.assertEqual(str(eta), "0:00:10")
+
+    @patch('time.time')
+    def test_eta_speed_change(self, mock_time):
+        mock_time.return_value = float(0)
+        eta = svtplay_dl.output.ETA(1000)
+        for _ in range(20):
+            mock_time.return_value += 1
+            eta.increment(10)
+        # Twice as fast from now on, the average since the start
+        # would still say 10 items per second.
+        for _ in range(20):
+            mock_time.return_value += 1
+            eta.increment(20)
+        self.assertTrue(eta.rate > 17, eta.rate)
+        self.assertTrue(eta.seconds < 400 / 17.0)
+
+
+class ProgressTest(unittest.TestCase):
+    def setUp(self):
+        self.mockfile = mockfile()
+        self.mockfile.flush = lambda: None
+        svtplay_dl.output.progress_stream = self.mockfile
+        self.options = Options()
+        self.options.output = "video.ts"
+
+    @patch('time.time')
+    def test_redraw_limit(self, mock_time):
+        mock_time.return_value = float(0)
+        progress = svtplay_dl.output.Progress(self.options, 100)
+        for i in range(1, 101):
+            mock_time.return_value += 0.01
+            progress.update(i)
+        # Every 0.25 seconds, and the last one
+        self.assertEqual(len(self.mockfile.content), 5)
+        self.assertTrue(self.mockfile.content[-1].startswith("\r[100/100]"))
+
+    @patch('time.time')
+    def test_json(self, mock_time):
+        mock_time.return_value = float(0)
+        self.options.progress = "json"
+        progress = svtplay_dl.output.Progress(self.options, 10, unit="bytes")
+        for i in range(1, 11):
+            mock_time.return_value += 2
+            progress.update(i)
+        progress.finish()
+        lines = [json.loads(x) for x in self.mockfile.content]
+        self.assertEqual([x["event"] for x in lines], ["progress"] * 10 + ["done"])
+        self.assertEqual(lines[3]["file"], "video.ts")
+        self.assertEqual((lines[3]["pos"], lines[3]["total"], lines[3]["unit"]), (4, 10, "bytes"))
+        self.assertEqual(lines[3]["eta"], 12)
+
+    def test_silent(self):
+        self.options.silent = True
+        progress = svtplay_dl.output.Progress(self.options, 10)
+        progress.update(10)
+        progress.finish()
+        self.assertEqual(self.mockfile.content, [])
+
+
+class SegmentJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "video.ts")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_resume(self):
+        with open(self.filename, "wb") as fd:
+            journal = svtplay_dl.output.SegmentJournal(self.filename, "http://example.com/a.m3u8")
+            self.assertEqual(journal.resume(fd), 0)
+            fd.write(b"1234")
+            journal.update(fd)
+            fd.write(b"56")
+
+        with open(self.filename, "r+b") as fd:
+            journal = svtplay_dl.output.SegmentJournal(self.filename, "http://example.com/a.m3u8")
+            self.assertEqual(journal.resume(fd), 1)
+        with open(self.filename, "rb") as fd:
+            self.assertEqual(fd.read(), b"1234")
+
+        journal.remove()
+        self.assertFalse(os.path.exists(self.filename + ".part.json"))
+
+    def test_not_resumed(self):
+        with open(self.filename, "wb") as fd:
+            journal = svtplay_dl.output.SegmentJournal(self.filename, "http://example.com/a.m3u8")
+            fd.write(b"1234")
+            journal.update(fd)
+
+        # Opened to be written from the start, e.g. with --force
+        with open(self.filename, "wb") as fd:
+            journal = svtplay_dl.output.SegmentJournal(self.filename, "http://example.com/a.m3u8")
+            self.assertEqual(journal.resume(fd), 0)
+            self.assertEqual(fd.tell(), 0)
+        self.assertEqual(journal.offset, 0)
+        self.assertFalse(os.path.exists(self.filename + ".part.json"))
+
+    def test_other_url(self):
+        with open(self.filename, "wb") as fd:
+            journal = svtplay_dl.output.SegmentJournal(self.filename, "http://example.com/a.m3u8")
+            fd.write(b"1234")
+            journal.update(fd)
+
+        journal = svtplay_dl.output.SegmentJournal(self.filename, "http://example.com/b.m3u8")
+        self.assertEqual(journal.segments, 0)
+        self.assertEqual(journal.offset, 0)
+
+
+class FindexpisodeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ["show-s01e01-abc123-svtplay.mp4", "show-s01e02-def456-svtplay.srt"]:
+            open(os.path.join(self.tmpdir, name), "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def findexpisode(self, name):
+        return svtplay_dl.output.findexpisode(self.tmpdir, "svtplay", name)
+
+    def test_video(self):
+        self.assertTrue(self.findexpisode("Show-s01e01-abc123-svtplay.ts"))
+        self.assertFalse(self.findexpisode("show-s01e02-def456-svtplay.mp4"))
+
+    def test_subtitle(self):
+        self.assertTrue(self.findexpisode("show-s01e02-def456-svtplay.srt"))
+        self.assertFalse(self.findexpisode("show-s01e01-abc123-svtplay.srt"))
+
+    def test_new_files(self):
+        self.assertFalse(self.findexpisode("show-s01e03-ghi789-svtplay.mp4"))
+        name = os.path.join(self.tmpdir, "show-s01e03-ghi789-svtplay.ts")
+        open(name, "w").close()
+        svtplay_dl.output.add_to_directory_index(name)
+        self.assertTrue(self.findexpisode("show-s01e03-ghi789-svtplay.mp4"))
+
+        os.remove(name)
+        self.assertFalse(self.findexpisode("show-s01e03-ghi789-svtplay.mp4"))
@@ -0,0 +1,102 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import time
+import random
+import unittest
+from svtplay_dl.utils.parallel import ordered_map, unordered_map, BackgroundMap
+
+
+class orderedMapTest(unittest.TestCase):
+    def test_serial(self):
+        self.assertEqual(list(ordered_map(str, range(5))),
+                         ["0", "1", "2", "3", "4"])
+
+    def test_keeps_order(self):
+        def slow(x):
+            time.sleep(random.random() / 100)
+            return x * x
+        self.assertEqual(list(ordered_map(slow, range(50), workers=8)),
+                         [x * x for x in range(50)])
+
+    def test_window(self):
+        started = []
+
+        def track(x):
+            started.append(x)
+            return x
+        result = ordered_map(track, range(100), workers=2, window=4)
+        self.assertEqual(next(result), 0)
+        # Nothing beyond the window may have been picked up
+        self.assertTrue(max(started) < 4)
+        result.close()
+
+    def test_slow_items(self):
+        def items():
+            yield 1
+            yield 2
+            # Like polling a live playlist
+            time.sleep(1)
+            yield 3
+        start = time.time()
+        result = ordered_map(lambda x: x, items(), workers=2)
+        # Not held back until the next element shows up
+        self.assertEqual([next(result), next(result)], [1, 2])
+        self.assertTrue(time.time() - start < 0.5)
+        result.close()
+
+    def test_exception(self):
+        def fail(x):
+            if x == 3:
+                raise ValueError(x)
+            return x
+        result = ordered_map(fail, range(10), workers=4)
+        self.assertEqual([next(result) for _ in range(3)], [0, 1, 2])
+        self.assertRaises(ValueError, next, result)
+
+
+class unorderedMapTest(unittest.TestCase):
+    def test_all(self):
+        self.assertEqual(sorted(unordered_map(str, range(50), workers=8)),
+                         sorted(str(x) for x in range(50)))
+
+    def test_no_head_of_line_blocking(self):
+        def sleep(x):
+            time.sleep(x)
+            return x
+        start = time.time()
+        result = list(unordered_map(sleep, [0.5] + [0.02] * 10, workers=2))
+        # One worker does the slow one while the other does the rest
+        self.assertTrue(time.time() - start < 0.9)
+        self.assertEqual(result[-1], 0.5)
+
+    def test_exception(self):
+        def fail(x):
+            if x == 3:
+                raise ValueError(x)
+            return x
+        self.assertRaises(ValueError, list, unordered_map(fail, range(10), workers=4))
+
+
+class backgroundMapTest(unittest.TestCase):
+    def test_overlap(self):
+        def slow(x):
+            time.sleep(0.2)
+            return x
+        start = time.time()
+        job = BackgroundMap(slow, range(4), workers=4)
+        # The caller isn't held up
+        self.assertTrue(time.time() - start < 0.1)
+        self.assertEqual(job.join(), [0, 1, 2, 3])
+        self.assertTrue(time.time() - start < 0.5)
+
+    def test_exception(self):
+        def fail(x):
+            raise ValueError(x)
+        job = BackgroundMap(fail, range(3), workers=2)
+        self.assertRaises(ValueError, job.join)
@@ -0,0 +1,47 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from svtplay_dl.error import UIException
+from svtplay_dl.postprocess import RemuxPipe
+
+
+class RemuxPipeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.tempfile = os.path.join(self.tmpdir, "video.mp4.temp")
+        self.filename = os.path.join(self.tmpdir, "video.mp4")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_done(self):
+        # Stands in for ffmpeg: copies stdin to the output file
+        cmd = [sys.executable, "-c", "import sys, shutil; shutil.copyfileobj(sys.stdin.buffer "
+               "if hasattr(sys.stdin, 'buffer') else sys.stdin, open(sys.argv[1], 'wb'))", self.tempfile]
+        pipe = RemuxPipe(cmd, self.tempfile, self.filename)
+        pipe.write(b"data")
+        pipe.close()
+        with open(self.filename, "rb") as fd:
+            self.assertEqual(fd.read(), b"data")
+
+    def test_failed(self):
+        # ffmpeg quits while we are writing to it
+        pipe = RemuxPipe([sys.executable, "-c", "import sys; sys.exit(1)"], self.tempfile, self.filename)
+
+        def write():
+            for _ in range(100):
+                pipe.write(b"\0" * 65536)
+                pipe.flush()
+        self.assertRaises(UIException, write)
+        self.assertFalse(os.path.exists(self.filename))
@@ -0,0 +1,229 @@
+#!/usr/bin/python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# The unittest framwork doesn't play nice with pylint:
+#   pylint: disable-msg=C0103
+
+from __future__ import absolute_import
+import io
+import struct
+import unittest
+
+from svtplay_dl.postprocess.mp4 import iter_boxes, find_box
+from svtplay_dl.postprocess.ts import TSRemuxer, parse_sps, split_nal_units
+
+
+def ue(value):
+    bits = bin(value + 1)[2:]
+    return "0" * (len(bits) - 1) + bits
+
+
+def sps(width, height, crop_bottom=0):
+    bits = "01100111" + "01000010" + "11000000" + "00011110"
+    # sps id, log2_max_frame_num, poc type 2, one ref frame, no gaps
+    bits += ue(0) + ue(0) + ue(2) + ue(1) + "0"
+    bits += ue(width // 16 - 1) + ue((height + 15) // 16 - 1) + "1" + "1"
+    if crop_bottom:
+        bits += "1" + ue(0) + ue(0) + ue(0) + ue(crop_bottom // 2)
+    else:
+        bits += "0"
+    bits += "0" + "1"
+    bits += "0" * (-len(bits) % 8)
+    return bytes(bytearray(int(bits[i:i + 8], 2) for i in range(0, len(bits), 8)))
+
+
+PPS = b"\x68\xce\x38\x80"
+
+
+def timestamp(marker, ts):
+    return struct.pack(">BHH", (marker << 4) | ((ts >> 29) & 0xe) | 1,
+                       ((ts >> 14) & 0xfffe) | 1, ((ts << 1) & 0xfffe) | 1)
+
+
+def packets(pid, payload):
+    out = b""
+    first = True
+    while payload:
+        chunk = payload[:184]
+        payload = payload[184:]
+        head = struct.pack(">BHB", 0x47, (0x4000 if first else 0) | pid, 0x10)
+        if len(chunk) < 184:
+            # Pad with an adaptation field
+            stuffing = 184 - len(chunk) - 1
+            head = head[:3] + b"\x30" + struct.pack(">B", stuffing)
+            if stuffing:
+                head += b"\x00" + b"\xff" * (stuffing - 1)
+        out += head + chunk
+        first = False
+    return out
+
+
+def section(table_id, body):
+    data = struct.pack(">BH", table_id, 0xb000 | (len(body) + 5 + 4)) + b"\x00\x01\xc1\x00\x00" + body
+    return b"\x00" + data + b"\x00" * 4
+
+
+def pes(stream_id, pts, dts, data):
+    if dts is None:
+        header = timestamp(2, pts)
+        flags = 0x80
+    else:
+        header = timestamp(3, pts) + timestamp(1, dts)
+        flags = 0xc0
+    return b"\x00\x00\x01" + struct.pack(">BHBBB", stream_id, 0, 0x80, flags, len(header)) + header + data
+
+
+def adts(payload, rate_index=3):
+    length = len(payload) + 7
+    return struct.pack(">BBBBBBB", 0xff, 0xf1, (1 << 6) | (rate_index << 2), 0x80 | (length >> 11),
+                       (length >> 3) & 0xff, ((length & 7) << 5) | 0x1f, 0xfc) + payload
+
+
+def stream(frames, base=1000000, width=320, height=240, keyframes=25, jump=None, no_audio=()):
+    """
+    A TS with a frame of video at 25 fps and 48 kHz AAC, a key frame
+    every keyframes frames. The timestamps start over from base at
+    frame jump, and the audio in the frames in no_audio is left out.
+    """
+    out = packets(0, section(0, struct.pack(">HH", 1, 0xe000 | 0x1000)))
+    out += packets(0x1000, section(2, struct.pack(">HH", 0xe100, 0xf000) +
+                                   struct.pack(">BHH", 0x1b, 0xe100, 0xf000) +
+                                   struct.pack(">BHH", 0x0f, 0xe101, 0xf000)))
+    audio_time = base
+    for i in range(frames):
+        dts = base + (i - jump if jump is not None and i >= jump else i) * 3600
+        if i == jump:
+            audio_time = dts
+        nals = [b"\x09\xf0"]
+        if i % keyframes == 0:
+            nals += [sps(width, height), PPS, b"\x65" + b"\x2a" * 40]
+        else:
+            nals += [b"\x41" + b"\x2b" * 20]
+        video = b"".join(b"\x00\x00\x00\x01" + x for x in nals)
+        out += packets(0x100, pes(0xe0, dts + 3600, dts, video))
+        frames_audio = b""
+        first = audio_time
+        while audio_time < dts + 3600:
+            frames_audio += adts(b"\x21" * 20)
+            audio_time += 1920
+        if frames_audio and i not in no_audio:
+            out += packets(0x101, pes(0xc0, first, None, frames_audio))
+    return out
+
+
+def samples(data, track_id):
+    """
+    Yield (decode time, duration, size, flags, cto) of each sample of
+    the track in a fragmented MP4.
+    """
+    for kind, pos, size, header in iter_boxes(data):
+        if kind != b"moof":
+            continue
+        for kind2, pos2, size2, header2 in iter_boxes(data, pos + header, pos + size):
+            if kind2 != b"traf":
+                continue
+            tfhd = find_box(data, [b"tfhd"], pos2 + header2, pos2 + size2)
+            if struct.unpack_from(">I", data, tfhd[0] + 12)[0] != track_id:
+                continue
+            tfdt = find_box(data, [b"tfdt"], pos2 + header2, pos2 + size2)
+            time = struct.unpack_from(">Q", data, tfdt[0] + 12)[0]
+            trun = find_box(data, [b"trun"], pos2 + header2, pos2 + size2)
+            count = struct.unpack_from(">I", data, trun[0] + 12)[0]
+            for i in range(count):
+                duration, length, flags, cto = struct.unpack_from(">IIIi", data, trun[0] + 20 + 16 * i)
+                yield time, duration, length, flags, cto
+                time += duration
+
+
+class SPSTest(unittest.TestCase):
+    def test_size(self):
+        parsed = parse_sps(sps(320, 240))
+        self.assertEqual((parsed["width"], parsed["height"], parsed["profile"]), (320, 240, 66))
+
+    def test_cropped(self):
+        parsed = parse_sps(sps(1920, 1088, crop_bottom=8))
+        self.assertEqual((parsed["width"], parsed["height"]), (1920, 1080))
+
+    def test_split(self):
+        self.assertEqual(split_nal_units(b"\x00\x00\x01\x67\x42\x00\x00\x00\x01\x68\xce"),
+                         [b"\x67\x42", b"\x68\xce"])
+
+
+class TSRemuxerTest(unittest.TestCase):
+    def remux(self, data, chunk=1000):
+        out = io.BytesIO()
+        remuxer = TSRemuxer(out)
+        for i in range(0, len(data), chunk):
+            remuxer.write(data[i:i + chunk])
+        remuxer.close()
+        return out.getvalue()
+
+    def test_header(self):
+        data = self.remux(stream(10))
+        self.assertEqual([x[0] for x in iter_boxes(data)][:3], [b"ftyp", b"moov", b"moof"])
+        pos, size, header = find_box(data, [b"moov", b"trak", b"mdia", b"minf", b"stbl", b"stsd"])
+        avc1 = pos + header + 8
+        self.assertEqual(data[avc1 + 4:avc1 + 8], b"avc1")
+        self.assertEqual(struct.unpack_from(">HH", data, avc1 + 32), (320, 240))
+        self.assertIn(b"avcC\x01\x42\xc0\x1e\xff\xe1", data)
+        # AAC LC, 48 kHz, stereo
+        self.assertIn(b"\x05\x02\x11\x90", data)
+
+    def test_video(self):
+        data = self.remux(stream(60))
+        video = list(samples(data, 1))
+        self.assertEqual(len(video), 60)
+        self.assertEqual([x[0] for x in video[:3]], [0, 3600, 7200])
+        self.assertTrue(all(x[1] == 3600 and x[4] == 3600 for x in video))
+        self.assertEqual([i for i, x in enumerate(video) if x[3] == 0x02000000], [0, 25, 50])
+        # Access unit delimiters, SPS and PPS are left out
+        self.assertEqual(video[0][2], 4 + 41)
+        self.assertEqual(video[1][2], 4 + 21)
+        # Fragments start on the key frames
+        self.assertEqual(len([x for x in iter_boxes(data) if x[0] == b"moof"]), 3)
+
+    def test_audio(self):
+        data = self.remux(stream(60), chunk=188 * 7)
+        audio = list(samples(data, 2))
+        self.assertEqual(len(audio), 113)
+        self.assertTrue(all(x[1] == 1024 and x[2] == 20 for x in audio))
+        self.assertEqual([x[0] for x in audio[:2]], [0, 1024])
+
+    def test_mdat(self):
+        data = self.remux(stream(30))
+        # The first video sample is where the trun says it is
+        pos, size, header = find_box(data, [b"moof"])
+        trun = find_box(data, [b"moof", b"traf", b"trun"])
+        offset = struct.unpack_from(">i", data, trun[0] + 16)[0]
+        self.assertEqual(data[pos + offset:pos + offset + 5], b"\x00\x00\x00\x29\x65")
+
+    def test_no_streams(self):
+        self.assertRaises(ValueError, self.remux, b"\x47\x1f\xff\x10" + b"\xff" * 184)
+
+    def test_discontinuity(self):
+        # The timestamps go back to the start after 40 frames
+        data = self.remux(stream(60, jump=40))
+        video = list(samples(data, 1))
+        self.assertEqual(len(video), 60)
+        self.assertEqual([x[0] for x in video], [i * 3600 for i in range(60)])
+        audio = list(samples(data, 2))
+        self.assertEqual(audio[-1][0], (len(audio) - 1) * 1024)
+
+    def test_audio_gap(self):
+        # Frames 10 to 19 have no audio; what comes after is still in sync
+        data = self.remux(stream(30, no_audio=range(10, 20)))
+        audio = list(samples(data, 2))
+        gap = [x for x in audio if x[1] != 1024]
+        self.assertEqual(len(gap), 1)
+        after = audio[audio.index(gap[0]) + 1]
+        # The first audio frame after the gap starts at 38 * 1920 / 90000
+        self.assertEqual(after[0], 38 * 1024)
+
+    def test_no_key_frames(self):
+        # Only the first frame is a key frame, but it still isn't kept
+        # until the end
+        data = self.remux(stream(300, keyframes=1000))
+        moofs = [x for x in iter_boxes(data) if x[0] == b"moof"]
+        self.assertEqual(len(moofs), 2)
+        self.assertEqual(len(list(samples(data, 1))), 300)
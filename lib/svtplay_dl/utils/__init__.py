@@ -6,6 +6,7 @@ import logging
 import re
 import unicodedata
 import platform
+import threading
 from operator import itemgetter
 
 try:
@@ -13,11 +14,21 @@ try:
 except ImportError:
     # pylint: disable-msg=import-error
     import html.parser as HTMLParser
+try:
+    from html import unescape
+except ImportError:
+    unescape = HTMLParser.HTMLParser().unescape
 try:
     from requests import Session
+    from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
 except ImportError:
     print("You need to install python-requests to use this script")
     sys.exit(3)
+try:
+    from requests.packages.urllib3.util.retry import Retry
+except ImportError:
+    # requests older than 2.4.1 can only retry a number of times
+    Retry = None
 
 from svtplay_dl import error
 
@@ -32,26 +43,68 @@ FIREFOX_UA = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_1) AppleWebKit/537.36
 DEFAULT_PROTOCOL_PRIO = ["dash", "hls", "hds", "http", "rtmp"]
 
 log = logging.getLogger('svtplay_dl')
+
+ENTITY_RE = re.compile(r'(&[^;]+;)')
 progress_stream = sys.stderr
 
 
+def http_adapter(options):
+    """
+    Return an adapter that keeps (at least) one connection per
+    segment worker and job alive, and retries requests that fail on
+    the way or with a server error.
+    """
+    retries = options.http_retries
+    if Retry is not None and retries > 0:
+        # Without retries a server error is just a response, that the
+        # callers look at the status_code of.
+        kwargs = dict(total=options.http_retries, backoff_factor=options.http_backoff,
+                      status_forcelist=[500, 502, 503, 504])
+        try:
+            # Give back the last response instead of raising when the
+            # server keeps failing, like without retries.
+            retries = Retry(raise_on_status=False, **kwargs)
+        except TypeError:
+            # urllib3 older than 1.15 raises MaxRetryError (and so
+            # request() returns None) when a server error is retried
+            # too many times, so only retry failed connections there.
+            del kwargs["status_forcelist"]
+            retries = Retry(**kwargs)
+    return HTTPAdapter(pool_maxsize=max(DEFAULT_POOLSIZE, options.segment_workers * options.jobs), max_retries=retries)
+
+
 class HTTP(Session):
-    def __init__(self, options, *args, **kwargs):
+    def __init__(self, options, adapter=None, *args, **kwargs):
         Session.__init__(self, *args, **kwargs)
         self.verify = options.ssl_verify
+        if adapter is None:
+            adapter = http_adapter(options)
+        for prefix in ["http://", "https://"]:
+            self.mount(prefix, adapter)
         if options.http_headers:
             self.headers.update(self.split_header(options.http_headers))
         self.headers.update({"User-Agent": FIREFOX_UA})
+        self.cache = None
+        if options.http_cache:
+            from svtplay_dl.utils.httpcache import HTTPCache
+            self.cache = HTTPCache(options.http_cache, options.http_cache_ttl)
 
     def check_redirect(self, url):
         return self.get(url, stream=True).url
 
     def request(self, method, url, *args, **kwargs):
-        headers = kwargs.pop("headers", None)
-        if headers:
-            for i in headers.keys():
-                self.headers[i] = headers[i]
-
+        # Pass cache=False for things that must not be cached, like
+        # the playlist of a live stream.
+        use_cache = kwargs.pop("cache", True)
+        if use_cache and self.cache and not args and self.cache.cacheable(method, kwargs):
+            res = self.cache.request(self._request, method, url, **kwargs)
+            if res is not None:
+                # Like requests does when the response comes from the server
+                self.cookies.update(res.cookies)
+            return res
+        return self._request(method, url, *args, **kwargs)
+
+    def _request(self, method, url, *args, **kwargs):
         log.debug("HTTP getting %r", url)
         try:
             res = Session.request(self, method, url, verify=self.verify, *args, **kwargs)
@@ -63,6 +116,28 @@ class HTTP(Session):
         return dict(x.split('=') for x in headers.split(';'))
 
 
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+
+def http_session(options):
+    """
+    Return a new HTTP session for options. Sessions with the same
+    connection settings share one connection pool, so connections to
+    a host are reused between the service, the fetchers and the
+    subtitles, and between episodes, instead of doing a new TLS
+    handshake for each of them. Each session has cookies of its own,
+    so episodes downloaded at the same time don't mix them up.
+    """
+    key = (options.ssl_verify, options.http_retries, options.http_backoff,
+           options.segment_workers, options.jobs)
+    with _adapters_lock:
+        if key not in _adapters:
+            _adapters[key] = http_adapter(options)
+        adapter = _adapters[key]
+    return HTTP(options, adapter)
+
+
 def sort_quality(data):
     data = sorted(data, key=lambda x: (x.bitrate, x.name()), reverse=True)
     datas = []
@@ -183,10 +258,7 @@ def decode_html_entities(s):
         >>> print(decode_html_entities("&lt;3 &amp;"))
         <3 &
     """
-    parser = HTMLParser.HTMLParser()
-    def unesc(m):
-        return parser.unescape(m.group())
-    return re.sub(r'(&[^;]+;)', unesc, ensure_unicode(s))
+    return ENTITY_RE.sub(lambda m: unescape(m.group()), ensure_unicode(s))
 
 
 def filenamify(title):
@@ -216,7 +288,7 @@ def filenamify(title):
 
 
 def download_thumbnail(options, url):
-    data = Session.get(url).content
+    data = http_session(options).request("get", url).content
 
     filename = re.search(r"(.*)\.[a-z0-9]{2,3}$", options.output)
     tbn = "%s.tbn" % filename.group(1)
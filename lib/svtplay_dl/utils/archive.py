@@ -0,0 +1,55 @@
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+from __future__ import absolute_import
+import time
+import sqlite3
+import threading
+
+
+class DownloadArchive(object):
+    """
+    A record of what has been downloaded, kept in an SQLite database.
+
+    Entries are keyed on the service, the id of the video and what
+    kind of download it was ("video" or "subtitle"). The id is the
+    URL of the video page, since that is known before the service has
+    to fetch anything, so a video in the archive can be skipped
+    without looking at it.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        # Used from the --jobs threads, but always under self.lock
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS downloads ("
+                            "service TEXT, id TEXT, kind TEXT, filename TEXT, time REAL, "
+                            "PRIMARY KEY (service, id, kind))")
+
+    def has(self, service, vid, kind="video"):
+        with self.lock:
+            cursor = self.db.execute("SELECT 1 FROM downloads WHERE service = ? AND id = ? AND kind = ?",
+                                     (service, vid, kind))
+            return cursor.fetchone() is not None
+
+    def add(self, service, vid, kind="video", filename=None):
+        with self.lock:
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?)",
+                                (service, vid, kind, filename, time.time()))
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def download_archive(options):
+    """
+    Return the archive given with --download-archive, or None.
+    """
+    if not options.download_archive:
+        return None
+    with _archives_lock:
+        if options.download_archive not in _archives:
+            _archives[options.download_archive] = DownloadArchive(options.download_archive)
+        return _archives[options.download_archive]
@@ -0,0 +1,201 @@
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+from __future__ import absolute_import
+import re
+import time
+import threading
+
+UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def parse_rate(value):
+    """
+    Parse a rate in bytes per second, with an optional k, M or G.
+    0 means no limit.
+
+        >>> parse_rate("500k"), parse_rate("1.5M"), parse_rate("0")
+        (512000, 1572864, 0)
+    """
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([kKmMgG]?)\s*$", value)
+    if not match:
+        raise ValueError("Invalid rate: %r" % value)
+    return int(float(match.group(1)) * UNITS[match.group(2).lower()])
+
+
+def parse_limit(rules):
+    """
+    Parse --limit-rate, a comma separated list of RATE or
+    HH:MM-HH:MM=RATE. A plain RATE is used outside of the times
+    given, and a time range can go past midnight. Returns the default
+    rate and a list of (start, end, rate), in minutes since midnight.
+
+        >>> parse_limit("2M,08:00-17:00=500k,23:00-06:00=0")
+        (2097152, [(480, 1020, 512000), (1380, 360, 0)])
+    """
+    default = 0
+    schedule = []
+    for rule in rules.split(","):
+        rule = rule.strip()
+        if not rule:
+            continue
+        if "=" not in rule:
+            default = parse_rate(rule)
+            continue
+        times, rate = rule.split("=", 1)
+        match = re.match(r"^(\d\d?):(\d\d)-(\d\d?):(\d\d)$", times.strip())
+        if not match:
+            raise ValueError("Invalid time range: %r" % times)
+        hour1, min1, hour2, min2 = [int(x) for x in match.groups()]
+        if hour1 > 24 or hour2 > 24 or min1 > 59 or min2 > 59:
+            raise ValueError("Invalid time range: %r" % times)
+        schedule.append((hour1 * 60 + min1, hour2 * 60 + min2, parse_rate(rate)))
+    return default, schedule
+
+
+class BandwidthScheduler(object):
+    """
+    A token bucket shared by all downloads in the process.
+
+    Tokens (bytes) are added at the rate of the schedule and can be
+    saved up for a second. A download that has received some data
+    pays for it with consume(), which waits until the bucket has
+    tokens. When several jobs are waiting, the bucket is shared
+    between them in proportion to their weights, by serving them in
+    the order of their virtual finish time (weighted fair queueing).
+    A job that isn't waiting doesn't get a share, so the ones that
+    are can use all of the bandwidth.
+    """
+    def __init__(self, rules, clock=time.time, localtime=time.localtime):
+        self.default, self.schedule = parse_limit(rules)
+        self.clock = clock
+        self.localtime = localtime
+        self.cond = threading.Condition()
+        self.tokens = 0.0
+        self.updated = clock()
+        self.vtime = 0.0
+        self.waiting = []
+        self.count = 0
+
+    def rate(self, now=None):
+        if now is None:
+            now = self.clock()
+        local = self.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+        for start, end, rate in self.schedule:
+            if start <= end:
+                if start <= minute < end:
+                    return rate
+            elif minute >= start or minute < end:
+                return rate
+        return self.default
+
+    def job(self, weight=1):
+        return BandwidthJob(self, weight)
+
+    def _refill(self, now, rate):
+        if rate:
+            self.tokens = min(self.tokens + (now - self.updated) * rate, float(rate))
+        self.updated = now
+
+    def consume(self, job, nbytes):
+        if not nbytes:
+            return
+        with self.cond:
+            job.finish = max(job.finish, self.vtime) + float(nbytes) / job.weight
+            self.count += 1
+            request = (job.finish, self.count)
+            self.waiting.append(request)
+            try:
+                while True:
+                    now = self.clock()
+                    rate = self.rate(now)
+                    self._refill(now, rate)
+                    first = min(self.waiting) == request
+                    if first and (not rate or self.tokens >= 0):
+                        # The bucket may go into debt for a big
+                        # request, the next one will wait for it.
+                        if rate:
+                            self.tokens -= nbytes
+                        self.vtime = request[0]
+                        return
+                    if first:
+                        # Wake up at least every second, in case the
+                        # schedule has changed.
+                        self.cond.wait(min(-self.tokens / rate, 1.0))
+                    else:
+                        self.cond.wait(1.0)
+            finally:
+                self.waiting.remove(request)
+                self.cond.notify_all()
+
+
+class BandwidthJob(object):
+    """
+    One download's share of a BandwidthScheduler.
+    """
+    def __init__(self, scheduler, weight=1):
+        if weight <= 0:
+            raise ValueError("The weight must be positive")
+        self.scheduler = scheduler
+        self.weight = float(weight)
+        self.finish = 0.0
+
+    def consume(self, nbytes):
+        self.scheduler.consume(self, nbytes)
+
+
+class ThrottledHTTP(object):
+    """
+    The HTTP session as seen by one download, where everything it
+    receives is paid for with its BandwidthJob.
+    """
+    def __init__(self, http, job):
+        self.http = http
+        self.job = job
+
+    def request(self, method, url, *args, **kwargs):
+        res = self.http.request(method, url, *args, **kwargs)
+        if res is None:
+            return res
+        if kwargs.get("stream"):
+            iter_content = res.iter_content
+
+            def throttled(*args, **kwargs):
+                for chunk in iter_content(*args, **kwargs):
+                    self.job.consume(len(chunk))
+                    yield chunk
+            res.iter_content = throttled
+        else:
+            self.job.consume(len(res.content))
+        return res
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def bandwidth_scheduler(options):
+    """
+    Return the scheduler for --limit-rate, shared by every download
+    in this process, or None.
+    """
+    if not options.limit_rate:
+        return None
+    with _schedulers_lock:
+        if options.limit_rate not in _schedulers:
+            _schedulers[options.limit_rate] = BandwidthScheduler(options.limit_rate)
+        return _schedulers[options.limit_rate]
+
+
+def throttled_session(http, options):
+    """
+    Wrap http so what the download with options receives counts
+    against --limit-rate, with its --limit-weight.
+    """
+    scheduler = bandwidth_scheduler(options)
+    if scheduler is None:
+        return http
+    return ThrottledHTTP(http, scheduler.job(options.limit_weight))
@@ -0,0 +1,191 @@
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+from __future__ import absolute_import
+import os
+import json
+import time
+import hashlib
+import tempfile
+
+from requests.cookies import RequestsCookieJar
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import dict_from_cookiejar
+
+from svtplay_dl.log import log
+from svtplay_dl.utils.urllib import urlparse
+
+# Only pages, API responses and manifests are cached, never media
+CACHEABLE_TYPES = ["text/", "json", "xml", "mpegurl", "f4m", "javascript"]
+
+
+def parse_ttl(rules):
+    """
+    Parse --http-cache-ttl, a comma separated list of SECONDS or
+    PREFIX=SECONDS, where PREFIX is a host optionally followed by
+    the start of a path. A plain SECONDS is the default for all URLs.
+
+        >>> sorted(parse_ttl("60,api.svt.se=3600,www.svtplay.se/video=0").items())
+        [('', 60), ('api.svt.se', 3600), ('www.svtplay.se/video', 0)]
+    """
+    ttl = {"": 0}
+    for rule in rules.split(","):
+        rule = rule.strip()
+        if not rule:
+            continue
+        if "=" in rule:
+            prefix, seconds = rule.rsplit("=", 1)
+        else:
+            prefix, seconds = "", rule
+        ttl[prefix.strip()] = int(seconds)
+    return ttl
+
+
+class HTTPCache(object):
+    """
+    A cache of HTTP responses in a directory, keyed on the URL (and
+    the parameters and headers of the request).
+
+    A stored response is used as is until its TTL has passed. After
+    that it is revalidated with If-None-Match/If-Modified-Since if
+    the server gave us an ETag or Last-Modified, so an unchanged page
+    only costs a 304.
+    """
+    def __init__(self, directory, ttl="0"):
+        self.directory = directory
+        self.ttl = parse_ttl(ttl)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def cacheable(self, method, kwargs):
+        if method.lower() != "get":
+            return False
+        if kwargs.get("stream") or kwargs.get("data") or kwargs.get("json"):
+            return False
+        headers = kwargs.get("headers") or {}
+        return "Range" not in headers and "range" not in headers
+
+    def get_ttl(self, url):
+        urlp = urlparse(url)
+        where = urlp.netloc + urlp.path
+        best = ""
+        for prefix in self.ttl:
+            if len(prefix) > len(best) and where.startswith(prefix):
+                best = prefix
+        return self.ttl[best]
+
+    def filename(self, url, kwargs):
+        cookies = kwargs.get("cookies") or {}
+        if not isinstance(cookies, dict):
+            cookies = dict_from_cookiejar(cookies)
+        key = json.dumps([url, sorted((kwargs.get("params") or {}).items()),
+                          sorted((kwargs.get("headers") or {}).items()), sorted(cookies.items())])
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def load(self, filename):
+        try:
+            with open(filename + ".json") as fd:
+                meta = json.load(fd)
+            with open(filename + ".body", "rb") as fd:
+                body = fd.read()
+        except (IOError, OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def _write(self, filename, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as file_d:
+                file_d.write(data)
+            if hasattr(os, "replace"):
+                os.replace(tmp, filename)
+            else:
+                # os.rename() won't overwrite a file on Windows
+                if os.path.exists(filename):
+                    os.remove(filename)
+                os.rename(tmp, filename)
+        except (IOError, OSError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def store(self, filename, res):
+        # The cookies the response set, e.g. for the segments of a
+        # playlist, are needed again when it comes from the cache.
+        cookies = [[x.name, x.value, x.domain, x.path, x.secure, x.expires] for x in res.cookies]
+        meta = {"url": res.url, "status": res.status_code, "reason": res.reason,
+                "encoding": res.encoding, "headers": dict(res.headers), "cookies": cookies,
+                "time": time.time()}
+        try:
+            self._write(filename + ".body", res.content)
+            self._write(filename + ".json", json.dumps(meta).encode("utf-8"))
+        except (IOError, OSError) as e:
+            log.warning("Can't write to the HTTP cache: %s", e)
+
+    def touch(self, filename, meta):
+        meta["time"] = time.time()
+        try:
+            self._write(filename + ".json", json.dumps(meta).encode("utf-8"))
+        except (IOError, OSError) as e:
+            log.warning("Can't write to the HTTP cache: %s", e)
+
+    def response(self, meta, body):
+        res = Response()
+        res.status_code = meta["status"]
+        res.reason = meta["reason"]
+        res.url = meta["url"]
+        res.encoding = meta["encoding"]
+        res.headers = CaseInsensitiveDict(meta["headers"])
+        res.cookies = RequestsCookieJar()
+        for name, value, domain, path, secure, expires in meta.get("cookies", []):
+            res.cookies.set(name, value, domain=domain, path=path, secure=secure, expires=expires)
+        res._content = body
+        res._content_consumed = True
+        return res
+
+    def should_store(self, res):
+        if res.status_code != 200:
+            return False
+        if "no-store" in res.headers.get("Cache-Control", ""):
+            return False
+        content_type = res.headers.get("Content-Type", "").lower()
+        return any(x in content_type for x in CACHEABLE_TYPES)
+
+    def request(self, send, method, url, **kwargs):
+        """
+        Return the response for the request, from the cache if possible.
+        send(method, url, **kwargs) does the actual request.
+        """
+        filename = self.filename(url, kwargs)
+        meta, body = self.load(filename)
+
+        if meta is not None:
+            if time.time() - meta["time"] < self.get_ttl(url):
+                log.debug("HTTP cache hit for %r", url)
+                return self.response(meta, body)
+
+            cached = CaseInsensitiveDict(meta["headers"])
+            conditional = {}
+            if "ETag" in cached:
+                conditional["If-None-Match"] = cached["ETag"]
+            if "Last-Modified" in cached:
+                conditional["If-Modified-Since"] = cached["Last-Modified"]
+            if conditional:
+                headers = dict(kwargs.get("headers") or {})
+                headers.update(conditional)
+                res = send(method, url, **dict(kwargs, headers=headers))
+                if res is not None and res.status_code == 304:
+                    log.debug("HTTP cache revalidated %r", url)
+                    self.touch(filename, meta)
+                    cached = self.response(meta, body)
+                    # The server may have set new ones
+                    cached.cookies.update(res.cookies)
+                    return cached
+                if res is not None and self.should_store(res):
+                    self.store(filename, res)
+                return res
+
+        res = send(method, url, **kwargs)
+        if res is not None and self.should_store(res):
+            self.store(filename, res)
+        return res
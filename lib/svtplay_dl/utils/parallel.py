@@ -0,0 +1,214 @@
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# Pylint does not seem to handle conditional imports
+# pylint: disable=F0401
+
+from __future__ import absolute_import
+import sys
+import threading
+
+from svtplay_dl.utils import is_py2
+
+if is_py2:
+    from Queue import Queue, Empty
+else:
+    from queue import Queue, Empty
+
+
+def ordered_map(func, items, workers=1, window=None):
+    """
+    Apply func to every element of items using a pool of worker
+    threads, and yield the results in the same order as items.
+
+    At most 'window' elements are fetched from items and processed
+    ahead of the one the caller is waiting for, which caps how many
+    finished results have to be kept in memory while waiting for a
+    slow one. It defaults to twice the number of workers. items is
+    read by a thread of its own, so a result is yielded as soon as
+    it's done even if getting the next element takes a while (e.g. a
+    live playlist that is polled).
+
+    An exception raised by func, or by items, is re-raised when the
+    caller gets to that element. If the caller stops iterating early,
+    no new work is started.
+
+        >>> list(ordered_map(lambda x: x * 2, [1, 2, 3], workers=2))
+        [2, 4, 6]
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    if window is None:
+        window = workers * 2
+    window = max(window, workers)
+
+    tasks = Queue()
+    results = {}
+    done = threading.Condition()
+    stop = threading.Event()
+    # One for every element that may be fetched ahead of the caller
+    slots = threading.Semaphore(window)
+    # How many elements there are, once items is exhausted
+    count = [None]
+
+    def work():
+        while True:
+            task = tasks.get()
+            if task is None or stop.is_set():
+                return
+            idx, item = task
+            try:
+                result = (True, func(item))
+            except BaseException:
+                result = (False, sys.exc_info()[1])
+            with done:
+                results[idx] = result
+                done.notify_all()
+
+    def feed():
+        queued = 0
+        try:
+            for item in items:
+                slots.acquire()
+                if stop.is_set():
+                    return
+                tasks.put((queued, item))
+                queued += 1
+        except BaseException:
+            with done:
+                results[queued] = (False, sys.exc_info()[1])
+                queued += 1
+        with done:
+            count[0] = queued
+            done.notify_all()
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    threads.append(threading.Thread(target=feed))
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    current = 0
+    try:
+        while True:
+            with done:
+                while current not in results and count[0] != current:
+                    # A timeout keeps us responsive to KeyboardInterrupt
+                    done.wait(1)
+                if current not in results:
+                    break
+                ok, result = results.pop(current)
+            current += 1
+            if not ok:
+                raise result
+            yield result
+            # The caller wants the next one, make room for another
+            slots.release()
+    finally:
+        stop.set()
+        slots.release()
+        for _ in range(workers):
+            tasks.put(None)
+
+
+def unordered_map(func, items, workers=1):
+    """
+    Apply func to every element of items using a pool of worker
+    threads, and yield the results as they are done, in no
+    particular order. Each worker takes the next element of items
+    when it is done with the one before, so one slow element doesn't
+    hold up the others. items is only read by the workers, so the
+    caller gets the results while waiting for more of it (e.g. from
+    stdin).
+
+    An exception raised by func is re-raised when the caller gets to
+    it. If the caller stops iterating early, no new work is started.
+
+        >>> sorted(unordered_map(lambda x: x * 2, [1, 2, 3], workers=2))
+        [2, 4, 6]
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    items = iter(items)
+    lock = threading.Lock()
+    results = Queue()
+    stop = threading.Event()
+
+    def work():
+        while not stop.is_set():
+            try:
+                with lock:
+                    item = next(items)
+            except StopIteration:
+                break
+            except BaseException:
+                results.put((False, sys.exc_info()[1]))
+                break
+            try:
+                results.put((True, func(item)))
+            except BaseException:
+                results.put((False, sys.exc_info()[1]))
+        # This worker is done
+        results.put(None)
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    running = workers
+    try:
+        while running:
+            try:
+                # A timeout keeps us responsive to KeyboardInterrupt
+                result = results.get(timeout=1)
+            except Empty:
+                continue
+            if result is None:
+                running -= 1
+                continue
+            ok, result = result
+            if not ok:
+                raise result
+            yield result
+    finally:
+        stop.set()
+
+
+class BackgroundMap(object):
+    """
+    Apply func to every element of items, 'workers' at a time, in the
+    background while the caller does something else. join() waits
+    until all of them are done and returns the results in order, or
+    re-raises the first exception.
+
+        >>> job = BackgroundMap(lambda x: x * 2, [1, 2, 3], workers=2)
+        >>> job.join()
+        [2, 4, 6]
+    """
+    def __init__(self, func, items, workers=1):
+        self.results = []
+        self.error = None
+        # Not a daemon, so whatever has started is finished even if
+        # the caller never joins.
+        self.thread = threading.Thread(target=self._run, args=(func, items, workers))
+        self.thread.start()
+
+    def _run(self, func, items, workers):
+        try:
+            for result in ordered_map(func, items, workers):
+                self.results.append(result)
+        except BaseException:
+            self.error = sys.exc_info()[1]
+
+    def join(self):
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.results
@@ -1,11 +1,57 @@
 import os
+import time
 import shlex
+import signal
 import struct
 import platform
 import subprocess
 
+# The size is cached, it is asked for every time a progress bar is
+# drawn. With SIGWINCH we know when it changes, otherwise it is looked
+# up again after CACHE_TIME seconds.
+CACHE_TIME = 5
+_size = None
+_size_time = 0
+_watching = False
+
 
 def get_terminal_size():
+    """
+    Return (width, height) of the terminal, see _get_terminal_size().
+    """
+    global _size, _size_time
+    now = time.time()
+    if _size is None or (not _watching and now - _size_time > CACHE_TIME):
+        _size = _get_terminal_size()
+        _size_time = now
+    return _size
+
+
+def watch_terminal_size():
+    """
+    Forget the cached size when the terminal is resized. Must be
+    called from the main thread.
+    """
+    global _watching
+    if not hasattr(signal, "SIGWINCH"):
+        return
+    try:
+        signal.signal(signal.SIGWINCH, _resized)
+        # Restart system calls (reads from the network, writes to the
+        # output file) interrupted by a resize instead of failing them
+        # with EINTR on Python 2.
+        signal.siginterrupt(signal.SIGWINCH, False)
+        _watching = True
+    except ValueError:
+        pass
+
+
+def _resized(signum, frame):
+    global _size
+    _size = None
+
+
+def _get_terminal_size():
     """ getTerminalSize()
      - get width and height of console
      - works on linux,os x,windows,cygwin(windows)
@@ -51,8 +97,8 @@ def _get_terminal_size_tput():
     # get terminal width
     # src: http://stackoverflow.com/questions/263890/how-do-i-find-the-width-height-of-a-terminal-window
     try:
-        cols = int(subprocess.check_call(shlex.split('tput cols')))
-        rows = int(subprocess.check_call(shlex.split('tput lines')))
+        cols = int(subprocess.check_output(shlex.split('tput cols')))
+        rows = int(subprocess.check_output(shlex.split('tput lines')))
         return (cols, rows)
     except:
         pass
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+"""
+Time the subtitle converters on generated input of n, 2n, 4n and 8n
+cues, from parsing to the written SRT.
+
+The time per cue should stay about the same as the input grows; the
+script exits with an error if it grows by more than --max-ratio
+from the smallest to the largest input.
+"""
+from __future__ import absolute_import, print_function
+import os
+import sys
+import json
+import time
+from optparse import OptionParser
+
+srcdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib")
+sys.path.insert(0, srcdir)
+
+from svtplay_dl import Options
+from svtplay_dl.subtitle import subtitle, write_cues, timestr
+from svtplay_dl.utils.io import StringIO
+
+
+class FakeSubdata(object):
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.encoding = None
+
+
+def gen_wrst(count):
+    cues = ["WEBVTT\n\n"]
+    for i in range(count):
+        cues.append("%d\n%s --> %s\nLine &amp; <i>number</i> %d\nsecond line\n\n" % (
+            i + 1, timestr(i * 2000, "."), timestr(i * 2000 + 1500, "."), i))
+    return "".join(cues)
+
+
+def gen_json(count):
+    return json.dumps([{"startMillis": i * 2000, "endMillis": i * 2000 + 1500,
+                        "text": "Line %d\nsecond line" % i} for i in range(count)])
+
+
+def gen_smi(count):
+    cues = []
+    for i in range(count):
+        cues.append("<SYNC Start=%d><P Class=SVCC>Line %d<br>second line\n" % (i * 2000, i))
+        cues.append("<SYNC Start=%d><P Class=SVCC>&nbsp;\n" % (i * 2000 + 1500))
+    return "".join(cues)
+
+
+def gen_tt(count):
+    cues = ['<tt xmlns="http://www.w3.org/ns/ttml"><body><div>']
+    for i in range(count):
+        cues.append('<p begin="%s" end="%s">Line %d<br/>second line</p>' % (
+            timestr(i * 2000, "."), timestr(i * 2000 + 1500, "."), i))
+    cues.append("</div></body></tt>")
+    return "".join(cues)
+
+
+def gen_sami(count):
+    def stamp(ms):
+        return "%02d:%02d:%02d:%03d" % (ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, ms % 1000)
+    cues = ['<?xml version="1.0" encoding="utf-8"?><DCSubtitle><Font>']
+    for i in range(count):
+        cues.append('<Subtitle SpotNumber="%d" TimeIn="%s" TimeOut="%s">'
+                    '<Text>Line &amp; %d</Text><Text>second line</Text></Subtitle>' % (
+                        i + 1, stamp(i * 2000), stamp(i * 2000 + 1500), i))
+    cues.append("</Font></DCSubtitle>")
+    return "".join(cues)
+
+
+GENERATORS = [("wrst", gen_wrst), ("json", gen_json), ("smi", gen_smi), ("tt", gen_tt), ("sami", gen_sami)]
+
+
+def convert(subtype, text):
+    sub = subtitle(Options(), subtype, "http://example.com/sub")
+    start = time.time()
+    cues = getattr(sub, subtype)(FakeSubdata(text))
+    write_cues(cues, StringIO())
+    return time.time() - start
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-n", "--cues", type="int", default=5000,
+                      help="number of cues in the smallest input [%default]")
+    parser.add_option("--max-ratio", type="float", default=3.0,
+                      help="largest allowed growth of the time per cue [%default]")
+    options, _ = parser.parse_args()
+
+    failed = False
+    for subtype, generate in GENERATORS:
+        per_cue = []
+        for count in [options.cues * x for x in (1, 2, 4, 8)]:
+            text = generate(count)
+            # Best of three, to keep noise out of it
+            elapsed = min(convert(subtype, text) for _ in range(3))
+            per_cue.append(elapsed / count)
+            print("%-5s %8d cues %8.3fs %6.2fus/cue" % (subtype, count, elapsed, per_cue[-1] * 1e6))
+        ratio = per_cue[-1] / per_cue[0]
+        if ratio > options.max_ratio:
+            print("%s: the time per cue grew %.1f times, not linear" % (subtype, ratio))
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+"""
+Regenerate lib/svtplay_dl/service/table.py from the services.
+
+The table lists every service with the domains it handles, so
+svtplay-dl can find the service for a URL without importing all of
+them. Services are tried in the order they have in the table; to add
+a new one, add a (module, class, [], []) row where it belongs and
+run this script to fill in the domains.
+"""
+from __future__ import absolute_import, print_function
+import os
+import sys
+
+srcdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib")
+sys.path.insert(0, srcdir)
+
+from svtplay_dl.service.table import services
+
+HEADER = """\
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+
+# This file is generated by scripts/gen-service-table.py, edit the
+# supported_domains / supported_domains_re of the service instead.
+#
+# (module, class, supported_domains, supported_domains_re), in the
+# order services are tried.
+services = [
+"""
+
+
+def main():
+    lines = [HEADER]
+    for module, name, _, _ in services:
+        mod = __import__("svtplay_dl.service.%s" % module, fromlist=[name])
+        cls = getattr(mod, name)
+        lines.append("    (%r, %r,\n     %r,\n     %r),\n" % (
+            str(module), str(name),
+            [str(x) for x in cls.supported_domains],
+            [str(x) for x in cls.supported_domains_re]))
+    lines.append("]\n")
+
+    with open(os.path.join(srcdir, "svtplay_dl", "service", "table.py"), "w") as fd:
+        fd.write("".join(lines))
+
+
+if __name__ == "__main__":
+    main()
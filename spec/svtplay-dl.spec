@@ -1,7 +1,14 @@
+import os
+import sys
+
+# Services are imported on demand, so PyInstaller can't find them
+sys.path.insert(0, os.path.join(SPECPATH, "..", "lib"))
+from svtplay_dl.service.table import services
+
 a = Analysis(['../bin/svtplay-dl'],
              binaries=None,
              datas=None,
-             hiddenimports=["Crypto"],
+             hiddenimports=["Crypto"] + ["svtplay_dl.service.%s" % x[0] for x in services],
              hookspath=None,
              runtime_hooks=None,
              excludes=None)